@@ -0,0 +1,380 @@
+import os
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator
+
+from netlist_hash import canonical_hash, canonicalize
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+DEFAULT_DB_PATH: str = "artifacts.db"
+
+# ==============================================================================
+# ### --- RUN ARTIFACT STORE --- ###
+# One SQLite database per deployment holds every run: the specs, and for each
+# iteration the prompt, the raw response, the parsed netlist, the Umpire verdict
+# with one row per finding, and timings. Indexes on rule_id, model, spec hash and
+# outcome answer cross-run questions ("runs where K1 fired on iteration 2") from
+# the index instead of re-reading run directories. export_run() writes a run back
+# out in the original run_* directory layout.
+# Parsed netlists are stored once per design: an iteration refers to its row in
+# `designs` by canonical hash (see netlist_hash.py), so a design the LLM returns
+# again, under any component ids and net names, adds no new netlist copy. A
+# renamed copy keeps its labeling instead (component ids, signal net names and
+# component order relative to the stored copy), from which get_run() rebuilds
+# the exact netlist the iteration produced.
+# ==============================================================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_dir TEXT NOT NULL UNIQUE,
+    spec_hash TEXT NOT NULL,
+    specs TEXT NOT NULL,
+    status TEXT NOT NULL DEFAULT 'running',
+    iterations INTEGER NOT NULL DEFAULT 0,
+    started REAL NOT NULL,
+    finished REAL,
+    elapsed_s REAL
+);
+CREATE INDEX IF NOT EXISTS runs_spec_hash ON runs (spec_hash);
+CREATE INDEX IF NOT EXISTS runs_status ON runs (status);
+CREATE TABLE IF NOT EXISTS iterations (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    iteration INTEGER NOT NULL,
+    prompt TEXT,
+    prompt_tokens INTEGER,
+    model TEXT,
+    response TEXT,
+    attempts INTEGER,
+    llm_s REAL,
+    netlist TEXT,
+    passed INTEGER,
+    feedback TEXT,
+    umpire_s REAL,
+    PRIMARY KEY (run_id, iteration)
+);
+CREATE INDEX IF NOT EXISTS iterations_model ON iterations (model, iteration);
+CREATE TABLE IF NOT EXISTS findings (
+    run_id INTEGER NOT NULL REFERENCES runs (id),
+    iteration INTEGER NOT NULL,
+    rule_id TEXT NOT NULL,
+    level TEXT,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS findings_rule ON findings (rule_id, iteration, run_id);
+CREATE INDEX IF NOT EXISTS findings_run ON findings (run_id, iteration);
+CREATE TABLE IF NOT EXISTS designs (
+    hash TEXT PRIMARY KEY,
+    netlist TEXT NOT NULL,
+    passed INTEGER,
+    first_run_id INTEGER,
+    first_iteration INTEGER
+);
+"""
+
+# Columns added after the first release; older databases get them on open.
+_MIGRATIONS = [
+    ("iterations", "design_hash", "ALTER TABLE iterations ADD COLUMN design_hash TEXT"),
+    ("iterations", "labeling", "ALTER TABLE iterations ADD COLUMN labeling TEXT"),
+]
+
+def spec_hash(specs: str) -> str:
+    """Hash of the specifications with line-end whitespace ignored, for grouping runs of the same design."""
+    normalized = "\n".join(line.rstrip() for line in specs.strip().splitlines())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()[:16]
+
+def _labeling(netlist: List[Dict[str, Any]], stored: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+    """
+    How `netlist` renames and reorders `stored`, a copy of the same design:
+    {'ids': {stored id: id}, 'nets': {stored net: net}, 'order': [stored index]}.
+    None if relabeling `stored` does not give back `netlist` exactly.
+    """
+    mine, theirs = canonicalize(netlist), canonicalize(stored)
+    if mine is None or theirs is None or mine.hash != theirs.hash:
+        return None
+    position = {c['id']: i for i, c in enumerate(stored)}
+    by_id = dict(zip(mine.component_ids, theirs.component_ids))
+    labeling = {'ids': dict(zip(theirs.component_ids, mine.component_ids)),
+                'nets': dict(zip(theirs.net_names, mine.net_names)),
+                'order': [position[by_id[c['id']]] for c in netlist]}
+    return labeling if json.dumps(_relabel(stored, labeling)) == json.dumps(netlist) else None
+
+def _relabel(stored: List[Dict[str, Any]], labeling: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """The netlist described by `labeling` (see _labeling), rebuilt from the stored copy."""
+    ids, nets = labeling['ids'], labeling['nets']
+    return [{**c, 'id': ids[c['id']], 'connections': {t: nets.get(net, net) for t, net in c['connections'].items()}}
+            for c in (stored[i] for i in labeling['order'])]
+
+class ArtifactStore:
+    """Indexed store of run artifacts; safe to share between threads and processes."""
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        db = self._connection()
+        db.executescript(_SCHEMA)
+        for table, column, statement in _MIGRATIONS:
+            if column not in {row['name'] for row in db.execute(f"PRAGMA table_info({table})")}:
+                db.execute(statement)
+        db.execute("CREATE INDEX IF NOT EXISTS iterations_design ON iterations (design_hash)")
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit mode, transactions are explicit."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # --- Recording ---
+    def start_run(self, run_dir: str, specs: str) -> int:
+        """Registers a run (or reopens it when resumed) and returns its id."""
+        with self._transaction() as db:
+            db.execute("INSERT INTO runs (run_dir, spec_hash, specs, started) VALUES (?, ?, ?, ?) "
+                       "ON CONFLICT (run_dir) DO UPDATE SET status = 'running', finished = NULL",
+                       (os.path.abspath(run_dir), spec_hash(specs), specs, time.time()))
+            return db.execute("SELECT id FROM runs WHERE run_dir = ?", (os.path.abspath(run_dir),)).fetchone()[0]
+
+    def _upsert_iteration(self, db: sqlite3.Connection, run_id: int, iteration: int, **fields: Any) -> None:
+        columns = ", ".join(fields)
+        updates = ", ".join(f"{k} = excluded.{k}" for k in fields)
+        db.execute(f"INSERT INTO iterations (run_id, iteration, {columns}) VALUES (?, ?{', ?' * len(fields)}) "
+                   f"ON CONFLICT (run_id, iteration) DO UPDATE SET {updates}",
+                   (run_id, iteration, *fields.values()))
+
+    def record_prompt(self, run_id: int, iteration: int, prompt: str, prompt_tokens: Optional[int] = None) -> None:
+        """Stores the prompt sent in `iteration`."""
+        with self._transaction() as db:
+            self._upsert_iteration(db, run_id, iteration, prompt=prompt, prompt_tokens=prompt_tokens)
+
+    def record_response(self, run_id: int, iteration: int, model: str, response: str, attempts: int, llm_s: float) -> None:
+        """Stores the response that was kept for `iteration`, after `attempts` requests taking `llm_s` seconds."""
+        with self._transaction() as db:
+            self._upsert_iteration(db, run_id, iteration, model=model, response=response, attempts=attempts, llm_s=llm_s)
+
+    def record_check(self, run_id: int, iteration: int, netlist: Any, findings: List[Dict[str, Any]],
+                     feedback: str, umpire_s: float, design_hash: Optional[str] = None) -> bool:
+        """
+        Stores the parsed netlist of `iteration` with its Umpire verdict. Pass the
+        netlist's canonical hash if it is already known. Returns True if the design
+        was not in the store yet.
+        """
+        design_hash = design_hash or canonical_hash(netlist)
+        text = json.dumps(netlist)
+        with self._transaction() as db:
+            new_design = False
+            if design_hash is None:
+                # Malformed netlists have no canonical form and are kept as they are
+                self._upsert_iteration(db, run_id, iteration, netlist=text, design_hash=None, labeling=None,
+                                       passed=int(not findings), feedback=feedback, umpire_s=umpire_s)
+            else:
+                new_design = db.execute("INSERT INTO designs (hash, netlist, passed, first_run_id, first_iteration) "
+                                        "VALUES (?, ?, ?, ?, ?) ON CONFLICT (hash) DO NOTHING",
+                                        (design_hash, text, int(not findings), run_id, iteration)).rowcount > 0
+                stored = db.execute("SELECT netlist FROM designs WHERE hash = ?", (design_hash,)).fetchone()[0]
+                labeling = None if stored == text else _labeling(netlist, json.loads(stored))
+                # An exact copy needs nothing, a renamed one its labeling; anything else keeps its own text
+                self._upsert_iteration(db, run_id, iteration, netlist=None if stored == text or labeling else text,
+                                       design_hash=design_hash, labeling=json.dumps(labeling) if labeling else None,
+                                       passed=int(not findings), feedback=feedback, umpire_s=umpire_s)
+            db.execute("DELETE FROM findings WHERE run_id = ? AND iteration = ?", (run_id, iteration))
+            db.executemany("INSERT INTO findings (run_id, iteration, rule_id, level, details) VALUES (?, ?, ?, ?, ?)",
+                           [(run_id, iteration, f['rule_id'], f.get('level'), json.dumps(f.get('details', {}), default=str))
+                            for f in findings])
+        return new_design
+
+    def finish_run(self, run_id: int, status: str, iterations: int, elapsed_s: float) -> None:
+        with self._transaction() as db:
+            db.execute("UPDATE runs SET status = ?, iterations = ?, finished = ?, elapsed_s = ? WHERE id = ?",
+                       (status, iterations, time.time(), elapsed_s, run_id))
+
+    # --- Queries ---
+    def find_runs(self, rule_id: Optional[str] = None, iteration: Optional[int] = None, model: Optional[str] = None,
+                  spec: Optional[str] = None, status: Optional[str] = None, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """
+        Returns the runs matching every given filter. `rule_id` (optionally on a given
+        `iteration`) matches runs where that rule fired; `model` matches runs where the
+        model answered that iteration; `spec` is a spec hash.
+        """
+        where, args = [], []
+        if rule_id is not None or model is not None or iteration is not None:
+            # Iteration-level filters select run ids from the indexed tables first.
+            alias = 'f' if rule_id is not None else 'i'
+            source = "findings f" if rule_id is not None else "iterations i"
+            if rule_id is not None and model is not None:
+                source += " JOIN iterations i ON i.run_id = f.run_id AND i.iteration = f.iteration"
+            conditions, sub_args = [], []
+            for column, value in (('f.rule_id', rule_id), ('i.model', model), (f'{alias}.iteration', iteration)):
+                if value is not None:
+                    conditions.append(f"{column} = ?")
+                    sub_args.append(value)
+            where.append(f"r.id IN (SELECT {alias}.run_id FROM {source} WHERE {' AND '.join(conditions)})")
+            args.extend(sub_args)
+        if spec is not None:
+            where.append("r.spec_hash = ?")
+            args.append(spec)
+        if status is not None:
+            where.append("r.status = ?")
+            args.append(status)
+        query = ("SELECT r.id, r.run_dir, r.spec_hash, r.status, r.iterations, r.started, r.elapsed_s FROM runs r"
+                 + (" WHERE " + " AND ".join(where) if where else "") + " ORDER BY r.id")
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self._connection().execute(query, args)]
+
+    def rule_counts(self, iteration: Optional[int] = None) -> Dict[str, int]:
+        """Number of runs in which each rule fired (on `iteration`, if given)."""
+        query = "SELECT rule_id, COUNT(DISTINCT run_id) AS n FROM findings"
+        args: tuple = ()
+        if iteration is not None:
+            query, args = query + " WHERE iteration = ?", (iteration,)
+        return {row['rule_id']: row['n'] for row in self._connection().execute(query + " GROUP BY rule_id", args)}
+
+    def find_design(self, netlist_or_hash: Any) -> Optional[Dict[str, Any]]:
+        """
+        Looks up a design by netlist (any renaming of it) or canonical hash. Returns
+        its hash, stored netlist, verdict, where it first appeared and how many
+        iterations produced it, or None.
+        """
+        design_hash = netlist_or_hash if isinstance(netlist_or_hash, str) else canonical_hash(netlist_or_hash)
+        db = self._connection()
+        row = db.execute("SELECT * FROM designs WHERE hash = ?", (design_hash,)).fetchone() if design_hash else None
+        if row is None:
+            return None
+        record = dict(row)
+        record['netlist'] = json.loads(record['netlist'])
+        record['occurrences'] = db.execute("SELECT COUNT(*) FROM iterations WHERE design_hash = ?", (design_hash,)).fetchone()[0]
+        return record
+
+    def design_counts(self, passed: Optional[bool] = None, min_occurrences: int = 1,
+                      limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Designs with the number of iterations that produced each, most frequent first."""
+        query = ("SELECT d.hash, d.passed, d.first_run_id, d.first_iteration, COUNT(i.run_id) AS occurrences "
+                 "FROM designs d JOIN iterations i ON i.design_hash = d.hash")
+        args: List[Any] = []
+        if passed is not None:
+            query += " WHERE d.passed = ?"
+            args.append(int(passed))
+        query += " GROUP BY d.hash HAVING COUNT(i.run_id) >= ? ORDER BY occurrences DESC, d.hash"
+        args.append(min_occurrences)
+        if limit is not None:
+            query += f" LIMIT {int(limit)}"
+        return [dict(row) for row in self._connection().execute(query, args)]
+
+    def status_counts(self) -> Dict[str, int]:
+        return {row['status']: row['n'] for row in self._connection().execute("SELECT status, COUNT(*) AS n FROM runs GROUP BY status")}
+
+    def get_run(self, run: str) -> Optional[Dict[str, Any]]:
+        """Looks up a run by id or run directory; includes its iterations."""
+        db = self._connection()
+        row = db.execute("SELECT * FROM runs WHERE id = ? OR run_dir = ?",
+                         (int(run) if str(run).isdigit() else -1, os.path.abspath(str(run)))).fetchone()
+        if row is None:
+            return None
+        record = dict(row)
+        record['iterations_data'] = [dict(r) for r in db.execute("SELECT * FROM iterations WHERE run_id = ? ORDER BY iteration", (row['id'],))]
+        for it in record['iterations_data']:
+            if it['netlist'] is None and it['design_hash']:
+                stored = db.execute("SELECT netlist FROM designs WHERE hash = ?", (it['design_hash'],)).fetchone()[0]
+                it['netlist'] = json.dumps(_relabel(json.loads(stored), json.loads(it['labeling']))) if it['labeling'] else stored
+        return record
+
+    # --- Export ---
+    def export_run(self, run: str, dest_dir: str) -> str:
+        """
+        Writes a stored run out in the run_* directory layout. Returns the directory.
+        """
+        record = self.get_run(run)
+        if record is None:
+            raise KeyError(f"No run '{run}' in {self.db_path}")
+        os.makedirs(dest_dir, exist_ok=True)
+        def write(name: str, text: Optional[str]) -> None:
+            if text is not None:
+                with open(os.path.join(dest_dir, name), 'w', encoding='utf-8') as f:
+                    f.write(text)
+        write("analog_specs_initial.txt", record['specs'])
+        for it in record['iterations_data']:
+            n = it['iteration']
+            write(f"prompt_v{n - 1}.md", it['prompt'])
+            write(f"llm_response_v{n}.txt", it['response'])
+            write(f"netlist_v{n}.json", json.dumps(json.loads(it['netlist']), indent=2) if it['netlist'] else None)
+            write(f"umpire_feedback_v{n}.md", it['feedback'])
+        return dest_dir
+
+# ==============================================================================
+# ### --- COMMAND LINE --- ###
+# ==============================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Query and export the run artifact store")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH, help='Artifact database (SQLite)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    query = commands.add_parser('query', help='List runs matching all given filters')
+    query.add_argument('--rule', type=str, default=None, help="Rule that fired, e.g. 'K1'")
+    query.add_argument('--iteration', type=int, default=None, help='Iteration the rule fired on / the model answered')
+    query.add_argument('--model', type=str, default=None, help='Model identifier')
+    query.add_argument('--spec-hash', type=str, default=None)
+    query.add_argument('--status', type=str, default=None, help="Run outcome, e.g. 'success' or 'failed'")
+    query.add_argument('--limit', type=int, default=None)
+    commands.add_parser('stats', help='Outcome and rule counts across all runs')
+    designs = commands.add_parser('designs', help='Distinct designs and how often they were produced')
+    designs.add_argument('--passed', action='store_true', help='Only designs that passed the Umpire')
+    designs.add_argument('--min-occurrences', type=int, default=1, help='Only designs produced at least this often')
+    designs.add_argument('--limit', type=int, default=20)
+    export = commands.add_parser('export', help='Write a run out in the run_* directory layout')
+    export.add_argument('run', help='Run id or original run directory')
+    export.add_argument('dest', help='Directory to write')
+    args = parser.parse_args()
+
+    store = ArtifactStore(args.db)
+    if args.command == 'query':
+        start = time.perf_counter()
+        runs = store.find_runs(args.rule, args.iteration, args.model, args.spec_hash, args.status, args.limit)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        print(f"{'Run':>7} {'Status':<15} {'Iter':>4} {'Spec hash':<17} Directory")
+        print("-" * 90)
+        for r in runs:
+            print(f"{r['id']:>7} {r['status']:<15} {r['iterations']:>4} {r['spec_hash']:<17} {r['run_dir']}")
+        print(f"\n{len(runs)} run(s) in {elapsed_ms:.1f} ms")
+    elif args.command == 'stats':
+        print("Outcomes: " + ", ".join(f"{s}: {n}" for s, n in sorted(store.status_counts().items())))
+        for rule_id, n in sorted(store.rule_counts().items()):
+            print(f"  - {rule_id}: fired in {n} run(s)")
+    elif args.command == 'designs':
+        rows = store.design_counts(True if args.passed else None, args.min_occurrences, args.limit)
+        print(f"{'Design':<17} {'Passed':<7} {'Seen':>5}  First seen")
+        print("-" * 60)
+        for d in rows:
+            print(f"{d['hash'][:16]:<17} {'yes' if d['passed'] else 'no':<7} {d['occurrences']:>5}  "
+                  f"run {d['first_run_id']}, iteration {d['first_iteration']}")
+    else:
+        try:
+            print(f"Exported to '{store.export_run(args.run, args.dest)}'")
+        except KeyError as e:
+            print(f"Error: {e.args[0]}")
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
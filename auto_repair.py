@@ -0,0 +1,185 @@
+import copy
+import json
+import argparse
+from typing import List, Dict, Any, Optional, Tuple
+
+from umpire import DiagnosticUmpire, COMPREHENSIVE_LIBRARY
+from block_library import suggest_block_types
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+MAX_REPAIR_PASSES: int = 5  # check -> repair rounds before the remaining findings go to the LLM
+BIAS_BLOCK: str = "SimpleBiasN"  # block added on a bias net left without a source (S1.2)
+
+# ==============================================================================
+# ### --- LOCAL AUTO-REPAIR --- ###
+# Some Umpire findings have exactly one sensible fix, the one the feedback text
+# already spells out:
+#   F0.4  unknown block_type one edit (or only letter case) away from a single
+#         library name -> use that name
+#   K1    NMOS-type active load on an NMOS gain stage -> the PMOS block with the
+#         same signal terminals, its power terminal moved to VDD
+#   S1.2  no bias source -> a SimpleBiasN on a gain stage's bias input net that
+#         has nothing driving it
+#   C1    floating net on a gain stage's bias input -> a SimpleBiasN on it
+# These are applied locally and the netlist is checked again, so only what is left
+# goes back to the LLM. Details are read under both the DiagnosticUmpire names
+# (component_id, load_id, ...) and the short ones used by the Umpire in stack.py.
+# A pass is only kept if it leaves the netlist with fewer FATAL/ERROR/WARNING
+# findings (compared in that order); otherwise the previous netlist is returned.
+# ==============================================================================
+
+def _detail(finding: Dict, *keys: str) -> Any:
+    details = finding.get('details') or {}
+    for key in keys:
+        if key in details:
+            return details[key]
+    return None
+
+def _severity(findings: List[Dict]) -> Tuple[int, int, int]:
+    levels = [f.get('level') for f in findings]
+    return levels.count('FATAL'), levels.count('ERROR'), levels.count('WARNING')
+
+class RepairEngine:
+    """Applies the mechanical fixes for F0.4, C1 (bias inputs), K1 and S1.2 findings and re-checks."""
+    def __init__(self, library: Dict[str, Any] = COMPREHENSIVE_LIBRARY, umpire: Optional[Any] = None):
+        self.library = library
+        self.umpire = umpire or DiagnosticUmpire(library)
+        self._fixers = {'F0.4': self._fix_f0_4, 'C1': self._fix_c1, 'K1': self._fix_k1, 'S1.2': self._fix_s1_2}
+
+    def repair(self, netlist: List[Dict], findings: Optional[List[Dict]] = None) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+        """
+        Returns (netlist, remaining findings, repairs applied). The input netlist is
+        not modified. Pass `findings` if the netlist was just checked.
+        """
+        if findings is None:
+            findings = self.umpire.check(netlist)
+        repairs: List[Dict] = []
+        if not isinstance(netlist, list) or not all(isinstance(c, dict) for c in netlist):
+            return netlist, findings, repairs
+        for _ in range(MAX_REPAIR_PASSES):
+            candidate = copy.deepcopy(netlist)
+            applied = []
+            for finding in findings:
+                fixer = self._fixers.get(finding.get('rule_id'))
+                repair = fixer(candidate, finding) if fixer else None
+                if repair:
+                    applied.append({'rule_id': finding['rule_id'], **repair})
+            if not applied:
+                break
+            remaining = self.umpire.check(candidate)
+            if _severity(remaining) >= _severity(findings):
+                break
+            netlist, findings = candidate, remaining
+            repairs.extend(applied)
+        return netlist, findings, repairs
+
+    # --- Fixers: edit the netlist in place and describe the change, or return None ---
+
+    def _fix_f0_4(self, netlist: List[Dict], finding: Dict) -> Optional[Dict]:
+        cid, block_type = _detail(finding, 'component_id', 'cid'), _detail(finding, 'block_type', 'bt')
+        component = self._component(netlist, cid)
+        if component is None or not isinstance(block_type, str) or component.get('block_type') != block_type:
+            return None
+        matches = suggest_block_types(self.library, block_type)
+        if len(matches) != 1:
+            return None  # no close name, or ambiguous: leave it to the LLM
+        component['block_type'] = matches[0]
+        return {'component_id': cid, 'action': f"block_type '{block_type}' -> '{matches[0]}'"}
+
+    def _fix_k1(self, netlist: List[Dict], finding: Dict) -> Optional[Dict]:
+        lid = _detail(finding, 'load_id', 'lid')
+        component = self._component(netlist, lid)
+        info = self.library.get(component.get('block_type')) if component else None
+        if not info or info.get('device_type') == 'PMOS':
+            return None  # unknown, or already replaced for another K1 finding on the same load
+        replacement = self._pmos_equivalent(info)
+        if replacement is None:
+            return None
+        old_type, new_info = component['block_type'], self.library[replacement]
+        connections = {t: net for t, net in component.get('connections', {}).items() if info['terminals'].get(t) != 'POWER'}
+        for terminal, role in new_info['terminals'].items():
+            if role == 'POWER':
+                connections[terminal] = 'GND' if 'gnd' in terminal.lower() else 'VDD'
+        component['block_type'], component['connections'] = replacement, connections
+        return {'component_id': lid, 'action': f"block_type '{old_type}' -> '{replacement}'"}
+
+    def _pmos_equivalent(self, info: Dict) -> Optional[str]:
+        """The single PMOS block with the same roles and the same non-power terminals as `info`."""
+        signal = {t: r for t, r in info['terminals'].items() if r != 'POWER'}
+        matches = [name for name, other in self.library.items()
+                   if other.get('device_type') == 'PMOS' and set(other.get('roles', [])) == set(info.get('roles', []))
+                   and {t: r for t, r in other.get('terminals', {}).items() if r != 'POWER'} == signal]
+        return matches[0] if len(matches) == 1 else None
+
+    def _fix_s1_2(self, netlist: List[Dict], finding: Dict) -> Optional[Dict]:
+        undriven = self._undriven_bias_nets(netlist)
+        return self._add_bias(netlist, undriven[0]) if undriven else None
+
+    def _fix_c1(self, netlist: List[Dict], finding: Dict) -> Optional[Dict]:
+        # Only the floating net of a gain stage bias input has an obvious fix
+        net = _detail(finding, 'net_name', 'n')
+        return self._add_bias(netlist, net) if net in self._undriven_bias_nets(netlist) else None
+
+    def _add_bias(self, netlist: List[Dict], net: str) -> Optional[Dict]:
+        bias_info = self.library.get(BIAS_BLOCK)
+        if not bias_info:
+            return None
+        output = next(t for t, r in bias_info['terminals'].items() if r == 'I_OUTPUT')
+        connections = {output: net}
+        for terminal, role in bias_info['terminals'].items():
+            if role == 'POWER':
+                connections[terminal] = 'GND' if 'gnd' in terminal.lower() else 'VDD'
+        ids = {c.get('id') for c in netlist}
+        cid = next(name for name in (f"BIAS_GEN{i or ''}" for i in range(len(ids) + 1)) if name not in ids)
+        netlist.append({'id': cid, 'block_type': BIAS_BLOCK, 'connections': connections})
+        return {'component_id': cid, 'action': f"added '{BIAS_BLOCK}' on net '{net}'"}
+
+    def _undriven_bias_nets(self, netlist: List[Dict]) -> List[str]:
+        """Nets on gain stage bias inputs (I_INPUT terminals named *bias*) with no current output on them."""
+        driven, nets = set(), []
+        for c in netlist:
+            terminals = self.library.get(c.get('block_type'), {}).get('terminals', {})
+            driven.update(net for t, net in c.get('connections', {}).items() if terminals.get(t) == 'I_OUTPUT')
+        for c in netlist:
+            info = self.library.get(c.get('block_type'), {})
+            if 'GAIN_STAGE' not in info.get('roles', []):
+                continue
+            for terminal, role in info.get('terminals', {}).items():
+                net = c.get('connections', {}).get(terminal)
+                if role == 'I_INPUT' and 'bias' in terminal.lower() and isinstance(net, str) and net not in driven \
+                        and net.upper() not in ('VDD', 'GND') and net not in nets:
+                    nets.append(net)
+        return nets
+
+    @staticmethod
+    def _component(netlist: List[Dict], cid: Any) -> Optional[Dict]:
+        return next((c for c in netlist if c.get('id') == cid), None) if cid is not None else None
+
+def repair_netlist(netlist: List[Dict], umpire: Optional[Any] = None, library: Dict[str, Any] = COMPREHENSIVE_LIBRARY) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """Convenience wrapper: RepairEngine(library, umpire).repair(netlist)."""
+    return RepairEngine(library, umpire).repair(netlist)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Apply the mechanical Umpire fixes (F0.4, C1 on bias inputs, K1, S1.2) to a netlist")
+    parser.add_argument('netlist', help='Netlist JSON file')
+    parser.add_argument('--output', type=str, default=None, help='Where to write the repaired netlist (default: print it)')
+    args = parser.parse_args()
+
+    with open(args.netlist, 'r', encoding='utf-8') as f:
+        netlist = json.load(f)
+    repaired, remaining, repairs = repair_netlist(netlist)
+    for r in repairs:
+        print(f"  > [{r['rule_id']}] {r['component_id']}: {r['action']}")
+    print(f"{len(repairs)} repair(s) applied, {len(remaining)} finding(s) left: "
+          f"{', '.join(sorted({f['rule_id'] for f in remaining})) or 'none'}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(repaired, f, indent=2)
+    else:
+        print(json.dumps(repaired, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import os
+import sys
+import json
+import argparse
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import List, Dict, Any, Tuple
+
+import stack
+import telemetry
+from contact_two import slugify
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+DEFAULT_WORKERS: int = 4  # design loops running at the same time
+DEFAULT_OUTPUT_DIR: str = "runs"
+SUMMARY_FILE: str = "batch_summary.json"
+
+# ==============================================================================
+# ### --- SPEC LOADING --- ###
+# A spec file is either in the text format written by the spec editor
+# (analog_specs.txt) or JSON: one {label: value} object, or a list of them for
+# several designs in one file. JSON specs are rendered into the text format so
+# every run sees the same kind of prompt.
+# ==============================================================================
+
+def format_specs(fields: Dict[str, Any]) -> str:
+    """Renders {label: value} pairs the way SpecEditorApp saves them."""
+    lines = ["--- Analog Circuit Design Specifications ---"]
+    for label, value in fields.items():
+        value = str(value).strip() if value is not None else ""
+        lines.append(f"{label:<40} {value or 'Not Specified'}")
+    return "\n".join(lines) + "\n"
+
+def load_spec_file(path: str) -> List[Tuple[str, str]]:
+    """Returns (name, specs text) for every design described in `path`."""
+    base = os.path.splitext(os.path.basename(path))[0]
+    with open(path, 'r', encoding='utf-8') as f:
+        content = f.read()
+    if not path.endswith('.json'):
+        return [(base, content)]
+    data = json.loads(content)
+    records = data if isinstance(data, list) else [data]
+    specs = []
+    for i, record in enumerate(records):
+        if not isinstance(record, dict):
+            raise ValueError(f"{path}: spec #{i} is not a JSON object")
+        name = record.get('Project Name') or (f"{base}_{i}" if len(records) > 1 else base)
+        specs.append((str(name), format_specs(record)))
+    return specs
+
+# ==============================================================================
+# ### --- BATCH DRIVER --- ###
+# ==============================================================================
+
+def run_one(name: str, specs: str, run_dir: str, resume: bool = False) -> Dict[str, Any]:
+    """Runs a single headless design loop; failures are reported, never raised."""
+    os.makedirs(run_dir, exist_ok=True)
+    with open(os.path.join(run_dir, "analog_specs_initial.txt"), 'w', encoding='utf-8') as f:
+        f.write(specs)
+    try:
+        result = stack.run_design_loop(specs, run_dir, resume=resume)
+    except Exception as e:
+        result = {'run_dir': run_dir, 'status': 'error', 'error': f"{type(e).__name__}: {e}", 'iterations': 0, 'elapsed_s': 0.0}
+    result['name'] = name
+    result['success'] = result['status'] == 'success'
+    return result
+
+def _percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+def run_batch(spec_files: List[str], output_dir: str = DEFAULT_OUTPUT_DIR, workers: int = DEFAULT_WORKERS) -> Dict[str, Any]:
+    """
+    Runs one design loop per spec across a pool of `workers` threads. Each run gets
+    its own run_* directory under `output_dir`; the summary is written to
+    `output_dir/batch_summary.json` and returned.
+    """
+    jobs = []
+    for path in spec_files:
+        with telemetry.span('spec_loading', source=path) as span:
+            jobs.extend(load_spec_file(path))
+            span['specs'] = len(jobs)
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    os.makedirs(output_dir, exist_ok=True)
+    start = datetime.now()
+
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        futures = {
+            executor.submit(run_one, name, specs, os.path.join(output_dir, f"run_{timestamp}_{i:03d}_{slugify(name)}")): name
+            for i, (name, specs) in enumerate(jobs)
+        }
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            print(f"[Batch] {len(results)}/{len(jobs)} '{result['name']}': {result['status']} "
+                  f"after {result['iterations']} iteration(s) in {result['elapsed_s']:.1f}s")
+
+    elapsed = (datetime.now() - start).total_seconds()
+    durations = [r['elapsed_s'] for r in results]
+    summary = {
+        'started': start.isoformat(timespec='seconds'),
+        'elapsed_s': elapsed,
+        'workers': workers,
+        'runs': len(results),
+        'status_counts': dict(Counter(r['status'] for r in results)),
+        'runs_per_minute': len(results) / elapsed * 60 if elapsed else 0.0,
+        'p50_run_s': _percentile(durations, 0.50),
+        'p95_run_s': _percentile(durations, 0.95),
+        'results': sorted(results, key=lambda r: r['run_dir']),
+    }
+    with open(os.path.join(output_dir, SUMMARY_FILE), 'w', encoding='utf-8') as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+def print_summary(summary: Dict[str, Any]) -> None:
+    print("\n" + "=" * 70)
+    print(f"BATCH COMPLETE: {summary['runs']} run(s) in {summary['elapsed_s']:.1f}s "
+          f"({summary['runs_per_minute']:.1f} runs/min, p50 {summary['p50_run_s']:.1f}s, p95 {summary['p95_run_s']:.1f}s)")
+    print("=" * 70)
+    for status, count in sorted(summary['status_counts'].items()):
+        print(f"  - {status}: {count}")
+    print(f"\n{'Run':<30} {'Status':<16} {'Iter':>4} {'Time (s)':>9}  Netlist")
+    print("-" * 95)
+    for r in summary['results']:
+        netlist = r.get('final_netlist') or r.get('last_netlist') or "-"
+        print(f"{r['name'][:30]:<30} {r['status']:<16} {r['iterations']:>4} {r['elapsed_s']:>9.1f}  {netlist}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run many design loops concurrently without the GUI")
+    parser.add_argument('specs', nargs='+', help='Spec files: analog_specs.txt format, or JSON ({label: value} or a list of them)')
+    parser.add_argument('--output-dir', type=str, default=DEFAULT_OUTPUT_DIR, help='Directory that receives the run_* directories')
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Design loops to run at the same time')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"Headless batch of {len(args.specs)} spec file(s) with {args.workers} worker(s)")
+    print("=" * 70)
+    summary = run_batch(args.specs, args.output_dir, args.workers)
+    print_summary(summary)
+    print(f"\nSummary written to '{os.path.join(args.output_dir, SUMMARY_FILE)}'")
+    if summary['status_counts'].get('success', 0) < summary['runs']:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,317 @@
+import io
+import os
+import sys
+import json
+import time
+import random
+import argparse
+import platform
+import tempfile
+import subprocess
+import tracemalloc
+from contextlib import redirect_stdout
+from typing import List, Dict, Any, Callable, Optional
+
+import stack
+import umpire
+import telemetry
+import connectivity
+import estimator
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+DEFAULT_SIZES: List[int] = [10, 100, 1000, 10000, 100000]
+DEFAULT_REPEAT: int = 3
+DEFAULT_SEED: int = 0
+# A benchmark is reported as a regression when it is this many times slower than the baseline.
+DEFAULT_TOLERANCE: float = 1.25
+# Prose surrounding the netlist in synthetic LLM responses, in characters.
+RESPONSE_PROSE_CHARS: int = 2000
+# Largest batch of candidates in the 'estimator' group
+ESTIMATOR_MAX_BATCH: int = 10000
+# Modules whose import time is measured by the 'startup' group (the CLI entry points).
+STARTUP_MODULES: List[str] = ['stack', 'contact_two', 'umpire', 'auto_repair', 'netlist_hash', 'block_library', 'artifact_store', 'warm_worker', 'connectivity', 'estimator']
+# Heavy packages that must only be imported on first use; importing one at startup is a regression.
+LAZY_IMPORTS: List[str] = ['openai', 'tkinter', 'tiktoken', 'numpy', 'scipy']
+
+# ==============================================================================
+# ### --- SYNTHETIC NETLIST GENERATOR --- ###
+# ==============================================================================
+
+def _amplifier_cell(k: int) -> List[Dict[str, Any]]:
+    """One two-stage amplifier built from library blocks; every internal net has two ends."""
+    return [
+        {'id': f'DP{k}', 'block_type': 'DifferentialPairN', 'connections': {'v_in+': 'IN+', 'v_in-': 'IN-', 'i_out1': f'a{k}', 'i_out2': f'b{k}', 'i_in_bias': f'bias{k}', 'pwr_vdd': 'VDD', 'pwr_gnd': 'GND'}},
+        {'id': f'LD{k}', 'block_type': 'CurrentMirrorP', 'connections': {'i_in_ref': f'a{k}', 'i_out_load': f'b{k}', 'pwr_vdd': 'VDD'}},
+        {'id': f'BS{k}', 'block_type': 'SimpleBiasN', 'connections': {'i_out_bias': f'bias{k}', 'pwr_gnd': 'GND'}},
+        {'id': f'CS{k}', 'block_type': 'CommonSourceN', 'connections': {'v_in': f'b{k}', 'i_out': f'out{k}', 'pwr_gnd': 'GND'}},
+        {'id': f'OL{k}', 'block_type': 'CurrentMirrorP', 'connections': {'i_in_ref': 'REF', 'i_out_load': f'out{k}', 'pwr_vdd': 'VDD'}},
+    ]
+
+def generate_netlist(n_components: int, seed: int = DEFAULT_SEED, error_rate: float = 0.01) -> List[Dict[str, Any]]:
+    """
+    Returns a reproducible netlist of `n_components` blocks from COMPREHENSIVE_LIBRARY.
+    A fraction `error_rate` of the cells gets an injected defect (an NMOS load that
+    trips K1, or a floating net that trips C1) so the rules have work to report.
+    """
+    rng = random.Random(seed)
+    netlist: List[Dict[str, Any]] = []
+    k = 0
+    while len(netlist) < n_components:
+        cell = _amplifier_cell(k)
+        if rng.random() < error_rate:
+            if rng.random() < 0.5:
+                cell[1] = {'id': f'LD{k}', 'block_type': 'CurrentMirrorN_Load', 'connections': {'i_in_ref': f'a{k}', 'i_out_load': f'b{k}', 'pwr_gnd': 'GND'}}
+            else:
+                cell[2]['connections']['i_out_bias'] = f'float{k}'
+        netlist.extend(cell)
+        k += 1
+    return netlist[:n_components]
+
+def generate_llm_response(netlist: List[Dict[str, Any]], seed: int = DEFAULT_SEED) -> str:
+    """Returns an LLM-style response: reasoning, the netlist in a ```json block, then trailing prose."""
+    rng = random.Random(seed)
+    words = ["gain", "bias", "mirror", "load", "stage", "headroom", "swing", "pole", "node", "current"]
+    def prose(n_chars: int) -> str:
+        text = []
+        while sum(len(w) + 1 for w in text) < n_chars:
+            text.append(rng.choice(words))
+        return " ".join(text)
+    return ("<think>" + prose(RESPONSE_PROSE_CHARS) + "</think>\n\nHere is the corrected design:\n\n"
+            + "```json\n" + json.dumps(netlist, indent=2) + "\n```\n\n" + prose(RESPONSE_PROSE_CHARS // 2))
+
+# ==============================================================================
+# ### --- MEASUREMENT --- ###
+# ==============================================================================
+
+def measure(fn: Callable[[], Any], repeat: int = DEFAULT_REPEAT) -> Dict[str, float]:
+    """Times `fn` (best of `repeat`) and reports the peak memory of one extra traced run."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    tracemalloc.start()
+    try:
+        fn()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return {'seconds': best, 'peak_mib': peak / (1024 * 1024)}
+
+def bench_umpire(sizes: List[int], repeat: int, seed: int, tmp_dir: str) -> List[Dict[str, Any]]:
+    """Full Umpire.check and a one-component IncrementalUmpire update for each size."""
+    results = []
+    umpire_instance = stack.Umpire(stack.COMPREHENSIVE_LIBRARY)
+    for size in sizes:
+        netlist = generate_netlist(size, seed)
+        stats = measure(lambda: umpire_instance.check(netlist), repeat)
+        results.append({'benchmark': 'Umpire.check', 'size': size, **stats})
+
+        incremental = stack.IncrementalUmpire(stack.COMPREHENSIVE_LIBRARY)
+        incremental.check(netlist)
+        edited = netlist[:-1] + [{**netlist[-1], 'id': f"{netlist[-1]['id']}_edit"}]
+        versions = [edited, netlist]
+        def toggle():
+            versions.reverse()
+            incremental.check(versions[0])
+        stats = measure(toggle, repeat)
+        results.append({'benchmark': 'IncrementalUmpire.check (1-component delta)', 'size': size, **stats})
+    return results
+
+def bench_diagnostic_umpire(sizes: List[int], repeat: int, seed: int, tmp_dir: str) -> List[Dict[str, Any]]:
+    """DiagnosticUmpire.check and DiagnosticFeedbackGenerator.generate_feedback_file for each size."""
+    results = []
+    umpire_instance = umpire.DiagnosticUmpire(umpire.COMPREHENSIVE_LIBRARY)
+    feedback_gen = umpire.DiagnosticFeedbackGenerator(umpire_instance)
+    feedback_file = os.path.join(tmp_dir, "feedback.md")
+    for size in sizes:
+        netlist = generate_netlist(size, seed)
+        stats = measure(lambda: umpire_instance.check(netlist), repeat)
+        results.append({'benchmark': 'DiagnosticUmpire.check', 'size': size, **stats})
+        stats = measure(lambda: feedback_gen.generate_feedback_file(netlist, feedback_file), repeat)
+        results.append({'benchmark': 'DiagnosticFeedbackGenerator.generate_feedback_file', 'size': size, **stats})
+    return results
+
+def bench_connectivity(sizes: List[int], repeat: int, seed: int, tmp_dir: str) -> List[Dict[str, Any]]:
+    """The connectivity graph behind rules C2-C4: building it, then the pieces and the input reachability."""
+    results = []
+    connectivity._sparse()  # import NumPy/SciPy outside the timings
+    for size in sizes:
+        netlist = generate_netlist(size, seed)
+        stats = measure(lambda: connectivity.ConnectivityGraph(netlist, umpire.COMPREHENSIVE_LIBRARY), repeat)
+        results.append({'benchmark': 'ConnectivityGraph', 'size': size, **stats})
+        graph = connectivity.ConnectivityGraph(netlist, umpire.COMPREHENSIVE_LIBRARY)
+        stats = measure(graph.pieces, repeat)
+        results.append({'benchmark': 'ConnectivityGraph.pieces', 'size': size, **stats})
+        stats = measure(graph.unreachable_inputs, repeat)
+        results.append({'benchmark': 'ConnectivityGraph.unreachable_inputs', 'size': size, **stats})
+    return results
+
+def bench_estimator(sizes: List[int], repeat: int, seed: int, tmp_dir: str) -> List[Dict[str, Any]]:
+    """estimate_batch over `size` two-stage amplifier candidates (sizes above ESTIMATOR_MAX_BATCH are skipped)."""
+    results = []
+    estimator._numpy()  # import NumPy outside the timings
+    for size in [s for s in sizes if s <= ESTIMATOR_MAX_BATCH]:
+        candidates = [_amplifier_cell(k) for k in range(size)]
+        stats = measure(lambda: estimator.estimate_batch(candidates), repeat)
+        results.append({'benchmark': 'estimate_batch (candidates)', 'size': size, **stats})
+    return results
+
+def bench_parsing(sizes: List[int], repeat: int, seed: int, tmp_dir: str) -> List[Dict[str, Any]]:
+    """parse_llm_output_to_json on a synthetic response containing a netlist of each size."""
+    results = []
+    response_file = os.path.join(tmp_dir, "llm_response.txt")
+    for size in sizes:
+        with open(response_file, 'w', encoding='utf-8') as f:
+            f.write(generate_llm_response(generate_netlist(size, seed), seed))
+        stats = measure(lambda: stack.parse_llm_output_to_json(response_file), repeat)
+        results.append({'benchmark': 'parse_llm_output_to_json', 'size': size, **stats})
+    return results
+
+def bench_prompts(sizes: List[int], repeat: int, seed: int, tmp_dir: str) -> List[Dict[str, Any]]:
+    """Initial and correction prompt construction, with a previous netlist of each size."""
+    results = []
+    with open(os.path.join(os.path.dirname(os.path.abspath(__file__)), "analog_specs.txt"), 'r', encoding='utf-8') as f:
+        specs = f.read()
+    stats = measure(lambda: stack.build_initial_prompt(specs), repeat)
+    results.append({'benchmark': 'build_initial_prompt', 'size': 0, **stats})
+    feedback = "- **Rule C1: Floating Net**\n" * 20
+    for size in sizes:
+        previous = generate_netlist(size, seed)
+        stats = measure(lambda: stack.build_correction_prompt(previous, feedback), repeat)
+        results.append({'benchmark': 'build_correction_prompt', 'size': size, **stats})
+    return results
+
+# --- Startup ---
+
+def import_times(module: str) -> List[Dict[str, Any]]:
+    """
+    Imports `module` in a fresh interpreter under `python -X importtime` and returns
+    one entry per imported module, {'module', 'self_us', 'cumulative_us', 'depth'},
+    in the order the interpreter reports them (dependencies before their importers).
+    """
+    repo_dir = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=repo_dir,
+                          capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Importing '{module}' failed:\n{proc.stderr.strip()[-2000:]}")
+    entries = []
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_us, cumulative_us, name = line[len('import time:'):].split('|')
+        entries.append({'module': name.strip(), 'self_us': int(self_us), 'cumulative_us': int(cumulative_us),
+                        'depth': (len(name) - len(name.lstrip()) - 1) // 2})
+    return entries
+
+def bench_startup(sizes: List[int], repeat: int, seed: int, tmp_dir: str) -> List[Dict[str, Any]]:
+    """Import time of each entry point in a fresh interpreter (best of `repeat`); sizes are ignored."""
+    results = []
+    for module in STARTUP_MODULES:
+        best, eager = None, []
+        for _ in range(repeat):
+            entries = import_times(module)
+            top = next(e for e in reversed(entries) if e['module'] == module and e['depth'] == 0)
+            best = top['cumulative_us'] if best is None else min(best, top['cumulative_us'])
+            eager = sorted({e['module'].split('.')[0] for e in entries} & set(LAZY_IMPORTS))
+        results.append({'benchmark': f'import {module}', 'size': 0, 'seconds': best / 1e6, 'peak_mib': 0.0, 'eager_imports': eager})
+    return results
+
+def print_import_report(module: str, top: int) -> None:
+    """The `top` modules with the highest cumulative import time when importing `module`."""
+    entries = import_times(module)
+    print(f"{'Module':<52} {'Self (ms)':>10} {'Cumulative (ms)':>16}")
+    print("-" * 80)
+    for e in sorted(entries, key=lambda e: e['cumulative_us'], reverse=True)[:top]:
+        print(f"{e['module']:<52} {e['self_us'] / 1000:>10.2f} {e['cumulative_us'] / 1000:>16.2f}")
+
+BENCHMARKS: Dict[str, Callable[[List[int], int, int, str], List[Dict[str, Any]]]] = {
+    'umpire': bench_umpire,
+    'diagnostic': bench_diagnostic_umpire,
+    'connectivity': bench_connectivity,
+    'estimator': bench_estimator,
+    'parsing': bench_parsing,
+    'prompts': bench_prompts,
+    'startup': bench_startup,
+}
+
+def run_benchmarks(names: List[str], sizes: List[int], repeat: int, seed: int) -> List[Dict[str, Any]]:
+    """Runs the named benchmark groups; their console output and telemetry are suppressed."""
+    telemetry.TELEMETRY_ENABLED = False
+    results = []
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        for name in names:
+            print(f"Running '{name}' benchmarks...", file=sys.stderr)
+            with redirect_stdout(io.StringIO()):
+                results.extend(BENCHMARKS[name](sizes, repeat, seed, tmp_dir))
+    return results
+
+# ==============================================================================
+# ### --- BASELINES --- ###
+# ==============================================================================
+
+def save_baseline(results: List[Dict[str, Any]], path: str) -> None:
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump({'python': platform.python_version(), 'machine': platform.machine(), 'results': results}, f, indent=2)
+    print(f"Baseline saved to '{path}'")
+
+def compare_to_baseline(results: List[Dict[str, Any]], path: str, tolerance: float) -> List[Dict[str, Any]]:
+    """Annotates results with their ratio to the baseline; returns those slower than `tolerance`."""
+    with open(path, 'r', encoding='utf-8') as f:
+        baseline = {(r['benchmark'], r['size']): r for r in json.load(f)['results']}
+    regressions = []
+    for r in results:
+        base = baseline.get((r['benchmark'], r['size']))
+        if base and base['seconds'] > 0:
+            r['ratio'] = r['seconds'] / base['seconds']
+            if r['ratio'] > tolerance:
+                regressions.append(r)
+    return regressions
+
+def print_results(results: List[Dict[str, Any]]) -> None:
+    print(f"{'Benchmark':<52} {'Size':>8} {'Time (ms)':>12} {'Peak (MiB)':>11} {'vs base':>8}")
+    print("-" * 95)
+    for r in results:
+        ratio = f"{r['ratio']:.2f}x" if 'ratio' in r else "-"
+        print(f"{r['benchmark']:<52} {r['size']:>8} {r['seconds'] * 1000:>12.3f} {r['peak_mib']:>11.2f} {ratio:>8}")
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmarks for the validation, parsing and prompt hot paths and startup time")
+    parser.add_argument('--only', nargs='+', choices=list(BENCHMARKS), default=list(BENCHMARKS), help='Benchmark groups to run')
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Netlist sizes (components)')
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEAT, help='Timed runs per measurement (best is reported)')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Seed for the synthetic netlist generator')
+    parser.add_argument('--save-baseline', type=str, default=None, help='Write the results to this JSON file')
+    parser.add_argument('--compare', type=str, default=None, help='Compare against a baseline JSON file')
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help='Slowdown factor counted as a regression')
+    parser.add_argument('--import-report', type=str, default=None, metavar='MODULE',
+                        help='Only print where the import time of MODULE goes (python -X importtime, slowest first)')
+    parser.add_argument('--top', type=int, default=25, help='Modules listed by --import-report')
+    args = parser.parse_args()
+
+    if args.import_report:
+        print_import_report(args.import_report, args.top)
+        return
+
+    results = run_benchmarks(args.only, args.sizes, args.repeat, args.seed)
+    regressions: Optional[List[Dict[str, Any]]] = None
+    if args.compare:
+        regressions = compare_to_baseline(results, args.compare, args.tolerance)
+    print_results(results)
+    if args.save_baseline:
+        save_baseline(results, args.save_baseline)
+    eager = [r for r in results if r.get('eager_imports')]
+    for r in eager:
+        print(f"\n{r['benchmark']} imports {', '.join(r['eager_imports'])} at startup; they must be imported on first use.")
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) slower than {args.tolerance:.2f}x the baseline:")
+        for r in regressions:
+            print(f"  - {r['benchmark']} (size {r['size']}): {r['ratio']:.2f}x")
+    if regressions or eager:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
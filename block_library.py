@@ -0,0 +1,276 @@
+import os
+import sys
+import json
+import math
+import time
+import marshal
+import hashlib
+import argparse
+import threading
+from collections.abc import Mapping
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+# The block library file; BLOCK_LIBRARY_PATH in the environment overrides it.
+DEFAULT_LIBRARY_PATH: str = os.environ.get('BLOCK_LIBRARY_PATH') or os.path.join(os.path.dirname(os.path.abspath(__file__)), "block_library.json")
+# Bump when LibraryIndex changes shape, so indexes stored by older code are rebuilt.
+INDEX_VERSION: int = 2
+TERMINAL_ROLES: Tuple[str, ...] = ('V_INPUT', 'I_INPUT', 'I_OUTPUT', 'POWER')
+
+# ==============================================================================
+# ### --- COMPILED LIBRARY INDEX --- ###
+# block_library.json is the one definition of the blocks the LLM may use. It is
+# compiled once into a LibraryIndex: block names by role and a deletion index
+# over the lower-cased names that finds the names within one edit of a typo
+# without scanning the library. The index is stored next to the compiled Python
+# files (__pycache__/block_library.<content hash>.v<INDEX_VERSION>.marshal), so a
+# new process only hashes the file and loads it; any edit to the file changes the
+# hash and the index is rebuilt. It is stored with marshal as plain dicts, tuples
+# and strings: unlike pickle, loading it cannot construct objects or run code, so
+# a tampered file can at worst give wrong suggestions. The directory is trusted
+# as much as the .pyc files beside it.
+# ==============================================================================
+
+def within_one_edit(a: str, b: str) -> bool:
+    """True if `a` becomes `b` by at most one insertion, deletion or substitution."""
+    if abs(len(a) - len(b)) > 1:
+        return False
+    if len(a) > len(b):
+        a, b = b, a
+    i = 0
+    while i < len(a) and a[i] == b[i]:
+        i += 1
+    return a[i + (len(a) == len(b)):] == b[i + 1:]
+
+def _deletions(word: str) -> List[str]:
+    return [word] + [word[:i] + word[i + 1:] for i in range(len(word))]
+
+def _is_number(value: Any) -> bool:
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and math.isfinite(value)
+
+def _validate_small_signal(name: str, model: Any, terminals: Dict[str, str]) -> None:
+    """Raises ValueError unless `model` is {'g': [[row, col, S], ...], 'c': {terminal: F}, 'i_supply': A} over the block's terminals."""
+    if not isinstance(model, dict) or not isinstance(model.get('g'), list) or not isinstance(model.get('c'), dict):
+        raise ValueError(f"Block '{name}': 'small_signal' needs a 'g' list and a 'c' object.")
+    for entry in model['g']:
+        if not (isinstance(entry, list) and len(entry) == 3 and entry[0] in terminals and entry[1] in terminals and _is_number(entry[2])):
+            raise ValueError(f"Block '{name}': small-signal entry {entry!r} is not [row terminal, column terminal, siemens].")
+    for terminal, cap in model['c'].items():
+        if terminal not in terminals or not _is_number(cap) or cap < 0:
+            raise ValueError(f"Block '{name}': small-signal capacitance {terminal!r}: {cap!r} is not a terminal and farads >= 0.")
+    if not _is_number(model.get('i_supply')) or model['i_supply'] < 0:
+        raise ValueError(f"Block '{name}': small-signal 'i_supply' must be a current in amperes >= 0.")
+
+def validate_library(blocks: Any) -> None:
+    """
+    Raises ValueError naming the first block that is not {'device_type', 'roles': [...],
+    'terminals': {name: role}}, or whose optional 'small_signal' model (see estimator.py) is malformed.
+    """
+    if not isinstance(blocks, dict) or not blocks:
+        raise ValueError("The block library must be a non-empty JSON object of block_type -> block.")
+    for name, info in blocks.items():
+        if not isinstance(info, dict) or not isinstance(info.get('roles'), list) or not isinstance(info.get('terminals'), dict):
+            raise ValueError(f"Block '{name}' needs a 'roles' list and a 'terminals' object.")
+        for terminal, role in info['terminals'].items():
+            if role not in TERMINAL_ROLES:
+                raise ValueError(f"Block '{name}': terminal '{terminal}' has unknown role '{role}' (expected one of {', '.join(TERMINAL_ROLES)}).")
+        if 'small_signal' in info:
+            _validate_small_signal(name, info['small_signal'], info['terminals'])
+
+class LibraryIndex:
+    """Lookup tables over one version of the block library; built by compile_index()."""
+    __slots__ = ('version', 'content_hash', 'blocks', 'by_role', '_deletes')
+    def __init__(self, blocks: Dict[str, Dict[str, Any]], content_hash: str,
+                 tables: Optional[Tuple[Dict[str, Tuple[str, ...]], Dict[str, Tuple[str, ...]]]] = None):
+        self.version = INDEX_VERSION
+        self.content_hash = content_hash
+        self.blocks = blocks
+        self.by_role, self._deletes = tables if tables is not None else self._build(blocks)
+
+    @staticmethod
+    def _build(blocks: Dict[str, Dict[str, Any]]) -> Tuple[Dict[str, Tuple[str, ...]], Dict[str, Tuple[str, ...]]]:
+        by_role: Dict[str, List[str]] = {}
+        deletes: Dict[str, List[str]] = {}
+        for name, info in blocks.items():
+            for role in info.get('roles', []):
+                by_role.setdefault(role, []).append(name)
+            for key in set(_deletions(name.lower())):
+                deletes.setdefault(key, []).append(name)
+        return ({role: tuple(names) for role, names in by_role.items()},
+                {key: tuple(names) for key, names in deletes.items()})
+
+    def tables(self) -> Tuple[Any, ...]:
+        """The index as plain dicts, tuples and strings, for marshal (see load_index)."""
+        return (self.version, self.content_hash, self.blocks, self.by_role, self._deletes)
+
+    @classmethod
+    def from_tables(cls, tables: Any) -> Optional['LibraryIndex']:
+        """The index stored by tables(), or None if `tables` is from another INDEX_VERSION or malformed."""
+        if not (isinstance(tables, tuple) and len(tables) == 5 and tables[0] == INDEX_VERSION
+                and isinstance(tables[1], str) and all(isinstance(t, dict) for t in tables[2:])):
+            return None
+        return cls(tables[2], tables[1], (tables[3], tables[4]))
+
+    def suggest(self, block_type: str) -> List[str]:
+        """Library names within one edit of `block_type`, ignoring letter case."""
+        query = block_type.lower()
+        candidates = {name for key in _deletions(query) for name in self._deletes.get(key, ())}
+        return sorted(name for name in candidates if within_one_edit(query, name.lower()))
+
+def content_hash(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+def compile_index(blocks: Dict[str, Dict[str, Any]], digest: Optional[str] = None) -> LibraryIndex:
+    """Validates `blocks` and builds their index."""
+    validate_library(blocks)
+    if digest is None:
+        digest = content_hash(json.dumps(blocks, sort_keys=True).encode('utf-8'))
+    return LibraryIndex(blocks, digest)
+
+def _index_path(library_path: str, digest: str) -> str:
+    directory, name = os.path.split(os.path.abspath(library_path))
+    return os.path.join(directory, "__pycache__", f"{os.path.splitext(name)[0]}.{digest[:16]}.v{INDEX_VERSION}.marshal")
+
+def load_index(library_path: str = DEFAULT_LIBRARY_PATH) -> LibraryIndex:
+    """Returns the index for the current contents of `library_path`, from the stored index when it is up to date."""
+    with open(library_path, 'rb') as f:
+        data = f.read()
+    digest = content_hash(data)
+    index_path = _index_path(library_path, digest)
+    try:
+        with open(index_path, 'rb') as f:
+            index = LibraryIndex.from_tables(marshal.loads(f.read()))
+        if index is not None and index.content_hash == digest:
+            return index
+    except (OSError, EOFError, ValueError, TypeError):
+        pass  # missing, stale or unreadable: rebuild below
+    try:
+        blocks = json.loads(data)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Block library '{library_path}' is not valid JSON: {e}") from e
+    index = compile_index(blocks, digest)
+    try:
+        os.makedirs(os.path.dirname(index_path), exist_ok=True)
+        tmp_path = f"{index_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            marshal.dump(index.tables(), f)
+        os.replace(tmp_path, index_path)
+        # Indexes of earlier versions of the file are not needed any more
+        prefix = os.path.basename(index_path).split('.')[0] + '.'
+        for entry in os.scandir(os.path.dirname(index_path)):
+            if entry.name.startswith(prefix) and entry.name.endswith(('.marshal', '.pickle')) and entry.path != index_path:
+                os.remove(entry.path)
+    except OSError:
+        pass  # read-only install: the index is simply rebuilt next time
+    return index
+
+# ==============================================================================
+# ### --- LAZY LIBRARY --- ###
+# BlockLibrary is the read-only mapping that umpire.py and stack.py export as
+# COMPREHENSIVE_LIBRARY. Nothing is read until the first lookup, so importing a
+# module costs nothing however large the library grows. Instances for the same
+# file share one index, and a pickled BlockLibrary (e.g. sent to a worker
+# process) carries only its path.
+# ==============================================================================
+
+_INDEXES: Dict[str, LibraryIndex] = {}
+_INDEXES_LOCK = threading.Lock()
+
+class BlockLibrary(Mapping):
+    """block_type -> block info, loaded from a library file on first use."""
+    def __init__(self, path: str = DEFAULT_LIBRARY_PATH):
+        self.path = os.path.abspath(path)
+        self._index: Optional[LibraryIndex] = None
+
+    @property
+    def index(self) -> LibraryIndex:
+        if self._index is None:
+            with _INDEXES_LOCK:
+                if self.path not in _INDEXES:
+                    _INDEXES[self.path] = load_index(self.path)
+                self._index = _INDEXES[self.path]
+            # Lookups are the hot path of every rule: go straight to the dict from now on
+            self.get = self._index.blocks.get
+        return self._index
+
+    def reload(self) -> None:
+        """Re-reads the library file (for edits made while the process runs)."""
+        with _INDEXES_LOCK:
+            _INDEXES.pop(self.path, None)
+        self._index = None
+        self.__dict__.pop('get', None)
+
+    @property
+    def content_hash(self) -> str:
+        return self.index.content_hash
+
+    def __getitem__(self, block_type: str) -> Dict[str, Any]:
+        return self.index.blocks[block_type]
+
+    def __contains__(self, block_type: object) -> bool:
+        return block_type in self.index.blocks
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self.index.blocks)
+
+    def __len__(self) -> int:
+        return len(self.index.blocks)
+
+    def get(self, block_type: str, default: Any = None) -> Any:
+        return self.index.blocks.get(block_type, default)
+
+    def to_dict(self) -> Dict[str, Dict[str, Any]]:
+        return dict(self.index.blocks)
+
+    def with_role(self, role: str) -> Tuple[str, ...]:
+        return self.index.by_role.get(role, ())
+
+    def suggest(self, block_type: str) -> List[str]:
+        return self.index.suggest(block_type)
+
+    def __reduce__(self):
+        return (BlockLibrary, (self.path,))
+
+    def __repr__(self) -> str:
+        state = f"{len(self)} blocks, {self.content_hash[:12]}" if self._index else "not loaded"
+        return f"BlockLibrary({self.path!r}, {state})"
+
+LIBRARY = BlockLibrary()
+
+def suggest_block_types(library: Any, block_type: str) -> List[str]:
+    """Names in `library` within one edit of `block_type`: from the index for a BlockLibrary, by scanning a plain dict."""
+    if not isinstance(block_type, str):
+        return []
+    if isinstance(library, BlockLibrary):
+        return library.suggest(block_type)
+    return sorted(name for name in library if within_one_edit(block_type.lower(), name.lower()))
+
+# ==============================================================================
+# ### --- COMMAND LINE --- ###
+# ==============================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate and compile the block library, or look up block names")
+    parser.add_argument('--library', type=str, default=DEFAULT_LIBRARY_PATH, help='Block library JSON file')
+    parser.add_argument('--suggest', type=str, default=None, metavar='NAME', help='Print the block types within one edit of NAME')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    try:
+        index = load_index(args.library)
+    except (OSError, ValueError) as e:
+        print(f"Error: {e}")
+        sys.exit(1)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    if args.suggest is not None:
+        print("\n".join(index.suggest(args.suggest)) or f"No block type within one edit of '{args.suggest}'.")
+        return
+    print(f"{len(index.blocks)} block(s) in '{args.library}' (content {index.content_hash[:16]}, index v{index.version}), loaded in {elapsed_ms:.1f} ms")
+    for role, names in sorted(index.by_role.items()):
+        print(f"  - {role}: {len(names)}")
+
+if __name__ == "__main__":
+    main()
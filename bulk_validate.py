@@ -0,0 +1,167 @@
+import os
+import sys
+import json
+import time
+import fnmatch
+import argparse
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from umpire import DiagnosticUmpire, COMPREHENSIVE_LIBRARY
+from netlist_hash import VerdictCache, CachedUmpire
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+DEFAULT_PATTERN: str = "netlist_v*.json"
+DEFAULT_OUTPUT_FILE: str = "verdicts.jsonl"
+DEFAULT_CHUNK_SIZE: int = 64  # netlists per task sent to a worker process
+
+# ==============================================================================
+# ### --- INPUT STREAMING --- ###
+# A task is ('file', path) for a netlist JSON file or ('line', source, text) for one
+# line of a JSONL file. Workers read and parse the JSON themselves, so the parent
+# only walks directories and reads lines.
+# ==============================================================================
+
+def iter_tasks(paths: List[str], pattern: str = DEFAULT_PATTERN) -> Iterator[Tuple]:
+    """Yields validation tasks for every netlist found under `paths`."""
+    for path in paths:
+        if os.path.isdir(path):
+            for dirpath, dirnames, filenames in os.walk(path):
+                dirnames.sort()
+                for name in sorted(filenames):
+                    if fnmatch.fnmatch(name, pattern):
+                        yield ('file', os.path.join(dirpath, name))
+        elif path.endswith('.jsonl'):
+            with open(path, 'r', encoding='utf-8') as f:
+                for line_no, line in enumerate(f, 1):
+                    if line.strip():
+                        yield ('line', f"{path}:{line_no}", line)
+        else:
+            yield ('file', path)
+
+def iter_chunks(tasks: Iterator[Tuple], size: int) -> Iterator[List[Tuple]]:
+    chunk: List[Tuple] = []
+    for task in tasks:
+        chunk.append(task)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+# ==============================================================================
+# ### --- WORKER --- ###
+# ==============================================================================
+
+_UMPIRE: Optional[DiagnosticUmpire] = None
+
+def _init_worker(verdict_cache: Optional[str] = None) -> None:
+    global _UMPIRE
+    _UMPIRE = DiagnosticUmpire(COMPREHENSIVE_LIBRARY)
+    if verdict_cache:
+        # Renamed copies of a design already validated (by any worker or run) cost one lookup
+        _UMPIRE = CachedUmpire(_UMPIRE, VerdictCache(verdict_cache))
+
+def load_task(task: Tuple) -> Tuple[str, Any, Dict[str, Any]]:
+    """Returns (source, netlist, goals) for a task. JSONL records may be a bare netlist or {"id", "netlist", "goals"}."""
+    if task[0] == 'file':
+        with open(task[1], 'r', encoding='utf-8') as f:
+            return task[1], json.load(f), {}
+    source, record = task[1], json.loads(task[2])
+    if isinstance(record, dict) and 'netlist' in record:
+        return str(record.get('id', source)), record['netlist'], record.get('goals') or {}
+    return source, record, {}
+
+def validate_task(task: Tuple) -> Dict[str, Any]:
+    """Checks one netlist and returns its verdict record."""
+    umpire_instance = _UMPIRE or DiagnosticUmpire(COMPREHENSIVE_LIBRARY)
+    start = time.perf_counter()
+    source = task[1]
+    try:
+        source, netlist, goals = load_task(task)
+        findings = umpire_instance.check(netlist, goals)
+    except Exception as e:
+        return {'source': source, 'passed': False, 'error': f"{type(e).__name__}: {e}", 'elapsed_ms': (time.perf_counter() - start) * 1000}
+    levels = Counter(f['level'] for f in findings)
+    return {
+        'source': source,
+        'passed': not findings,
+        'rule_ids': sorted({f['rule_id'] for f in findings}),
+        'levels': dict(levels),
+        'findings': findings,
+        'elapsed_ms': (time.perf_counter() - start) * 1000,
+    }
+
+def validate_chunk(chunk: List[Tuple]) -> List[Dict[str, Any]]:
+    return [validate_task(task) for task in chunk]
+
+# ==============================================================================
+# ### --- DRIVER --- ###
+# ==============================================================================
+
+def run_bulk_validation(paths: List[str], output_file: str, workers: Optional[int] = None,
+                        pattern: str = DEFAULT_PATTERN, chunk_size: int = DEFAULT_CHUNK_SIZE,
+                        verdict_cache: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Validates every netlist under `paths` across a process pool and writes one JSONL
+    verdict per netlist to `output_file` as results arrive. Returns summary counts.
+    With `verdict_cache` (a netlist_hash.VerdictCache database), designs already
+    checked are answered from it.
+    """
+    workers = workers or os.cpu_count() or 1
+    max_in_flight = workers * 2
+    totals, rule_counts = Counter(), Counter()
+    start = time.perf_counter()
+
+    with open(output_file, 'w', encoding='utf-8') as out, ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                                                             initargs=(verdict_cache,)) as executor:
+        pending = set()
+        def drain(done):
+            for future in done:
+                for verdict in future.result():
+                    out.write(json.dumps(verdict) + "\n")
+                    totals['netlists'] += 1
+                    totals['passed' if verdict['passed'] else 'failed'] += 1
+                    totals['unreadable'] += 'error' in verdict
+                    rule_counts.update(verdict.get('rule_ids', []))
+        # Keep a bounded number of chunks in flight so huge corpora stream through.
+        for chunk in iter_chunks(iter_tasks(paths, pattern), chunk_size):
+            if len(pending) >= max_in_flight:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                drain(done)
+            pending.add(executor.submit(validate_chunk, chunk))
+        drain(wait(pending).done)
+
+    elapsed = time.perf_counter() - start
+    return {'netlists': totals['netlists'], 'passed': totals['passed'], 'failed': totals['failed'],
+            'unreadable': totals['unreadable'], 'rule_counts': dict(rule_counts), 'elapsed_s': elapsed}
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Validate many netlists in parallel with the DiagnosticUmpire")
+    parser.add_argument('paths', nargs='+', help='Directories to search, netlist JSON files, or JSONL files (one netlist per line)')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT_FILE, help='Verdict file (JSONL)')
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--pattern', type=str, default=DEFAULT_PATTERN, help='File name pattern when searching directories')
+    parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE, help='Netlists per task sent to a worker')
+    parser.add_argument('--verdict-cache', type=str, default=None, help='Verdict cache database shared across runs (see netlist_hash.py)')
+    args = parser.parse_args()
+
+    print("=" * 70)
+    print(f"Bulk validation of {', '.join(args.paths)}")
+    print("=" * 70)
+    summary = run_bulk_validation(args.paths, args.output, args.workers, args.pattern, args.chunk_size, args.verdict_cache)
+    rate = summary['netlists'] / summary['elapsed_s'] if summary['elapsed_s'] else 0.0
+    print(f"Validated {summary['netlists']} netlist(s) in {summary['elapsed_s']:.2f}s ({rate:.0f}/s).")
+    print(f"  - Passed: {summary['passed']}  Failed: {summary['failed']}  Unreadable: {summary['unreadable']}")
+    for rule_id, count in sorted(summary['rule_counts'].items()):
+        print(f"  - {rule_id}: {count} netlist(s)")
+    print(f"Verdicts written to '{args.output}'")
+    if summary['netlists'] == 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,265 @@
+import json
+import argparse
+import functools
+from collections import deque
+from typing import List, Dict, Any, Optional, Set, Tuple
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+SUPPLY_NETS: Tuple[str, str] = ('VDD', 'GND')  # (positive supply, ground)
+# Circuits with fewer terminals than this are analysed in pure Python: for a few
+# blocks, NumPy/SciPy cost more than the loops they replace.
+SPARSE_MIN_TERMINALS: int = 512
+# Component ids listed per disconnected subcircuit in a finding.
+MAX_LISTED_COMPONENTS: int = 10
+
+# Terminal kinds, from the library role of the terminal (and, for POWER, its name)
+_OTHER, _V_INPUT, _I_INPUT, _OUTPUT, _POWER, _POWER_VDD, _POWER_GND = range(7)
+_KINDS: Dict[Optional[str], int] = {'V_INPUT': _V_INPUT, 'I_INPUT': _I_INPUT, 'I_OUTPUT': _OUTPUT, 'POWER': _POWER}
+# Net rails: signal nets are 0
+_SIGNAL, _VDD, _GND = 0, 1, 2
+
+# ==============================================================================
+# ### --- COMPONENT-NET INCIDENCE --- ###
+# A circuit is a bipartite graph: components on one side, nets on the other, one
+# edge per terminal. ConnectivityGraph keeps the terminals as flat parallel
+# arrays (component index, net index, kind), built with one comprehension each,
+# and answers three whole-circuit questions:
+#   pieces       the subcircuits joined by signal nets (VDD/GND join everything,
+#                so they are left out);
+#   unreachable  input nets (V_INPUT terminals, nothing driving them) from which
+#                no signal path reaches an output node. Signal flows from a net
+#                into a block through its V_INPUT/I_INPUT terminals and out of it
+#                through its I_OUTPUT terminals; an output node is a signal net
+#                with an I_OUTPUT terminal and no I_INPUT terminal (a current
+#                turned into a voltage, not fed into a mirror or a bias input);
+#   shorts       POWER terminals on signal nets, or on the other supply than the
+#                one the terminal is named for (pwr_vdd on GND).
+# Large circuits are classified with NumPy masks over the terminal arrays, the
+# pieces come from scipy.sparse.csgraph.connected_components on the incidence
+# matrix, and the reachability from one breadth-first search backwards from all
+# output nodes at once. Small circuits, or environments without NumPy/SciPy,
+# use the same arrays with plain loops, union-find and a deque. Both give the
+# same results in the same order.
+# ==============================================================================
+
+@functools.lru_cache(maxsize=None)
+def _sparse() -> Optional[Tuple[Any, Any, Any]]:
+    """(numpy, scipy.sparse, scipy.sparse.csgraph), or None if they are not installed. Imported on first use."""
+    try:
+        import numpy
+        from scipy import sparse
+        from scipy.sparse import csgraph
+    except ImportError:  # NumPy/SciPy are optional; the pure-Python path is used instead
+        return None
+    return numpy, sparse, csgraph
+
+def _terminal_kinds(terminals: Dict[str, str]) -> Dict[str, int]:
+    kinds = {}
+    for terminal, role in terminals.items():
+        kind = _KINDS.get(role, _OTHER)
+        if kind == _POWER:
+            name = terminal.lower()
+            kind = _POWER_GND if 'gnd' in name else _POWER_VDD if 'vdd' in name else _POWER
+        kinds[terminal] = kind
+    return kinds
+
+class ConnectivityGraph:
+    """The component-net incidence of one netlist; components are netlist positions, nets are numbered in order of appearance."""
+    def __init__(self, netlist: List[Dict[str, Any]], library: Any):
+        self.component_ids = [c['id'] for c in netlist]
+        block_kinds: Dict[Any, Dict[str, int]] = {}
+        for c in netlist:
+            if c['block_type'] not in block_kinds:
+                block_kinds[c['block_type']] = _terminal_kinds(library.get(c['block_type'], {}).get('terminals', {}))
+        connections = [c.get('connections', {}) for c in netlist]
+        net_ids: Dict[Any, int] = {}
+        self.term_comp = [i for i, conns in enumerate(connections) for _ in conns]
+        self.term_net = [net_ids.setdefault(net, len(net_ids)) for conns in connections for net in conns.values()]
+        self.term_name = [t for conns in connections for t in conns]
+        self.term_kind = [block_kinds[c['block_type']].get(t, _OTHER) for c, conns in zip(netlist, connections) for t in conns]
+        self.net_names = list(net_ids)
+        self.net_rail = [(_VDD if net.upper() == SUPPLY_NETS[0] else _GND if net.upper() == SUPPLY_NETS[1] else _SIGNAL)
+                         if isinstance(net, str) else _SIGNAL for net in self.net_names]
+        self.sparse = len(self.term_comp) >= SPARSE_MIN_TERMINALS and _sparse() is not None
+        self._arrays: Optional[Dict[str, Any]] = None
+        if self.sparse:
+            self._classify_arrays()
+        else:
+            self._classify_lists()
+
+    def _classify_lists(self) -> None:
+        n_net = len(self.net_names)
+        found, first_v_input = [0] * n_net, [-1] * n_net
+        shorts = []
+        for j, (net, kind) in enumerate(zip(self.term_net, self.term_kind)):
+            found[net] |= 1 << kind
+            if kind == _V_INPUT and first_v_input[net] < 0:
+                first_v_input[net] = j
+            if kind >= _POWER:
+                rail = self.net_rail[net]
+                if rail == _SIGNAL or (kind == _POWER_VDD and rail == _GND) or (kind == _POWER_GND and rail == _VDD):
+                    shorts.append(j)
+        signal = [nid for nid in range(n_net) if self.net_rail[nid] == _SIGNAL]
+        self.primary_inputs = [first_v_input[nid] for nid in signal if found[nid] & (1 << _V_INPUT) and not found[nid] & (1 << _OUTPUT)]
+        self.output_nets = [nid for nid in signal if found[nid] & (1 << _OUTPUT) and not found[nid] & (1 << _I_INPUT)]
+        self._short_terms = sorted(shorts, key=lambda j: self.term_net[j])
+
+    def _classify_arrays(self) -> None:
+        np = _sparse()[0]
+        n_net = len(self.net_names)
+        comp, net = np.asarray(self.term_comp, dtype=np.int64), np.asarray(self.term_net, dtype=np.int64)
+        kind, rail = np.asarray(self.term_kind, dtype=np.int8), np.asarray(self.net_rail, dtype=np.int8)
+        term_rail = rail[net]
+        def nets_with(k: int) -> Any:
+            mask = np.zeros(n_net, dtype=bool)
+            mask[net[kind == k]] = True
+            return mask
+        v_input, output, i_input = nets_with(_V_INPUT), nets_with(_OUTPUT), nets_with(_I_INPUT)
+        signal_net = rail == _SIGNAL
+        v_terms = np.flatnonzero(kind == _V_INPUT)
+        v_nets, first = np.unique(net[v_terms], return_index=True)  # first V_INPUT terminal of each net
+        first_v_input = np.full(n_net, -1, dtype=np.int64)
+        first_v_input[v_nets] = v_terms[first]
+        self.primary_inputs = first_v_input[np.flatnonzero(signal_net & v_input & ~output)].tolist()
+        self.output_nets = np.flatnonzero(signal_net & output & ~i_input).tolist()
+        short = (kind >= _POWER) & ((term_rail == _SIGNAL) | ((kind == _POWER_VDD) & (term_rail == _GND)) | ((kind == _POWER_GND) & (term_rail == _VDD)))
+        short_terms = np.flatnonzero(short)
+        self._short_terms = short_terms[np.argsort(net[short_terms], kind='stable')].tolist()
+        signal = term_rail == _SIGNAL
+        self._arrays = {'comp': comp[signal], 'net': net[signal], 'kind': kind[signal]}
+
+    def signal_nets(self) -> List[int]:
+        """Indexes of the nets on neither supply."""
+        return [nid for nid, rail in enumerate(self.net_rail) if rail == _SIGNAL]
+
+    def v_input_nets(self) -> Set[int]:
+        """Indexes of the nets with a V_INPUT terminal."""
+        return {net for net, kind in zip(self.term_net, self.term_kind) if kind == _V_INPUT}
+
+    @property
+    def shorts(self) -> List[Tuple[Any, str, Any]]:
+        """(component id, terminal, net) of each power terminal shorting a supply, in net order."""
+        return [(self.component_ids[self.term_comp[j]], self.term_name[j], self.net_names[self.term_net[j]]) for j in self._short_terms]
+
+    def _signal_terms(self):
+        return ((comp, net, kind) for comp, net, kind in zip(self.term_comp, self.term_net, self.term_kind) if self.net_rail[net] == _SIGNAL)
+
+    # --- Pieces ---
+
+    def pieces(self) -> List[List[int]]:
+        """Component indexes of every piece but the largest (the first one on a tie), in netlist order."""
+        labels = self._sparse_labels() if self.sparse else self._python_labels()
+        groups: Dict[int, List[int]] = {}
+        for i, label in enumerate(labels):
+            groups.setdefault(label, []).append(i)
+        if len(groups) < 2:
+            return []
+        ordered = sorted(groups.values(), key=lambda members: members[0])
+        main = max(ordered, key=len)
+        return [members for members in ordered if members is not main]
+
+    def _python_labels(self) -> List[int]:
+        n_comp = len(self.component_ids)
+        parent = list(range(n_comp + len(self.net_names)))
+        def find(x: int) -> int:
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+        for comp, net, _ in self._signal_terms():
+            a, b = find(comp), find(n_comp + net)
+            if a != b:
+                parent[a] = b
+        return [find(i) for i in range(n_comp)]
+
+    def _sparse_labels(self) -> List[int]:
+        np, sparse, csgraph = _sparse()
+        n_comp, n = len(self.component_ids), len(self.component_ids) + len(self.net_names)
+        rows, cols = self._arrays['comp'], self._arrays['net'] + n_comp
+        incidence = sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(n, n)).tocsr()
+        _, labels = csgraph.connected_components(incidence, directed=False)
+        return labels[:n_comp].tolist()
+
+    # --- Reachability ---
+
+    def unreachable_inputs(self) -> List[Tuple[Any, Any, str]]:
+        """(net, component id, terminal) of each input net with no signal path to an output node."""
+        if not self.primary_inputs:
+            return []
+        reached = self._sparse_reached() if self.sparse else self._python_reached()
+        return [(self.net_names[self.term_net[j]], self.component_ids[self.term_comp[j]], self.term_name[j])
+                for j in self.primary_inputs if not reached[self.term_net[j]]]
+
+    def _python_reached(self) -> List[bool]:
+        # Backwards from the output nodes: net <- driving component <- its input nets
+        drivers: Dict[int, List[int]] = {}
+        inputs: Dict[int, List[int]] = {}
+        for comp, net, kind in self._signal_terms():
+            if kind == _OUTPUT:
+                drivers.setdefault(net, []).append(comp)
+            elif kind == _V_INPUT or kind == _I_INPUT:
+                inputs.setdefault(comp, []).append(net)
+        reached = [False] * len(self.net_names)
+        seen_comps = set()
+        queue = deque(self.output_nets)
+        for net in self.output_nets:
+            reached[net] = True
+        while queue:
+            for comp in drivers.get(queue.popleft(), ()):
+                if comp in seen_comps:
+                    continue
+                seen_comps.add(comp)
+                for net in inputs.get(comp, ()):
+                    if not reached[net]:
+                        reached[net] = True
+                        queue.append(net)
+        return reached
+
+    def _sparse_reached(self) -> Any:
+        np, sparse, csgraph = _sparse()
+        n_comp, n_net = len(self.component_ids), len(self.net_names)
+        source = n_comp + n_net  # one extra node with an edge to every output node
+        comp, net, kind = self._arrays['comp'], self._arrays['net'] + n_comp, self._arrays['kind']
+        outputs, inputs = kind == _OUTPUT, (kind == _V_INPUT) | (kind == _I_INPUT)
+        out_nodes = np.asarray(self.output_nets, dtype=np.int64) + n_comp
+        rows = np.concatenate([net[outputs], comp[inputs], np.full(len(out_nodes), source, dtype=np.int64)])
+        cols = np.concatenate([comp[outputs], net[inputs], out_nodes])
+        graph = sparse.coo_matrix((np.ones(len(rows), dtype=np.int8), (rows, cols)), shape=(source + 1, source + 1)).tocsr()
+        reached = np.zeros(source + 1, dtype=bool)
+        reached[csgraph.breadth_first_order(graph, source, directed=True, return_predecessors=False)] = True
+        return reached[n_comp:source]
+
+def analyze(netlist: List[Dict[str, Any]], library: Any) -> Dict[str, Any]:
+    """The three connectivity results for a netlist, by component id and net name."""
+    graph = ConnectivityGraph(netlist, library)
+    return {
+        'pieces': [[graph.component_ids[i] for i in members] for members in graph.pieces()],
+        'unreachable_inputs': [{'net_name': n, 'component_id': cid, 'terminal': t} for n, cid, t in graph.unreachable_inputs()],
+        'supply_shorts': [{'component_id': cid, 'terminal': t, 'net_name': n} for cid, t, n in graph.shorts],
+    }
+
+# ==============================================================================
+# ### --- COMMAND LINE --- ###
+# ==============================================================================
+
+def main() -> None:
+    from umpire import COMPREHENSIVE_LIBRARY
+    parser = argparse.ArgumentParser(description="Report disconnected subcircuits, inputs with no path to an output and supply shorts")
+    parser.add_argument('netlist', help='Netlist JSON file')
+    args = parser.parse_args()
+
+    with open(args.netlist, 'r', encoding='utf-8') as f:
+        report = analyze(json.load(f), COMPREHENSIVE_LIBRARY)
+    print(f"{len(report['pieces']) + 1} subcircuit(s)")
+    for members in report['pieces']:
+        print(f"  - disconnected: {', '.join(map(str, members[:MAX_LISTED_COMPONENTS]))}{' ...' if len(members) > MAX_LISTED_COMPONENTS else ''} ({len(members)} component(s))")
+    for r in report['unreachable_inputs']:
+        print(f"  - input net '{r['net_name']}' ({r['component_id']}.{r['terminal']}) reaches no output")
+    for r in report['supply_shorts']:
+        print(f"  - supply short: {r['component_id']}.{r['terminal']} on net '{r['net_name']}'")
+
+if __name__ == "__main__":
+    main()
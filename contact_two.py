@@ -1,8 +1,18 @@
 import os
+import sys
+import time
+import queue
+import random
+import threading
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from openai import OpenAI
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, ContextManager, Tuple
 import argparse
+from llm_cache import ResponseCache, make_cache_key
+import telemetry
+from prompt_builder import count_tokens
 
 # ==============================================================================
 # ### --- CONFIGURATION --- ###
@@ -33,12 +43,56 @@ LLM_CONFIG: List[Dict[str, str]] = [
 
 # 2. DEFAULTS (used if no CLI args)
 DEFAULT_ACTIVE_LLM_INDEX: int = 0
-OPENROUTER_API_BASE: str = "https://openrouter.ai/api/v1"
+# Set the OPENROUTER_API_BASE environment variable to use another OpenAI-compatible
+# endpoint, e.g. the local mock server (mock_llm_server.py) for offline load tests.
+OPENROUTER_API_BASE: str = os.environ.get("OPENROUTER_API_BASE", "https://openrouter.ai/api/v1")
 DEFAULT_INPUT_FILE: str = "requirements.txt"
 DEFAULT_OUTPUT_FILE: str = None  # If None, use OUTPUT_DIR logic
 OUTPUT_DIR: str = "output"
 
-# 4. PROMPT TEMPLATE
+# 3. BATCH MODE (requirements file, one prompt per line)
+# How many requirements are in flight at once, and the per-model request budget.
+# A model without an entry in MODEL_RATE_LIMITS_RPM is not rate limited.
+DEFAULT_CONCURRENCY: int = 8
+MODEL_RATE_LIMITS_RPM: Dict[str, int] = {
+    # "qwen/qwen3-32b": 20,
+}
+
+# 4. SAMPLING AND RESPONSE CACHE
+# Extra arguments for chat.completions.create (e.g. {"temperature": 0.2}). They are
+# part of the cache key, so changing them never returns a stale response.
+SAMPLING_PARAMS: Dict[str, Any] = {}
+# Identical requests (same model, prompt and sampling parameters) are answered
+# from CACHE_DIR. Least recently used responses are evicted above CACHE_MAX_BYTES.
+CACHE_ENABLED: bool = True
+CACHE_DIR: str = ".llm_cache"
+CACHE_MAX_BYTES: int = 256 * 1024 * 1024
+
+# 5. RESILIENCE
+# Failed requests are classified (see LLMError). Rate limits (429), server errors
+# (5xx), timeouts, connection errors and empty answers are retried up to
+# MAX_ATTEMPTS times per model with jittered exponential backoff; a 429's
+# Retry-After is honoured. When a model's attempts run out, or it rejects the
+# request outright (auth, bad request), call_llm fails over to the next LLM_CONFIG
+# entry.
+MAX_ATTEMPTS: int = 3
+BACKOFF_BASE_S: float = 1.0
+BACKOFF_MAX_S: float = 30.0
+REQUEST_TIMEOUT_S: float = 300.0
+FAILOVER_ENABLED: bool = True
+
+# 6. HEDGED REQUESTS
+# If the first request has produced no token (no answer, when not streaming) after
+# the HEDGE_QUANTILE of that model's recent first-token latencies, a second request
+# goes to the next LLM_CONFIG entry and whichever finishes first is kept; the other
+# is cancelled. Hedging starts once HEDGE_MIN_SAMPLES latencies are known.
+HEDGE_ENABLED: bool = False
+HEDGE_QUANTILE: float = 0.95
+HEDGE_MIN_SAMPLES: int = 20
+HEDGE_WINDOW: int = 200  # latencies kept per model
+HEDGE_MIN_DELAY_S: float = 0.5
+
+# 7. PROMPT TEMPLATE
 # The script will replace `{requirement_text}` with each line from your file.
 PROMPT_TEMPLATE: str = """
 You are an expert analog circuit designer AI. Your task is to provide a detailed, clear, and accurate response to the following design requirement.
@@ -74,19 +128,439 @@ def read_requirements(filepath: str) -> Optional[List[str]]:
         print(f"Error: The requirements file was not found at '{filepath}'")
         return None
 
-def get_llm_response(api_key: str, model: str, prompt: str) -> Optional[str]:
-    """Sends a prompt to the specified LLM via OpenRouter and returns the response."""
+def _openai() -> Any:
+    """The openai package, imported on first use: it takes longer to import than the
+    rest of the tool together, and commands that are answered from the cache (or
+    only parse their arguments) never need it."""
+    import openai
+    return openai
+
+# Long-lived clients, one per (API base, API key). Each OpenAI client owns an
+# HTTP connection pool, so reusing it keeps TLS connections warm across calls.
+_CLIENTS: Dict[tuple, Any] = {}
+_CLIENTS_LOCK = threading.Lock()
+
+def get_client(api_key: str) -> Any:
+    """Returns the pooled client for `api_key`, creating it on first use."""
+    key = (OPENROUTER_API_BASE, api_key)
+    with _CLIENTS_LOCK:
+        client = _CLIENTS.get(key)
+        if client is None:
+            # Retries are made by _request_with_retries, which classifies the errors first.
+            client = _openai().OpenAI(base_url=OPENROUTER_API_BASE, api_key=api_key, max_retries=0, timeout=REQUEST_TIMEOUT_S)
+            _CLIENTS[key] = client
+        return client
+
+class RateLimiter:
+    """Spaces requests evenly so that at most `requests_per_minute` start per minute."""
+    def __init__(self, requests_per_minute: int):
+        self.interval = 60.0 / requests_per_minute
+        self._next_slot = 0.0
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_slot)
+            self._next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+_RATE_LIMITERS: Dict[str, Optional[RateLimiter]] = {}
+_RATE_LIMITERS_LOCK = threading.Lock()
+
+def get_rate_limiter(model: str) -> Optional[RateLimiter]:
+    """Returns the shared limiter for `model`, or None if the model is not rate limited."""
+    with _RATE_LIMITERS_LOCK:
+        if model not in _RATE_LIMITERS:
+            rpm = MODEL_RATE_LIMITS_RPM.get(model)
+            _RATE_LIMITERS[model] = RateLimiter(rpm) if rpm else None
+        return _RATE_LIMITERS[model]
+
+# Optional admission control shared with other processes (see job_queue.py): called
+# with the model before every API request, the returned context is held for the
+# duration of the request.
+_REQUEST_GATE: Optional[Callable[[str], ContextManager]] = None
+
+def set_request_gate(gate: Optional[Callable[[str], ContextManager]]) -> None:
+    """Installs (or removes, with None) the gate every API request must pass."""
+    global _REQUEST_GATE
+    _REQUEST_GATE = gate
+
+_CACHE: Optional[ResponseCache] = None
+_CACHE_LOCK = threading.Lock()
+
+def get_cache() -> ResponseCache:
+    """Returns the process-wide response cache for CACHE_DIR."""
+    global _CACHE
+    with _CACHE_LOCK:
+        if _CACHE is None or _CACHE.cache_dir != CACHE_DIR:
+            _CACHE = ResponseCache(CACHE_DIR, CACHE_MAX_BYTES)
+        return _CACHE
+
+# --- Error classification and backoff ---
+
+class LLMError(Exception):
+    """A failed LLM request. `kind` tells whether retrying the same model can help."""
+    RETRYABLE = ('rate_limit', 'server', 'timeout', 'connection', 'empty')
+    def __init__(self, kind: str, message: str, status: Optional[int] = None, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.kind, self.status, self.retry_after = kind, status, retry_after
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind in self.RETRYABLE
+
+def classify_error(e: Exception) -> LLMError:
+    """Maps an exception from the OpenAI client to an LLMError."""
+    if isinstance(e, LLMError):
+        return e
+    message = f"{type(e).__name__}: {e}"[:200]
+    # An openai exception means openai is already imported; don't import it just to check
+    openai = sys.modules.get('openai')
+    if openai is not None and isinstance(e, openai.APITimeoutError):
+        return LLMError('timeout', message)
+    if openai is not None and isinstance(e, openai.APIConnectionError):
+        return LLMError('connection', message)
+    status = getattr(e, 'status_code', None)
+    if status is None:
+        return LLMError('unknown', message)
+    if status == 429:
+        return LLMError('rate_limit', message, status, _retry_after(e))
+    if status >= 500 or status == 408:
+        return LLMError('server', message, status, _retry_after(e))
+    if status in (401, 403):
+        return LLMError('auth', message, status)
+    return LLMError('bad_request', message, status)
+
+def _retry_after(e: Exception) -> Optional[float]:
+    headers = getattr(getattr(e, 'response', None), 'headers', None) or {}
+    try:
+        return float(headers.get('retry-after'))
+    except (TypeError, ValueError):
+        return None
+
+def backoff_delay(attempt: int, error: Optional[LLMError] = None) -> float:
+    """Full-jitter exponential delay before retry number `attempt` (1-based), at least the Retry-After."""
+    delay = random.uniform(0, min(BACKOFF_MAX_S, BACKOFF_BASE_S * 2 ** (attempt - 1)))
+    if error is not None and error.retry_after:
+        # Jittered too, so clients told the same Retry-After do not return in lockstep
+        delay = max(delay, error.retry_after + random.uniform(0, BACKOFF_BASE_S))
+    return delay
+
+class _AnyEvent:
+    """Set when any of `events` is set: one hedged branch's own cancel event or the caller's."""
+    def __init__(self, *events: Optional[threading.Event]):
+        self.events = [e for e in events if e is not None]
+    def is_set(self) -> bool:
+        return any(e.is_set() for e in self.events)
+
+def _cancelled_during(cancel_event: Any, seconds: float) -> bool:
+    """Sleeps for `seconds`, returning True early if `cancel_event` gets set."""
+    deadline = time.monotonic() + seconds
+    while True:
+        if cancel_event is not None and cancel_event.is_set():
+            return True
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return False
+        time.sleep(min(remaining, 0.05) if cancel_event is not None else remaining)
+
+# --- First-token latencies (for the hedging deadline) ---
+
+class LatencyTracker:
+    """The last HEDGE_WINDOW first-token latencies per (model, stream)."""
+    def __init__(self):
+        self._samples: Dict[tuple, deque] = {}
+        self._lock = threading.Lock()
+
+    def record(self, key: tuple, seconds: float) -> None:
+        with self._lock:
+            self._samples.setdefault(key, deque(maxlen=HEDGE_WINDOW)).append(seconds)
+
+    def quantile(self, key: tuple, q: float) -> Optional[float]:
+        """The `q` quantile, or None while fewer than HEDGE_MIN_SAMPLES are known."""
+        with self._lock:
+            samples = sorted(self._samples.get(key, ()))
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+_LATENCIES = LatencyTracker()
+
+# --- Single model: cache, attempts and retries ---
+
+def get_llm_response(api_key: str, model: str, prompt: str, use_cache: bool = True, refresh: bool = False,
+                     stream: bool = False, stop_when: Optional[Callable[[str], bool]] = None,
+                     cancel_event: Optional[threading.Event] = None, stop_key: Optional[str] = None) -> Optional[str]:
+    """
+    Sends a prompt to the specified LLM via OpenRouter and returns the response,
+    or None once the retries (see MAX_ATTEMPTS) are exhausted. Cached responses
+    are returned without a request unless `use_cache` is False (bypass: neither
+    read nor write the cache) or `refresh` is True (always send the request and
+    overwrite the cached response).
+
+    With `stream`, the completion is read incrementally: `stop_when` is called with
+    each new piece of text and returning True closes the stream early, keeping the
+    text received so far as the response. Setting `cancel_event` aborts the stream
+    and returns None. A response cut short is only cached if `stop_key` names the
+    stop condition, and then only answers later requests with the same `stop_key`.
+    """
     try:
-        client = OpenAI(base_url=OPENROUTER_API_BASE, api_key=api_key)
+        return _request_with_retries(api_key, model, prompt, use_cache, refresh, stream, lambda: stop_when, cancel_event,
+                                     stop_key=stop_key)
+    except LLMError as e:
+        print(f"  > Giving up on model '{model}': {e}")
+        return None
+
+def _request_with_retries(api_key: str, model: str, prompt: str, use_cache: bool, refresh: bool, stream: bool,
+                          stop_when_factory: Callable[[], Optional[Callable[[str], bool]]], cancel_event: Any,
+                          on_first_token: Optional[Callable[[], None]] = None, hedge: bool = False,
+                          stop_key: Optional[str] = None) -> str:
+    """Returns the response for `prompt` from `model`, retrying what can be retried; raises the last LLMError."""
+    cache = get_cache() if CACHE_ENABLED and use_cache else None
+    cache_key = make_cache_key(f"{OPENROUTER_API_BASE}|{model}", prompt, SAMPLING_PARAMS) if cache else None
+    # A stream cut short by stop_when is not the full completion: it is kept apart,
+    # under the name of its stop condition, and never answers other requests
+    stopped_key = (make_cache_key(f"{OPENROUTER_API_BASE}|{model}", prompt, {**SAMPLING_PARAMS, 'stream_stop': stop_key})
+                   if cache and stream and stop_key else None)
+    if cache and not refresh:
+        cached = cache.get(cache_key)
+        if cached is None and stopped_key:
+            cached = cache.get(stopped_key)
+        if cached is not None:
+            print(f"  > Cache hit for model: '{model}'.")
+            with telemetry.span('llm_call', model=model, stream=stream, cache='hit'):
+                pass
+            if on_first_token:
+                on_first_token()
+            return cached
+    for attempt in range(1, MAX_ATTEMPTS + 1):
+        with telemetry.span('llm_call', model=model, stream=stream, attempt=attempt, **({'hedge': True} if hedge else {})) as span:
+            try:
+                response, closed_early = _send_request(api_key, model, prompt, stream, stop_when_factory(), cancel_event, span, on_first_token)
+                error = None
+            except Exception as e:
+                error = classify_error(e)
+                span.update(status='cancelled' if error.kind == 'cancelled' else 'error', error_kind=error.kind, error=str(error)[:200])
+        if error is None:
+            if cache and not closed_early:
+                cache.put(cache_key, response)
+            elif stopped_key:
+                cache.put(stopped_key, response)
+            return response
+        if not error.retryable or attempt == MAX_ATTEMPTS:
+            raise error
+        delay = backoff_delay(attempt, error)
+        print(f"  > {error.kind} from model '{model}' ({error}); retry {attempt}/{MAX_ATTEMPTS - 1} in {delay:.1f}s...")
+        if _cancelled_during(cancel_event, delay):
+            raise LLMError('cancelled', f"request to '{model}' cancelled")
+
+def _send_request(api_key: str, model: str, prompt: str, stream: bool, stop_when: Optional[Callable[[str], bool]],
+                  cancel_event: Any, span: Dict[str, Any], on_first_token: Optional[Callable[[], None]]) -> Tuple[str, bool]:
+    """One API request: (response, closed early by stop_when). Raises on any failure, including a cancelled stream or an empty answer."""
+    closed_early = False
+    client = get_client(api_key)
+    wait_start = time.perf_counter()
+    limiter = get_rate_limiter(model)
+    if limiter:
+        limiter.acquire()
+    with _REQUEST_GATE(model) if _REQUEST_GATE else nullcontext():
+        span['queue_wait_s'] = time.perf_counter() - wait_start
         print(f"  > Sending prompt to model: '{model}'...")
+        request_start = time.perf_counter()
         completion = client.chat.completions.create(
             model=model,
-            messages=[{"role": "user", "content": prompt}]
+            messages=[{"role": "user", "content": prompt}],
+            stream=stream,
+            **({'stream_options': {'include_usage': True}} if stream else {}),
+            **SAMPLING_PARAMS
         )
-        return completion.choices[0].message.content
-    except Exception as e:
-        print(f"  > An API error occurred: {e}")
+        if stream:
+            response, closed_early = _read_stream(completion, model, stop_when, cancel_event, span, on_first_token)
+        else:
+            response = completion.choices[0].message.content
+            _record_usage(span, completion.usage)
+            span['ttft_s'] = time.perf_counter() - request_start
+            if on_first_token:
+                on_first_token()
+    if response is None and cancel_event is not None and cancel_event.is_set():
+        raise LLMError('cancelled', f"request to '{model}' cancelled")
+    if not response:
+        raise LLMError('empty', f"model '{model}' returned an empty response")
+    if 'ttft_s' in span:
+        _LATENCIES.record((model, stream), span['ttft_s'])
+    if 'completion_tokens' not in span:
+        # A stream closed early never receives the final usage chunk; estimate instead.
+        span.update(prompt_tokens=count_tokens(prompt), completion_tokens=count_tokens(response), tokens_estimated=True)
+    return response, closed_early
+
+def _record_usage(span: Dict[str, Any], usage: Any) -> None:
+    """Copies token counts from a completion's `usage` into the telemetry span."""
+    if usage is not None:
+        span['prompt_tokens'] = getattr(usage, 'prompt_tokens', None)
+        span['completion_tokens'] = getattr(usage, 'completion_tokens', None)
+
+def _read_stream(completion, model: str, stop_when: Optional[Callable[[str], bool]], cancel_event: Any,
+                 span: Optional[Dict[str, Any]] = None, on_first_token: Optional[Callable[[], None]] = None) -> Tuple[Optional[str], bool]:
+    """Accumulates a streamed completion, closing it early when asked to. Returns (text, closed early)."""
+    parts: List[str] = []
+    span = span if span is not None else {}
+    request_start = time.perf_counter()
+    try:
+        for chunk in completion:
+            if cancel_event is not None and cancel_event.is_set():
+                print(f"  > Stream from model '{model}' cancelled.")
+                span['status'] = 'cancelled'
+                return None, False
+            _record_usage(span, getattr(chunk, 'usage', None))
+            if not chunk.choices:
+                continue
+            delta = chunk.choices[0].delta.content
+            if not delta:
+                continue
+            if not parts:
+                span['ttft_s'] = time.perf_counter() - request_start
+                if on_first_token:
+                    on_first_token()
+            parts.append(delta)
+            if stop_when is not None and stop_when(delta):
+                print(f"  > Stream from model '{model}' closed early after {sum(len(p) for p in parts)} characters.")
+                span['closed_early'] = True
+                return ''.join(parts), True
+    finally:
+        completion.close()
+    return ''.join(parts), False
+
+# --- Across models: failover and hedging ---
+
+class LLMResult:
+    """Outcome of call_llm: the response (None on failure), the LLM_CONFIG index that produced it, and the last error."""
+    __slots__ = ('text', 'llm_index', 'error')
+    def __init__(self, text: Optional[str], llm_index: int, error: Optional[LLMError] = None):
+        self.text, self.llm_index, self.error = text, llm_index, error
+
+def call_llm(prompt: str, llm_index: int, failover: Optional[bool] = None, hedge: Optional[bool] = None,
+             use_cache: bool = True, refresh: bool = False, stream: bool = False,
+             stop_when: Optional[Callable[[str], bool]] = None,
+             stop_when_factory: Optional[Callable[[], Callable[[str], bool]]] = None,
+             cancel_event: Optional[threading.Event] = None, stop_key: Optional[str] = None) -> LLMResult:
+    """
+    Sends a prompt to the LLM_CONFIG entry at `llm_index`, retrying as configured
+    in RESILIENCE. With `failover` (default FAILOVER_ENABLED) the following entries
+    are tried in turn when it fails; with `hedge` (default HEDGE_ENABLED) a slow
+    first request is hedged as described in HEDGED REQUESTS. `stop_when` is shared
+    by every attempt, so pass `stop_when_factory` instead when it keeps state: it is
+    called once per attempt. The other options are those of get_llm_response.
+    """
+    failover = FAILOVER_ENABLED if failover is None else failover
+    hedge = HEDGE_ENABLED if hedge is None else hedge
+    factory = stop_when_factory or (lambda: stop_when)
+    options = {'use_cache': use_cache, 'refresh': refresh, 'stream': stream, 'stop_when_factory': factory, 'stop_key': stop_key}
+    n = len(LLM_CONFIG)
+    order = [(llm_index + k) % n for k in range(n if failover else 1)]
+    error: Optional[LLMError] = None
+    tried: set = set()
+    for position, idx in enumerate(order):
+        if idx in tried:
+            continue  # already asked as the hedge
+        if position > 0:
+            print(f"  > Failing over to LLM index {idx} ('{LLM_CONFIG[idx]['name']}') after {error.kind}...")
+        try:
+            if hedge and position == 0:
+                text, idx = _hedged_request(prompt, idx, order[1] if len(order) > 1 else idx, cancel_event, options, tried)
+            else:
+                text = _request_for_index(prompt, idx, cancel_event, options)
+            return LLMResult(text, idx)
+        except LLMError as e:
+            error = e
+            print(f"  > LLM index {idx} failed: {e}")
+            if e.kind == 'cancelled':
+                break
+    return LLMResult(None, llm_index, error)
+
+def _request_for_index(prompt: str, llm_index: int, cancel_event: Any, options: Dict[str, Any],
+                       on_first_token: Optional[Callable[[], None]] = None, hedge: bool = False) -> str:
+    config = LLM_CONFIG[llm_index]
+    return _request_with_retries(config['api_key'], config['model_identifier'], prompt, options['use_cache'], options['refresh'],
+                                 options['stream'], options['stop_when_factory'], cancel_event, on_first_token, hedge,
+                                 options['stop_key'])
+
+def _hedged_request(prompt: str, primary: int, secondary: int, cancel_event: Optional[threading.Event],
+                    options: Dict[str, Any], tried: set) -> tuple:
+    """
+    Returns (response, index) from whichever of `primary` and its hedge on
+    `secondary` finishes first. The indexes requested are added to `tried`.
+    """
+    deadline = _LATENCIES.quantile((LLM_CONFIG[primary]['model_identifier'], options['stream']), HEDGE_QUANTILE)
+    if deadline is None:
+        tried.add(primary)
+        return _request_for_index(prompt, primary, cancel_event, options), primary
+    deadline = max(deadline, HEDGE_MIN_DELAY_S)
+    results: queue.Queue = queue.Queue()
+    first_token = threading.Event()
+    cancels: List[threading.Event] = []
+
+    def launch(idx: int, is_hedge: bool) -> None:
+        own_cancel = threading.Event()
+        cancels.append(own_cancel)
+        def run():
+            try:
+                results.put((idx, _request_for_index(prompt, idx, _AnyEvent(own_cancel, cancel_event), options,
+                                                     None if is_hedge else first_token.set, is_hedge), None))
+            except Exception as e:
+                results.put((idx, None, classify_error(e)))
+        threading.Thread(target=telemetry.bind(run), daemon=True).start()
+
+    launch(primary, False)
+    pending, hedge_at, error = 1, time.monotonic() + deadline, None
+    tried.add(primary)
+    while pending:
+        try:
+            idx, text, branch_error = results.get(timeout=None if hedge_at is None else max(0.0, hedge_at - time.monotonic()))
+        except queue.Empty:
+            hedge_at = None
+            if not first_token.is_set():
+                print(f"  > No first token from LLM index {primary} after {deadline:.1f}s; hedging with LLM index {secondary}...")
+                launch(secondary, True)
+                tried.add(secondary)
+                pending += 1
+            continue
+        pending -= 1
+        if text is not None:
+            for event in cancels:
+                event.set()  # the slower request stops at its next chunk or backoff
+            return text, idx
+        error = branch_error
+    raise error
+
+def request_llm(prompt: str, llm_index: int, **options) -> Optional[str]:
+    """
+    Sends a prompt to the LLM_CONFIG entry at `llm_index` and returns the response.
+    Keyword `options` are passed on to call_llm (failover, hedging, cache and streaming control).
+    """
+    if not (0 <= llm_index < len(LLM_CONFIG)):
+        print(f"  > Error: LLM index {llm_index} is invalid. Choose between 0 and {len(LLM_CONFIG) - 1}.")
         return None
+    return call_llm(prompt, llm_index, **options).text
+
+def request_llm_to_file(input_file: str, output_file: str, llm_index: int, **options) -> bool:
+    """Reads a prompt file, sends it to the LLM and writes the response. Returns True on success."""
+    try:
+        with open(input_file, 'r', encoding='utf-8') as f:
+            prompt = f.read()
+    except FileNotFoundError:
+        print(f"Error: The input file was not found at '{input_file}'")
+        return False
+
+    response = request_llm(prompt, llm_index, **options)
+    if not response:
+        print("  > Failed to get a response from the API.")
+        return False
+    with open(output_file, 'w', encoding='utf-8') as f:
+        f.write(response)
+    print(f"  > Success! Response saved to: {output_file}")
+    return True
 
 def slugify(text: str) -> str:
     """Converts a string into a simplified, filename-safe format."""
@@ -94,13 +568,57 @@ def slugify(text: str) -> str:
     text = ''.join(c for c in text if c.isalnum() or c in (' ', '-'))
     return text.replace(' ', '_')[:50]
 
+def process_requirements_batch(requirements: List[str], llm_config: Dict[str, str], concurrency: int = DEFAULT_CONCURRENCY, use_cache: bool = True, refresh: bool = False) -> int:
+    """
+    Sends every requirement to the LLM with up to `concurrency` requests in flight
+    and writes each response to OUTPUT_DIR as soon as it arrives.
+    Returns the number of requirements that got a response.
+    """
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    total = len(requirements)
+    succeeded = 0
+
+    def process(req_text: str) -> Optional[str]:
+        return get_llm_response(
+            api_key=llm_config['api_key'],
+            model=llm_config['model_identifier'],
+            prompt=PROMPT_TEMPLATE.format(requirement_text=req_text),
+            use_cache=use_cache,
+            refresh=refresh
+        )
+
+    with ThreadPoolExecutor(max_workers=max(1, concurrency)) as executor:
+        futures = {executor.submit(process, req_text): (i, req_text) for i, req_text in enumerate(requirements, 1)}
+        for done, future in enumerate(as_completed(futures), 1):
+            i, req_text = futures[future]
+            print(f"--- Requirement {i}/{total} finished ({done}/{total} done) ---")
+            print(f"  > Requirement: \"{req_text}\"")
+            response = future.result()
+            if not response:
+                print("  > Failed to get a response from the API.")
+                continue
+
+            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+            output_filename = f"{timestamp}_{i:04d}_{slugify(req_text)}.txt"
+            output_filepath = os.path.join(OUTPUT_DIR, output_filename)
+            with open(output_filepath, 'w', encoding='utf-8') as f:
+                f.write(response)
+            succeeded += 1
+            print(f"  > Success! Response saved to: {output_filepath}")
+    return succeeded
+
 def main() -> None:
 
     parser = argparse.ArgumentParser(description="LLM Requirements Processor v2.1")
     parser.add_argument('--input', type=str, help='Input file (prompt or requirements)', default=DEFAULT_INPUT_FILE)
     parser.add_argument('--output', type=str, help='Output file (for LLM response)', default=DEFAULT_OUTPUT_FILE)
     parser.add_argument('--llm-index', type=int, help='LLM index to use', default=DEFAULT_ACTIVE_LLM_INDEX)
+    parser.add_argument('--concurrency', type=int, help='Requests in flight at once (requirements file mode)', default=DEFAULT_CONCURRENCY)
+    parser.add_argument('--rpm', type=int, help='Requests per minute for the selected model (requirements file mode)', default=None)
+    parser.add_argument('--no-cache', action='store_true', help='Bypass the response cache (neither read nor write it)')
+    parser.add_argument('--refresh-cache', action='store_true', help='Always call the LLM and overwrite cached responses')
     args = parser.parse_args()
+    use_cache = not args.no_cache
 
     input_file = args.input
     output_file = args.output
@@ -127,25 +645,7 @@ def main() -> None:
 
     # If output_file is provided, treat input_file as a single prompt file
     if output_file:
-        try:
-            with open(input_file, 'r', encoding='utf-8') as f:
-                prompt = f.read()
-        except FileNotFoundError:
-            print(f"Error: The input file was not found at '{input_file}'")
-            return
-
-        response = get_llm_response(
-            api_key=active_llm_config['api_key'],
-            model=active_llm_config['model_identifier'],
-            prompt=prompt
-        )
-
-        if response:
-            with open(output_file, 'w', encoding='utf-8') as f:
-                f.write(response)
-            print(f"  > Success! Response saved to: {output_file}")
-        else:
-            print("  > Failed to get a response from the API.")
+        request_llm_to_file(input_file, output_file, llm_index, use_cache=use_cache, refresh=args.refresh_cache)
         print("\n" + "="*70)
         print("Processing complete.")
         print("="*70)
@@ -157,33 +657,12 @@ def main() -> None:
         print("\nProcessing stopped.")
         return
 
-    os.makedirs(OUTPUT_DIR, exist_ok=True)
-    print(f"Found {len(requirements)} requirement(s) to process. All will be sent to '{active_llm_config['name']}'.\n")
-
-    for i, req_text in enumerate(requirements, 1):
-        print(f"--- Processing Requirement {i}/{len(requirements)} ---")
-        print(f"  > Requirement: \"{req_text}\"")
-        
-        final_prompt = PROMPT_TEMPLATE.format(requirement_text=req_text)
-        
-        response = get_llm_response(
-            api_key=active_llm_config['api_key'],
-            model=active_llm_config['model_identifier'],
-            prompt=final_prompt
-        )
-        
-        if response:
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-            filename_slug = slugify(req_text)
-            output_filename = f"{timestamp}_{filename_slug}.txt"
-            output_filepath = os.path.join(OUTPUT_DIR, output_filename)
-            
-            with open(output_filepath, 'w', encoding='utf-8') as f:
-                f.write(response)
-            
-            print(f"  > Success! Response saved to: {output_filepath}")
-        else:
-            print("  > Failed to get a response from the API.")
+    if args.rpm:
+        MODEL_RATE_LIMITS_RPM[active_llm_config['model_identifier']] = args.rpm
+    print(f"Found {len(requirements)} requirement(s) to process. All will be sent to '{active_llm_config['name']}' with up to {args.concurrency} in flight.\n")
+
+    succeeded = process_requirements_batch(requirements, active_llm_config, args.concurrency, use_cache=use_cache, refresh=args.refresh_cache)
+    print(f"\n{succeeded}/{len(requirements)} requirement(s) got a response.")
 
     print("\n" + "="*70)
     print("Processing complete. All requirements have been handled.")
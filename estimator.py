@@ -0,0 +1,359 @@
+import re
+import sys
+import json
+import math
+import time
+import argparse
+import functools
+from typing import List, Dict, Any, Optional, Tuple
+
+from block_library import LIBRARY
+from connectivity import ConnectivityGraph
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+C_LOAD: float = 1e-12   # external load on each output node, F
+GMIN: float = 1e-12     # conductance from every node to ground, so no system is singular, S
+CMIN: float = 1e-18     # smallest capacitance of a node, F
+DEFAULT_SUPPLY_V: float = 1.8  # used for power when the specs give no supply voltage
+# Frequencies of the AC sweep that finds the unity-gain frequency and phase margin
+SWEEP_POINTS: int = 32
+# Dense systems grow as n^3: larger circuits are reported as not estimated.
+MAX_NODES: int = 64
+BATCH_SIZE: int = 1024  # netlists per estimate_batch call from the command line
+DEFAULT_TOP: int = 10
+
+# Spec labels in analog_specs.txt -> (target name, scale to SI units)
+SPEC_LABELS: Dict[str, Tuple[str, float]] = {
+    'Open-Loop Gain (dB)': ('gain_db', 1.0),
+    'Gain-Bandwidth Product (MHz)': ('gbw_hz', 1e6),
+    'Total Power Consumption (mW)': ('power_w', 1e-3),
+    'Phase Margin (degrees)': ('phase_margin_deg', 1.0),
+    'Supply Voltage (V)': ('supply_v', 1.0),
+}
+# Phase margin below which a candidate is rejected when the specs set none, degrees
+MIN_PHASE_MARGIN_DEG: float = 0.0
+
+# ==============================================================================
+# ### --- BATCHED SMALL-SIGNAL ESTIMATES --- ###
+# Every block is replaced by the macro-model in its library entry,
+#   "small_signal": {"g": [[row, col, S], ...], "c": {terminal: F}, "i_supply": A}
+# where [row, col, S] means the current leaving the row terminal's net is S times
+# the column terminal's net voltage ([t, t, gds] is a conductance to ground,
+# [out, in, gm] a transconductance), "c" holds capacitances to ground and
+# "i_supply" is the static current drawn from the supply. Supply nets are AC
+# ground, so terminals on VDD/GND stamp nothing. The circuit is written as a
+# modified nodal analysis system: node voltages of the signal nets plus one
+# current per input source,
+#     [G  B] [v]   [0]
+#     [B' 0] [i] = [u]
+# with VDD/GND as AC ground. The inputs are the nets connectivity.py finds as
+# primary inputs; when they include a '+' and a '-' terminal (a differential
+# pair) they are driven with +-0.5 V, otherwise the first one with 1 V and the
+# rest held at 0. The DC gain is the largest |v| over the output nodes (nets
+# connectivity.py finds as outputs, preferring those that drive no gate, which
+# also get C_LOAD). The poles are the eigenvalues of C^-1 G over the nodes that
+# are not inputs, and the dominant pole is the smallest. An AC sweep of
+# (G + jwC) at that output gives the unity-gain frequency, reported as GBW
+# (gain * pole for a one-pole response), and the phase margin there.
+# Power is the supply voltage times the static currents of the blocks.
+# Netlists are stamped in Python, then grouped by system size so each group is
+# one np.linalg.solve and one np.linalg.eigvals call over a stack of matrices.
+# The models are first-order: the numbers rank topologies against each other
+# and reject the clearly hopeless ones; they do not replace a SPICE run.
+# ==============================================================================
+
+@functools.lru_cache(maxsize=None)
+def _numpy() -> Any:
+    """numpy, or None if it is not installed. Imported on first use."""
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+class _System:
+    """The stamps of one netlist: signal nodes ordered free nodes first, then the driven inputs."""
+    __slots__ = ('n_free', 'n_inputs', 'g', 'c', 'drive', 'outputs', 'output_names', 'i_supply')
+
+    def __init__(self, netlist: List[Dict[str, Any]], library: Any):
+        models = []
+        for c in netlist:
+            info = library.get(c['block_type'])
+            if not info or 'small_signal' not in info:
+                raise ValueError(f"no small-signal model for block type '{c['block_type']}'")
+            models.append(info['small_signal'])
+        graph = ConnectivityGraph(netlist, library)
+        input_terms = {graph.term_net[j]: graph.term_name[j] for j in graph.primary_inputs}
+        if not input_terms:
+            raise ValueError("no input net")
+        if not graph.output_nets:
+            raise ValueError("no output node")
+        signal = [nid for nid in graph.signal_nets() if nid not in input_terms]
+        if len(signal) + len(input_terms) > MAX_NODES:
+            raise ValueError(f"{len(signal) + len(input_terms)} nodes, more than MAX_NODES ({MAX_NODES})")
+        node = {nid: i for i, nid in enumerate(signal + list(input_terms))}
+        self.n_free, self.n_inputs = len(signal), len(input_terms)
+
+        names = list(input_terms.values())
+        differential = any('+' in t for t in names) and any('-' in t for t in names)
+        if differential:
+            self.drive = [0.5 if '+' in t else -0.5 if '-' in t else 0.0 for t in names]
+        else:
+            self.drive = [1.0] + [0.0] * (len(names) - 1)
+
+        gates = graph.v_input_nets()
+        outputs = [nid for nid in graph.output_nets if nid not in gates] or graph.output_nets
+        self.outputs = [node[nid] for nid in outputs]
+        self.output_names = [graph.net_names[nid] for nid in outputs]
+
+        self.g: List[Tuple[int, int, float]] = []
+        self.c = [0.0] * self.n_free
+        self.i_supply = 0.0
+        net_index = {name: nid for nid, name in enumerate(graph.net_names)}
+        for comp, model in zip(netlist, models):
+            at = {t: node.get(net_index[net]) for t, net in comp.get('connections', {}).items()}
+            for row, col, value in model['g']:
+                r, k = at.get(row), at.get(col)
+                if r is not None and k is not None:
+                    self.g.append((r, k, value))
+            for terminal, cap in model['c'].items():
+                i = at.get(terminal)
+                if i is not None and i < self.n_free:
+                    self.c[i] += cap
+            self.i_supply += model['i_supply']
+        for i in self.outputs:
+            self.c[i] += C_LOAD
+
+def _solve_group(np: Any, systems: List[_System]) -> List[Tuple[int, float, float, float, bool, float]]:
+    """
+    (output index, DC gain, dominant pole and unity-gain frequency in rad/s, stable,
+    phase margin in degrees) for systems of one size, from batched solves and eigvals.
+    """
+    count, n_free, n_inputs = len(systems), systems[0].n_free, systems[0].n_inputs
+    n = n_free + n_inputs
+    mna = np.zeros((count, n + n_inputs, n + n_inputs))
+    stamps = [(b, r, k, value) for b, s in enumerate(systems) for r, k, value in s.g]
+    if stamps:
+        b, r, k, value = zip(*stamps)
+        np.add.at(mna, (np.array(b), np.array(r), np.array(k)), np.array(value))
+    nodes, sources, free = np.arange(n), np.arange(n_inputs), np.arange(n_free)
+    mna[:, nodes, nodes] += GMIN
+    mna[:, n_free + sources, n + sources] = 1.0
+    mna[:, n + sources, n_free + sources] = 1.0
+    rhs = np.zeros((count, n + n_inputs, 1))
+    rhs[:, n:, 0] = [s.drive for s in systems]
+    voltages = np.linalg.solve(mna, rhs)[:, :, 0]
+    best = [int(np.argmax(np.abs(voltages[b, s.outputs]))) for b, s in enumerate(systems)]
+    out = np.array([s.outputs[k] for s, k in zip(systems, best)])
+    gain = np.abs(voltages[np.arange(count), out])
+
+    caps = np.maximum(np.array([s.c for s in systems]).reshape(count, n_free), CMIN)
+    eig = np.linalg.eigvals(mna[:, :n_free, :n_free] / caps[:, :, None])
+    poles, stable = np.abs(eig).min(axis=1), (eig.real > 0).all(axis=1)
+    # Sweep from a hundredth of the dominant pole to ten times gain * pole; the
+    # unity-gain frequency is interpolated between the points around |v| = 1
+    steps = np.linspace(0.0, 1.0, SWEEP_POINTS)[:, None]
+    omegas = poles / 100 * (1000 * np.maximum(gain, 1.0)) ** steps
+    ac = mna.astype(complex)
+    response = []
+    for omega in omegas:
+        ac[:, free, free] = mna[:, free, free] + 1j * omega[:, None] * caps
+        response.append(np.linalg.solve(ac, rhs)[np.arange(count), out, 0])
+    response = np.array(response)
+    magnitude = np.log(np.maximum(np.abs(response), 1e-300))
+    shift = np.degrees(np.unwrap(np.angle(response), axis=0))
+    shift -= shift[0]
+    results = []
+    for b in range(count):
+        below = np.flatnonzero(magnitude[:, b] < 0)
+        if gain[b] < 1:
+            ugf, phase_margin = 0.0, 180.0  # never above unity gain
+        elif not len(below):
+            ugf, phase_margin = omegas[-1, b], 180.0 + shift[-1, b]
+        else:
+            i = below[0]
+            t = magnitude[i - 1, b] / (magnitude[i - 1, b] - magnitude[i, b])
+            ugf = omegas[i - 1, b] * (omegas[i, b] / omegas[i - 1, b]) ** t
+            phase_margin = 180.0 + shift[i - 1, b] + t * (shift[i, b] - shift[i - 1, b])
+        results.append((best[b], float(gain[b]), float(poles[b]), float(ugf), bool(stable[b]), float(phase_margin)))
+    return results
+
+def _solve(np: Any, systems: List[_System]) -> List[Optional[Tuple[int, float, float, float, bool, float]]]:
+    try:
+        return _solve_group(np, systems)
+    except np.linalg.LinAlgError:
+        if len(systems) == 1:
+            return [None]
+        return [r for s in systems for r in _solve(np, [s])]  # find the singular one(s)
+
+def estimate_batch(netlists: List[List[Dict[str, Any]]], library: Any = LIBRARY,
+                   supply_v: float = DEFAULT_SUPPLY_V) -> List[Dict[str, Any]]:
+    """
+    One estimate per netlist: {'gain', 'gain_db', 'pole_hz', 'gbw_hz',
+    'phase_margin_deg', 'power_w', 'output_net', 'stable'}, or {'error'} for a netlist that cannot be estimated
+    (a block without a macro-model, no input or output, too many nodes).
+    """
+    np = _numpy()
+    if np is None:
+        raise ImportError("estimator.py needs NumPy (pip install numpy)")
+    results: List[Optional[Dict[str, Any]]] = [None] * len(netlists)
+    systems: Dict[int, _System] = {}
+    groups: Dict[Tuple[int, int], List[int]] = {}
+    for i, netlist in enumerate(netlists):
+        try:
+            systems[i] = _System(netlist, library)
+        except ValueError as e:
+            results[i] = {'error': str(e)}
+            continue
+        except (KeyError, TypeError, AttributeError) as e:
+            results[i] = {'error': f"malformed netlist: {type(e).__name__}: {e}"}
+            continue
+        groups.setdefault((systems[i].n_free, systems[i].n_inputs), []).append(i)
+    for members in groups.values():
+        for i, solution in zip(members, _solve(np, [systems[i] for i in members])):
+            if solution is None:
+                results[i] = {'error': "singular system"}
+                continue
+            k, gain, pole, ugf, stable, phase_margin = solution
+            results[i] = {'gain': gain, 'gain_db': 20 * math.log10(max(gain, 1e-12)), 'pole_hz': pole / (2 * math.pi),
+                          'gbw_hz': ugf / (2 * math.pi), 'phase_margin_deg': phase_margin,
+                          'power_w': supply_v * systems[i].i_supply, 'output_net': systems[i].output_names[k], 'stable': stable}
+    return results
+
+def estimate_netlist(netlist: List[Dict[str, Any]], library: Any = LIBRARY, supply_v: float = DEFAULT_SUPPLY_V) -> Dict[str, Any]:
+    """estimate_batch for a single netlist."""
+    return estimate_batch([netlist], library, supply_v)[0]
+
+# ==============================================================================
+# ### --- SPECS AND RANKING --- ###
+# The targets are read from the specs text the design loop already has (the
+# format written by the spec editor). Each estimate gets a margin in dB per
+# target it has, positive when the target is met: gain in dB above the
+# target, GBW above it (20 log), power below it (10 log). A candidate is
+# rejected if it misses any of them, has less phase margin than asked for
+# (MIN_PHASE_MARGIN_DEG without a target), is unstable or could not be
+# estimated. The rest are ranked by their smallest margin, or by gain when
+# the specs give no targets.
+# ==============================================================================
+
+_NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+def parse_specs(text: str) -> Dict[str, float]:
+    """Numeric targets by SPEC_LABELS name, in SI units; 'Not Specified' values are left out."""
+    targets = {}
+    for line in text.splitlines():
+        label, sep, value = line.partition(':')
+        spec = SPEC_LABELS.get(label.strip())
+        match = _NUMBER.search(value) if spec and sep else None
+        if match:
+            targets[spec[0]] = float(match.group()) * spec[1]
+    return targets
+
+def _db(ratio: float, factor: float = 20.0) -> float:
+    return factor * math.log10(max(ratio, 1e-12))
+
+def spec_margins(estimate: Dict[str, Any], targets: Dict[str, float]) -> Dict[str, float]:
+    """Margin in dB of `estimate` against each of gain_db, gbw_hz and power_w in `targets`."""
+    margins = {}
+    if 'gain_db' in targets:
+        margins['gain_db'] = estimate['gain_db'] - targets['gain_db']
+    if targets.get('gbw_hz', 0) > 0:
+        margins['gbw_hz'] = _db(estimate['gbw_hz'] / targets['gbw_hz'])
+    if 'power_w' in targets and estimate['power_w'] > 0:  # a design drawing no current meets any power target
+        margins['power_w'] = _db(targets['power_w'] / estimate['power_w'], 10.0)
+    return margins
+
+def rank_key(record: Dict[str, Any]) -> Tuple[bool, float]:
+    """Sort key of a ranked record: passed before rejected, then by score, unestimated last."""
+    return not record['passed'], -record['score'] if record['score'] is not None else math.inf
+
+def rank_candidates(candidates: List[Tuple[str, List[Dict[str, Any]]]], targets: Optional[Dict[str, float]] = None,
+                    library: Any = LIBRARY) -> List[Dict[str, Any]]:
+    """
+    Estimates (source, netlist) pairs and returns one record per candidate,
+    {'source', 'passed', 'misses', 'score', 'estimate', 'margins'}, where
+    `misses` names the failed checks: candidates that pass first, each part
+    ordered by score (best first).
+    """
+    targets = targets or {}
+    estimates = estimate_batch([netlist for _, netlist in candidates], library, targets.get('supply_v', DEFAULT_SUPPLY_V))
+    records = []
+    for (source, _), estimate in zip(candidates, estimates):
+        if 'error' in estimate:
+            records.append({'source': source, 'passed': False, 'misses': [], 'score': None, 'estimate': estimate, 'margins': {}})
+            continue
+        margins = spec_margins(estimate, targets)
+        score = min(margins.values()) if margins else estimate['gain_db']
+        misses = [target for target, margin in margins.items() if margin < 0]
+        if estimate['phase_margin_deg'] < targets.get('phase_margin_deg', MIN_PHASE_MARGIN_DEG):
+            misses.append('phase_margin_deg')
+        if not estimate['stable']:
+            misses.append('stable')
+        records.append({'source': source, 'passed': not misses, 'misses': misses, 'score': score, 'estimate': estimate, 'margins': margins})
+    records.sort(key=rank_key)
+    return records
+
+# ==============================================================================
+# ### --- COMMAND LINE --- ###
+# ==============================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Estimate gain, dominant pole, GBW and power of netlists and rank them against the specs")
+    parser.add_argument('paths', nargs='+', help='Netlist JSON files, JSONL catalogs (e.g. from topology_enumerator.py) or directories')
+    parser.add_argument('--specs', type=str, default=None, help='Specs file with the targets (the analog_specs.txt format)')
+    parser.add_argument('--pattern', type=str, default="netlist_v*.json", help='File name pattern when searching directories')
+    parser.add_argument('--top', type=int, default=DEFAULT_TOP, help='Candidates to print')
+    parser.add_argument('--output', type=str, default=None, help='Write every ranked record to this file (JSONL)')
+    args = parser.parse_args()
+    from bulk_validate import iter_tasks, iter_chunks, load_task
+
+    targets: Dict[str, float] = {}
+    if args.specs:
+        with open(args.specs, 'r', encoding='utf-8') as f:
+            targets = parse_specs(f.read())
+    start = time.perf_counter()
+    records: List[Dict[str, Any]] = []
+    for chunk in iter_chunks(iter_tasks(args.paths, args.pattern), BATCH_SIZE):
+        candidates = []
+        for task in chunk:
+            try:
+                source, netlist, _ = load_task(task)
+            except (OSError, ValueError) as e:
+                records.append({'source': task[1], 'passed': False, 'misses': [], 'score': None, 'estimate': {'error': str(e)}, 'margins': {}})
+                continue
+            candidates.append((source, netlist))
+        try:
+            records.extend(rank_candidates(candidates, targets))
+        except ImportError as e:
+            print(f"Error: {e}")
+            sys.exit(1)
+    records.sort(key=rank_key)
+    elapsed = time.perf_counter() - start
+
+    if not records:
+        print("No netlists found.")
+        sys.exit(1)
+    passed = sum(r['passed'] for r in records)
+    errors = sum('error' in r['estimate'] for r in records)
+    print(f"Estimated {len(records)} netlist(s) in {elapsed:.2f}s ({len(records) / elapsed:.0f}/s).")
+    print(f"  - Targets: {', '.join(f'{k}={v:g}' for k, v in targets.items()) or 'none'}")
+    print(f"  - Passed: {passed}  Rejected: {len(records) - passed - errors}  Not estimated: {errors}")
+    print(f"{'#':>4} {'Source':<32} {'Gain (dB)':>10} {'Pole (kHz)':>11} {'GBW (MHz)':>10} {'PM (deg)':>9} {'Power (mW)':>11} {'Score':>7}")
+    for rank, r in enumerate(records[:args.top], 1):
+        e = r['estimate']
+        if 'error' in e:
+            print(f"{rank:>4} {r['source']:<32} {e['error']}")
+            continue
+        print(f"{rank:>4} {r['source']:<32} {e['gain_db']:>10.1f} {e['pole_hz'] / 1e3:>11.1f} {e['gbw_hz'] / 1e6:>10.1f} "
+              f"{e['phase_margin_deg']:>9.1f} {e['power_w'] * 1e3:>11.3f} {r['score']:>7.1f}{'  misses ' + ', '.join(r['misses']) if r['misses'] else ''}")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            for r in records:
+                f.write(json.dumps(r) + "\n")
+        print(f"Ranked records written to '{args.output}'")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,318 @@
+import os
+import sys
+import json
+import time
+import uuid
+import sqlite3
+import argparse
+import threading
+import multiprocessing
+from contextlib import contextmanager
+from typing import List, Dict, Any, Optional, Iterator
+
+import contact_two
+import telemetry
+from contact_two import slugify
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+DEFAULT_DB_PATH: str = "jobs.db"
+DEFAULT_OUTPUT_DIR: str = "runs"
+DEFAULT_WORKERS: int = 4
+# A running job whose worker stops renewing its lease for this long is handed to
+# another worker. Leases are renewed every JOB_LEASE_S / 3 seconds.
+JOB_LEASE_S: float = 60.0
+# A job is marked failed after this many claims that did not finish.
+MAX_ATTEMPTS: int = 3
+IDLE_POLL_S: float = 1.0
+
+# Per LLM_CONFIG entry (by name): requests in flight across all workers and
+# requests started per minute. Entries without limits fall back to the defaults;
+# None means unlimited. Keep rpm below the provider's quota so it never throttles.
+PROVIDER_LIMITS: Dict[str, Dict[str, Optional[int]]] = {
+    "LLM1": {"concurrency": 2, "rpm": 18},  # free-tier model: 20 requests/min upstream
+    "LLM2": {"concurrency": 8, "rpm": None},
+}
+DEFAULT_PROVIDER_CONCURRENCY: Optional[int] = 4
+DEFAULT_PROVIDER_RPM: Optional[int] = None
+# A request slot held longer than this (e.g. by a crashed worker) is released.
+REQUEST_LEASE_S: float = 600.0
+
+# ==============================================================================
+# ### --- DURABLE QUEUE --- ###
+# Jobs and in-flight provider requests live in one SQLite database (WAL mode),
+# so any number of worker processes on the machine can share it. Claims and
+# request admission run inside BEGIN IMMEDIATE transactions, which serialize
+# writers and make them atomic.
+# ==============================================================================
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    name TEXT NOT NULL,
+    specs TEXT NOT NULL,
+    priority INTEGER NOT NULL DEFAULT 0,
+    status TEXT NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker TEXT,
+    lease_expires REAL,
+    created REAL NOT NULL,
+    started REAL,
+    finished REAL,
+    run_dir TEXT,
+    result TEXT
+);
+CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (status, priority DESC, id);
+CREATE TABLE IF NOT EXISTS provider_requests (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    provider TEXT NOT NULL,
+    worker TEXT,
+    started REAL NOT NULL,
+    lease_expires REAL NOT NULL,
+    finished REAL
+);
+CREATE INDEX IF NOT EXISTS provider_requests_window ON provider_requests (provider, started);
+"""
+
+class JobQueue:
+    """A durable priority queue of design jobs with leases for crash recovery."""
+    def __init__(self, db_path: str = DEFAULT_DB_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._connection().executescript(_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        """One connection per thread; autocommit mode, transactions are explicit."""
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        db = self._connection()
+        db.execute("BEGIN IMMEDIATE")
+        try:
+            yield db
+        except BaseException:
+            db.execute("ROLLBACK")
+            raise
+        db.execute("COMMIT")
+
+    # --- Jobs ---
+    def submit(self, name: str, specs: str, priority: int = 0) -> int:
+        """Adds a pending job and returns its id. Higher priorities are claimed first."""
+        with self._transaction() as db:
+            cursor = db.execute("INSERT INTO jobs (name, specs, priority, created) VALUES (?, ?, ?, ?)",
+                                (name, specs, priority, time.time()))
+            return cursor.lastrowid
+
+    def claim(self, worker: str, output_dir: str, lease_s: float = JOB_LEASE_S) -> Optional[Dict[str, Any]]:
+        """Leases the highest-priority pending job to `worker`, or returns None if there is none."""
+        with self._transaction() as db:
+            row = db.execute("SELECT * FROM jobs WHERE status = 'pending' ORDER BY priority DESC, id LIMIT 1").fetchone()
+            if row is None:
+                return None
+            now = time.time()
+            # A retried job keeps its directory so earlier artifacts stay together.
+            run_dir = row['run_dir'] or os.path.join(output_dir, f"run_job{row['id']:06d}_{slugify(row['name'])}")
+            db.execute("UPDATE jobs SET status = 'running', worker = ?, lease_expires = ?, started = ?, "
+                       "attempts = attempts + 1, run_dir = ? WHERE id = ?",
+                       (worker, now + lease_s, now, run_dir, row['id']))
+        job = dict(row)
+        job.update(status='running', worker=worker, run_dir=run_dir, attempts=row['attempts'] + 1)
+        return job
+
+    def renew(self, job_id: int, worker: str, lease_s: float = JOB_LEASE_S) -> bool:
+        """Extends the lease on a running job. Returns False if the job was taken away."""
+        with self._transaction() as db:
+            cursor = db.execute("UPDATE jobs SET lease_expires = ? WHERE id = ? AND worker = ? AND status = 'running'",
+                                (time.time() + lease_s, job_id, worker))
+            return cursor.rowcount == 1
+
+    def finish(self, job_id: int, worker: str, result: Dict[str, Any]) -> None:
+        """Records the outcome of a job. 'done' means the loop ran to completion, whatever its verdict."""
+        status = 'failed' if result.get('status') == 'error' else 'done'
+        with self._transaction() as db:
+            db.execute("UPDATE jobs SET status = ?, finished = ?, lease_expires = NULL, result = ? "
+                       "WHERE id = ? AND worker = ?",
+                       (status, time.time(), json.dumps(result), job_id, worker))
+
+    def recover_expired(self, max_attempts: int = MAX_ATTEMPTS) -> int:
+        """Requeues running jobs whose lease expired (their worker died). Returns how many."""
+        with self._transaction() as db:
+            now = time.time()
+            db.execute("UPDATE jobs SET status = 'failed', finished = ?, result = ? "
+                       "WHERE status = 'running' AND lease_expires < ? AND attempts >= ?",
+                       (now, json.dumps({'status': 'error', 'error': 'worker lost too many times'}), now, max_attempts))
+            cursor = db.execute("UPDATE jobs SET status = 'pending', worker = NULL, lease_expires = NULL "
+                                "WHERE status = 'running' AND lease_expires < ?", (now,))
+            return cursor.rowcount
+
+    def counts(self) -> Dict[str, int]:
+        rows = self._connection().execute("SELECT status, COUNT(*) AS n FROM jobs GROUP BY status").fetchall()
+        return {row['status']: row['n'] for row in rows}
+
+    def jobs(self, status: Optional[str] = None) -> List[Dict[str, Any]]:
+        query, args = "SELECT id, name, priority, status, attempts, worker, run_dir, result FROM jobs", ()
+        if status:
+            query, args = query + " WHERE status = ?", (status,)
+        return [dict(row) for row in self._connection().execute(query + " ORDER BY id", args)]
+
+    # --- Provider admission ---
+    def try_acquire_request(self, provider: str, worker: str, concurrency: Optional[int], rpm: Optional[int]) -> Any:
+        """
+        Takes a request slot for `provider` if its concurrency and per-minute budgets
+        allow. Returns the slot id, or the number of seconds to wait before retrying.
+        """
+        with self._transaction() as db:
+            now = time.time()
+            if concurrency is not None:
+                active = db.execute("SELECT COUNT(*) FROM provider_requests WHERE provider = ? AND finished IS NULL "
+                                    "AND lease_expires > ?", (provider, now)).fetchone()[0]
+                if active >= concurrency:
+                    return 0.1
+            if rpm is not None:
+                window = db.execute("SELECT COUNT(*), MIN(started) FROM provider_requests WHERE provider = ? AND started > ?",
+                                    (provider, now - 60.0)).fetchone()
+                if window[0] >= rpm:
+                    return max(0.05, window[1] + 60.0 - now)
+            cursor = db.execute("INSERT INTO provider_requests (provider, worker, started, lease_expires) VALUES (?, ?, ?, ?)",
+                                (provider, worker, now, now + REQUEST_LEASE_S))
+            # Rows older than the rate window are no longer needed once finished.
+            db.execute("DELETE FROM provider_requests WHERE started < ? AND (finished IS NOT NULL OR lease_expires < ?)",
+                       (now - 120.0, now))
+            return cursor.lastrowid
+
+    def release_request(self, slot_id: int) -> None:
+        with self._transaction() as db:
+            db.execute("UPDATE provider_requests SET finished = ? WHERE id = ?", (time.time(), slot_id))
+
+class ProviderGate:
+    """
+    Request gate for contact_two.set_request_gate: holds a cross-process slot of the
+    LLM_CONFIG entry's concurrency and per-minute budget for the length of a request.
+    """
+    def __init__(self, queue: JobQueue, worker: str):
+        self.queue = queue
+        self.worker = worker
+        self._providers = {c['model_identifier']: c['name'] for c in contact_two.LLM_CONFIG}
+
+    @contextmanager
+    def __call__(self, model: str) -> Iterator[None]:
+        provider = self._providers.get(model, model)
+        limits = PROVIDER_LIMITS.get(provider, {})
+        concurrency = limits.get('concurrency', DEFAULT_PROVIDER_CONCURRENCY)
+        rpm = limits.get('rpm', DEFAULT_PROVIDER_RPM)
+        while True:
+            slot = self.queue.try_acquire_request(provider, self.worker, concurrency, rpm)
+            if isinstance(slot, int):
+                break
+            time.sleep(slot)
+        try:
+            yield
+        finally:
+            self.queue.release_request(slot)
+
+# ==============================================================================
+# ### --- WORKERS --- ###
+# ==============================================================================
+
+def _keep_lease(queue: JobQueue, job_id: int, worker: str, stop: threading.Event) -> None:
+    while not stop.wait(JOB_LEASE_S / 3):
+        if not queue.renew(job_id, worker):
+            print(f"[Worker {worker}] Lost the lease on job {job_id}.")
+            return
+
+def run_worker(db_path: str, output_dir: str, exit_when_empty: bool = False, worker: Optional[str] = None) -> int:
+    """Claims and runs jobs until the queue is empty (or forever). Returns the number of jobs run."""
+    from batch_orchestrator import run_one
+
+    worker = worker or f"{os.uname().nodename if hasattr(os, 'uname') else 'host'}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+    queue = JobQueue(db_path)
+    contact_two.set_request_gate(ProviderGate(queue, worker))
+    if telemetry.PROM_PATH and '{pid}' not in telemetry.PROM_PATH:
+        # Workers share the directory, so each one exports its own metrics file.
+        root, ext = os.path.splitext(telemetry.PROM_PATH)
+        telemetry.PROM_PATH = root + "_{pid}" + ext
+    completed = 0
+    while True:
+        queue.recover_expired()
+        job = queue.claim(worker, output_dir)
+        if job is None:
+            if exit_when_empty and not queue.counts().get('running'):
+                return completed
+            time.sleep(IDLE_POLL_S)
+            continue
+        print(f"[Worker {worker}] Job {job['id']} '{job['name']}' (priority {job['priority']}, attempt {job['attempts']})")
+        stop = threading.Event()
+        heartbeat = threading.Thread(target=_keep_lease, args=(queue, job['id'], worker, stop), daemon=True)
+        heartbeat.start()
+        try:
+            # A job taken over from a lost worker continues from that worker's last checkpoint.
+            result = run_one(job['name'], job['specs'], job['run_dir'], resume=job['attempts'] > 1)
+        finally:
+            stop.set()
+            heartbeat.join()
+        queue.finish(job['id'], worker, result)
+        completed += 1
+        print(f"[Worker {worker}] Job {job['id']} finished: {result['status']}")
+
+def run_workers(db_path: str, output_dir: str, workers: int, exit_when_empty: bool = False) -> None:
+    """Starts `workers` worker processes and waits for them."""
+    processes = [multiprocessing.Process(target=run_worker, args=(db_path, output_dir, exit_when_empty))
+                 for _ in range(max(1, workers))]
+    for p in processes:
+        p.start()
+    try:
+        for p in processes:
+            p.join()
+    except KeyboardInterrupt:
+        for p in processes:
+            p.terminate()
+
+# ==============================================================================
+# ### --- COMMAND LINE --- ###
+# ==============================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Durable design-job queue and workers")
+    parser.add_argument('--db', type=str, default=DEFAULT_DB_PATH, help='Queue database (SQLite)')
+    commands = parser.add_subparsers(dest='command', required=True)
+    submit = commands.add_parser('submit', help='Queue one job per spec (text or JSON spec files)')
+    submit.add_argument('specs', nargs='+')
+    submit.add_argument('--priority', type=int, default=0, help='Higher runs first')
+    work = commands.add_parser('work', help='Run worker processes')
+    work.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help='Worker processes')
+    work.add_argument('--output-dir', type=str, default=DEFAULT_OUTPUT_DIR, help='Directory that receives the run_* directories')
+    work.add_argument('--exit-when-empty', action='store_true', help='Stop once no job is pending or running')
+    commands.add_parser('status', help='Show job counts and results')
+    args = parser.parse_args()
+
+    if args.command == 'submit':
+        from batch_orchestrator import load_spec_file
+        queue = JobQueue(args.db)
+        for path in args.specs:
+            for name, specs in load_spec_file(path):
+                print(f"Queued job {queue.submit(name, specs, args.priority)}: '{name}' (priority {args.priority})")
+    elif args.command == 'work':
+        run_workers(args.db, args.output_dir, args.workers, args.exit_when_empty)
+    else:
+        queue = JobQueue(args.db)
+        print(f"{'Job':>6} {'Pri':>4} {'Status':<8} {'Tries':>5}  {'Name':<30} Result")
+        print("-" * 80)
+        for job in queue.jobs():
+            result = json.loads(job['result'])['status'] if job['result'] else "-"
+            print(f"{job['id']:>6} {job['priority']:>4} {job['status']:<8} {job['attempts']:>5}  {job['name'][:30]:<30} {result}")
+        print("\n" + ", ".join(f"{status}: {n}" for status, n in sorted(queue.counts().items())))
+        if queue.counts().get('failed'):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
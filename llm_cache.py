@@ -0,0 +1,104 @@
+import os
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional
+
+# ==============================================================================
+# ### --- CONTENT-ADDRESSED LLM RESPONSE CACHE --- ###
+# Responses are stored one file per key under the cache directory. The key is a
+# hash of everything that determines the completion (model, prompt, sampling
+# parameters), so identical requests are answered from disk. Least recently used
+# entries are evicted once the directory grows past its size cap; file mtimes
+# carry the LRU order across processes. Each process indexes the directory once
+# and picks up files other processes write later when they are first read.
+# ==============================================================================
+
+def make_cache_key(model: str, prompt: str, params: Optional[Dict[str, Any]] = None) -> str:
+    """Returns the SHA-256 key for a request to `model` with `prompt` and sampling `params`."""
+    payload = json.dumps({'model': model, 'prompt': prompt, 'params': params or {}}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class ResponseCache:
+    """On-disk response store with a size cap and LRU eviction."""
+    def __init__(self, cache_dir: str, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._index: Optional["OrderedDict[str, int]"] = None  # key -> size, oldest first
+        self._total_bytes = 0
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.txt")
+
+    def _load_index(self) -> None:
+        """Builds the in-memory LRU index from the files already on disk (once per process)."""
+        if self._index is not None:
+            return
+        os.makedirs(self.cache_dir, exist_ok=True)
+        entries = []
+        for entry in os.scandir(self.cache_dir):
+            if entry.is_file() and entry.name.endswith('.txt'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-4], stat.st_size))
+        entries.sort()
+        self._index = OrderedDict((key, size) for _, key, size in entries)
+        self._total_bytes = sum(self._index.values())
+
+    def get(self, key: str) -> Optional[str]:
+        """Returns the cached response for `key` and marks it as recently used, or None."""
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            try:
+                with open(path, 'r', encoding='utf-8') as f:
+                    response = f.read()
+                os.utime(path)
+                size = os.path.getsize(path)
+            except FileNotFoundError:
+                # Never stored, or evicted by another process sharing the directory.
+                self._total_bytes -= self._index.pop(key, 0)
+                return None
+            if key not in self._index:
+                # Written by another process after the index was built
+                self._index[key] = size
+                self._total_bytes += size
+                self._evict()
+            self._index.move_to_end(key)
+            return response
+
+    def put(self, key: str, response: str) -> None:
+        """Stores `response` under `key` and evicts old entries beyond the size cap."""
+        with self._lock:
+            self._load_index()
+            path = self._path(key)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(response)
+            os.replace(tmp_path, path)
+            self._total_bytes -= self._index.pop(key, 0)
+            self._index[key] = os.path.getsize(path)
+            self._total_bytes += self._index[key]
+            self._evict()
+
+    def _evict(self) -> None:
+        while self._total_bytes > self.max_bytes and len(self._index) > 1:
+            key, size = self._index.popitem(last=False)
+            self._total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def clear(self) -> None:
+        """Deletes every cached response."""
+        with self._lock:
+            self._load_index()
+            for key in list(self._index):
+                try:
+                    os.remove(self._path(key))
+                except FileNotFoundError:
+                    pass
+            self._index.clear()
+            self._total_bytes = 0
@@ -0,0 +1,245 @@
+import os
+import json
+import time
+import random
+import argparse
+import threading
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from typing import List, Dict, Any, Optional, Tuple
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# A local stand-in for the OpenAI-compatible chat-completions API. Point the
+# orchestrator at it with a single setting:
+#     OPENROUTER_API_BASE=http://127.0.0.1:8765/v1 python stack.py
+# ==============================================================================
+
+DEFAULT_HOST: str = "127.0.0.1"
+DEFAULT_PORT: int = 8765
+DEFAULT_MIX: str = "valid=0.4,umpire_fail=0.3,malformed_json=0.1,missing_fence=0.1,think_fences=0.1"
+STREAM_CHUNK_CHARS: int = 16
+
+# ==============================================================================
+# ### --- SCRIPTED RESPONSES --- ###
+# ==============================================================================
+
+def _amplifier(load_block: str = 'CurrentMirrorP', bias: bool = True) -> List[Dict[str, Any]]:
+    """Two amplifier cells sharing their inputs; passes the Umpire with the default arguments."""
+    netlist = []
+    for k in range(2):
+        load_supply = ('pwr_vdd', 'VDD') if load_block == 'CurrentMirrorP' else ('pwr_gnd', 'GND')
+        netlist += [
+            {'id': f'DP{k}', 'block_type': 'DifferentialPairN', 'connections': {'v_in+': 'IN+', 'v_in-': 'IN-', 'i_out1': f'a{k}', 'i_out2': f'b{k}', 'i_in_bias': f'bias{k}', 'pwr_vdd': 'VDD', 'pwr_gnd': 'GND'}},
+            {'id': f'LD{k}', 'block_type': load_block, 'connections': {'i_in_ref': f'a{k}', 'i_out_load': f'b{k}', load_supply[0]: load_supply[1]}},
+            {'id': f'CS{k}', 'block_type': 'CommonSourceN', 'connections': {'v_in': f'b{k}', 'i_out': f'out{k}', 'pwr_gnd': 'GND'}},
+            {'id': f'OL{k}', 'block_type': 'CurrentMirrorP', 'connections': {'i_in_ref': 'REF', 'i_out_load': f'out{k}', 'pwr_vdd': 'VDD'}},
+        ]
+        if bias:
+            netlist.append({'id': f'BS{k}', 'block_type': 'SimpleBiasN', 'connections': {'i_out_bias': f'bias{k}', 'pwr_gnd': 'GND'}})
+    return netlist
+
+def _fenced(netlist: Any) -> str:
+    return "```json\n" + json.dumps(netlist, indent=2) + "\n```"
+
+SCENARIOS: Dict[str, str] = {
+    'valid': "Here is the design:\n\n" + _fenced(_amplifier()) + "\n\nThis two-stage amplifier meets the specifications.",
+    'umpire_fail': "Here is the design:\n\n" + _fenced(_amplifier(load_block='CurrentMirrorN_Load', bias=False)) + "\n\nThe NMOS mirrors act as loads.",
+    'malformed_json': "Here is the design:\n\n```json\n" + json.dumps(_amplifier(), indent=2)[:-40] + "\n```\n",
+    'missing_fence': "Here is the design:\n\n" + json.dumps(_amplifier(), indent=2) + "\n",
+    'think_fences': "<think>Maybe something like ```json [draft``` but with a better load.</think>\n\n" + _fenced(_amplifier()) + "\n\n" + "Trailing explanation. " * 50,
+    'wrapped': "Here is the design:\n\n" + _fenced({'netlist': _amplifier()}) + "\n",
+}
+
+def load_recorded_responses(path: str) -> List[str]:
+    """Loads responses from run directories (llm_response_v*.txt) or a JSONL file of {"content": ...}."""
+    responses = []
+    if os.path.isdir(path):
+        for dirpath, _, filenames in os.walk(path):
+            for name in sorted(filenames):
+                if name.startswith("llm_response_v") and name.endswith(".txt"):
+                    with open(os.path.join(dirpath, name), 'r', encoding='utf-8') as f:
+                        responses.append(f.read())
+    else:
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if line.strip():
+                    record = json.loads(line)
+                    responses.append(record['content'] if isinstance(record, dict) else str(record))
+    return responses
+
+# ==============================================================================
+# ### --- BEHAVIOUR MODEL --- ###
+# ==============================================================================
+
+class LatencyModel:
+    """Samples response latency in seconds from 'fixed:S', 'uniform:LO,HI' or 'lognormal:MU,SIGMA'."""
+    def __init__(self, spec: str):
+        kind, _, params = spec.partition(':')
+        self.kind = kind
+        self.params = [float(p) for p in params.split(',')] if params else []
+        if kind not in ('fixed', 'uniform', 'lognormal'):
+            raise ValueError(f"Unknown latency distribution '{kind}'")
+
+    def sample(self, rng: random.Random) -> float:
+        if self.kind == 'fixed':
+            return self.params[0] if self.params else 0.0
+        if self.kind == 'uniform':
+            return rng.uniform(self.params[0], self.params[1])
+        return rng.lognormvariate(self.params[0], self.params[1])
+
+class MockBehaviour:
+    """Decides, per request, which response to send and which failure (if any) to inject."""
+    def __init__(self, mix: str = DEFAULT_MIX, recorded: Optional[List[str]] = None, script: Optional[List[str]] = None,
+                 latency: str = "fixed:0", error_rate: float = 0.0, rate_limit_rate: float = 0.0,
+                 retry_after: float = 1.0, chunk_delay: float = 0.0, seed: int = 0):
+        self.mix = [(name, float(weight)) for name, weight in (item.split('=') for item in mix.split(',') if item)]
+        for name, _ in self.mix:
+            if name not in SCENARIOS:
+                raise ValueError(f"Unknown scenario '{name}'. Choose from: {', '.join(SCENARIOS)}")
+        self.recorded = recorded or []
+        self.script = script or []
+        for name in self.script:
+            if name not in SCENARIOS:
+                raise ValueError(f"Unknown scenario '{name}' in script. Choose from: {', '.join(SCENARIOS)}")
+        self.latency = LatencyModel(latency)
+        self.error_rate, self.rate_limit_rate, self.retry_after = error_rate, rate_limit_rate, retry_after
+        self.chunk_delay = chunk_delay
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._count = 0
+
+    def next(self) -> Tuple[Optional[int], str, float]:
+        """Returns (HTTP error status or None, response content, latency)."""
+        with self._lock:
+            n, self._count = self._count, self._count + 1
+            latency = self.latency.sample(self._rng)
+            roll = self._rng.random()
+            if roll < self.rate_limit_rate:
+                return 429, "Rate limit exceeded (mock).", latency
+            if roll < self.rate_limit_rate + self.error_rate:
+                return 500, "Internal server error (mock).", latency
+            if self.script:
+                return None, SCENARIOS[self.script[n % len(self.script)]], latency
+            if self.recorded:
+                return None, self._rng.choice(self.recorded), latency
+            names, weights = zip(*self.mix)
+            return None, SCENARIOS[self._rng.choices(names, weights)[0]], latency
+
+# ==============================================================================
+# ### --- HTTP SERVER --- ###
+# ==============================================================================
+
+def _usage(prompt: str, content: str) -> Dict[str, int]:
+    prompt_tokens, completion_tokens = len(prompt) // 4, len(content) // 4
+    return {'prompt_tokens': prompt_tokens, 'completion_tokens': completion_tokens, 'total_tokens': prompt_tokens + completion_tokens}
+
+class MockChatHandler(BaseHTTPRequestHandler):
+    behaviour: MockBehaviour = None  # set by make_server
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: Dict[str, Any], headers: Optional[Dict[str, str]] = None) -> None:
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip('/').endswith('/chat/completions'):
+            self._send_json(404, {'error': {'message': f"Unknown path {self.path}"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+        prompt = "".join(m.get('content', '') for m in request.get('messages', []) if isinstance(m.get('content'), str))
+        model = request.get('model', 'mock')
+        status, content, latency = self.behaviour.next()
+        time.sleep(latency)
+        if status is not None:
+            headers = {'Retry-After': str(self.behaviour.retry_after)} if status == 429 else None
+            self._send_json(status, {'error': {'message': content, 'code': status}}, headers)
+            return
+
+        completion_id = f"chatcmpl-mock-{time.time_ns()}"
+        created = int(time.time())
+        if not request.get('stream'):
+            self._send_json(200, {
+                'id': completion_id, 'object': 'chat.completion', 'created': created, 'model': model,
+                'choices': [{'index': 0, 'message': {'role': 'assistant', 'content': content}, 'finish_reason': 'stop'}],
+                'usage': _usage(prompt, content),
+            })
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/event-stream')
+        self.send_header('Cache-Control', 'no-cache')
+        self.send_header('Connection', 'close')
+        self.end_headers()
+        def event(delta: Dict[str, Any], finish_reason: Optional[str] = None, usage: Optional[Dict[str, int]] = None) -> None:
+            chunk = {'id': completion_id, 'object': 'chat.completion.chunk', 'created': created, 'model': model,
+                     'choices': [{'index': 0, 'delta': delta, 'finish_reason': finish_reason}]}
+            if usage:
+                chunk['usage'] = usage
+            self.wfile.write(f"data: {json.dumps(chunk)}\n\n".encode('utf-8'))
+            self.wfile.flush()
+        try:
+            event({'role': 'assistant', 'content': ''})
+            for i in range(0, len(content), STREAM_CHUNK_CHARS):
+                event({'content': content[i:i + STREAM_CHUNK_CHARS]})
+                if self.behaviour.chunk_delay:
+                    time.sleep(self.behaviour.chunk_delay)
+            event({}, 'stop', _usage(prompt, content))
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # the client closed the stream early
+        self.close_connection = True
+
+def make_server(behaviour: MockBehaviour, host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> ThreadingHTTPServer:
+    """Creates (but does not start) a mock server; port 0 picks a free port."""
+    handler = type('BoundMockChatHandler', (MockChatHandler,), {'behaviour': behaviour})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    return server
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Mock OpenAI-compatible chat-completions server for offline load tests")
+    parser.add_argument('--host', type=str, default=DEFAULT_HOST)
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT)
+    parser.add_argument('--mix', type=str, default=DEFAULT_MIX, help=f"Weighted scenarios, from: {', '.join(SCENARIOS)}")
+    parser.add_argument('--script', type=str, default=None, help='Comma-separated scenarios returned in order, cycling')
+    parser.add_argument('--responses', type=str, default=None, help='Replay recorded responses (run directory tree or JSONL)')
+    parser.add_argument('--latency', type=str, default="fixed:0", help="'fixed:S', 'uniform:LO,HI' or 'lognormal:MU,SIGMA' (seconds)")
+    parser.add_argument('--chunk-delay', type=float, default=0.0, help='Seconds between streamed chunks')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 500')
+    parser.add_argument('--rate-limit-rate', type=float, default=0.0, help='Fraction of requests answered with HTTP 429')
+    parser.add_argument('--retry-after', type=float, default=1.0, help='Retry-After seconds sent with 429s')
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    try:
+        behaviour = MockBehaviour(
+            mix=args.mix,
+            recorded=load_recorded_responses(args.responses) if args.responses else None,
+            script=args.script.split(',') if args.script else None,
+            latency=args.latency, error_rate=args.error_rate, rate_limit_rate=args.rate_limit_rate,
+            retry_after=args.retry_after, chunk_delay=args.chunk_delay, seed=args.seed,
+        )
+    except ValueError as e:
+        parser.error(str(e))
+    server = make_server(behaviour, args.host, args.port)
+    print(f"Mock LLM server listening on http://{args.host}:{server.server_address[1]}/v1")
+    print(f"Point the orchestrator at it with: OPENROUTER_API_BASE=http://{args.host}:{server.server_address[1]}/v1")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,272 @@
+import re
+import json
+from typing import List, Dict, Any, Optional, Tuple
+
+# ==============================================================================
+# ### --- NETLIST EXTRACTION FROM LLM RESPONSES --- ###
+# LLM responses wrap the netlist in many ways: a ```json fence, an unlabeled ```
+# fence, a bare array in the prose, an object such as {"netlist": [...]}, with
+# trailing commas or comments, and often after a <think> block that contains its
+# own fences. The text is scanned once for <think> tags and fences; candidates are
+# then tried best first (fences outside <think>, then bare JSON, then anything
+# inside <think>) and the first one with the shape of a netlist wins. Every
+# recovery applied on the way is reported in Extraction.method.
+# ==============================================================================
+
+_TOKENS = ("```", "<think>", "</think>")
+_FENCE_LABEL = re.compile(r"[ \t]*([A-Za-z0-9_+-]*)")
+_BARE_START = re.compile(r"\[\s*\{|\{\s*\"")
+_TRAILING_COMMA = re.compile(r",(\s*[\]}])")
+
+class Block:
+    """A fenced block: its label ('' if none), content, and where it was found."""
+    __slots__ = ('label', 'text', 'in_think', 'closed', 'start')
+    def __init__(self, label: str, text: str, in_think: bool, closed: bool, start: int):
+        self.label, self.text, self.in_think, self.closed, self.start = label, text, in_think, closed, start
+
+class FenceScanner:
+    """
+    Incremental scanner for <think> regions and ``` fences. feed() may be called
+    with a growing buffer (streaming) and returns the blocks that closed since the
+    last call; with `final`, an unclosed block is returned as well. The prose
+    between fences is collected in `prose` as (start, end, in_think) spans.
+    """
+    def __init__(self):
+        self.pos = 0
+        self.in_think = False
+        self.open_fence: Optional[Tuple[str, int, bool]] = None  # (label, content start, in_think)
+        self.prose: List[Tuple[int, int, bool]] = []
+        self._prose_start = 0
+        # Next known occurrence of each token (-1: none up to `searched`), so every
+        # part of the text is searched once per token with str.find.
+        self._next = {token: (-1, 0) for token in _TOKENS}
+
+    def _find(self, buffer: str, token: str) -> int:
+        index, searched = self._next[token]
+        if index >= self.pos:
+            return index
+        index = buffer.find(token, max(self.pos, searched))
+        # A token cut off at the end of a partial buffer is searched again next time.
+        self._next[token] = (index, 0 if index != -1 else max(self.pos, len(buffer) - len(token) + 1))
+        return index
+
+    def feed(self, buffer: str, final: bool = False) -> List[Block]:
+        blocks = []
+        while True:
+            if self.open_fence is not None:
+                end = self._find(buffer, "```")
+                if end == -1:
+                    break
+                label, start, in_think = self.open_fence
+                blocks.append(Block(label, buffer[start:end], in_think, True, start))
+                self.open_fence = None
+                self._prose_start = self.pos = end + 3  # a closing fence carries no label
+                continue
+            found = [(index, token) for token in _TOKENS for index in (self._find(buffer, token),) if index != -1]
+            if not found:
+                break
+            index, token = min(found)
+            if token == "```":
+                label = _FENCE_LABEL.match(buffer, index + 3)
+                if not final and label.end() == len(buffer):
+                    break  # the fence label may continue in the next piece
+                self.prose.append((self._prose_start, index, self.in_think))
+                self.open_fence = (label.group(1).lower(), label.end(), self.in_think)
+                self.pos = label.end()
+            else:
+                self.prose.append((self._prose_start, index, self.in_think))
+                self.in_think = token == "<think>"
+                self._prose_start = self.pos = index + len(token)
+        if final:
+            if self.open_fence is not None:
+                label, start, in_think = self.open_fence
+                blocks.append(Block(label, buffer[start:], in_think, False, start))
+                self.open_fence = None
+            else:
+                self.prose.append((self._prose_start, len(buffer), self.in_think))
+            self.pos = len(buffer)
+        return blocks
+
+# --- Candidate parsing ---
+
+def _strip_comments(text: str) -> str:
+    """Removes // and /* */ comments outside JSON strings."""
+    out, i, n, in_string = [], 0, len(text), False
+    while i < n:
+        c = text[i]
+        if in_string:
+            out.append(c)
+            if c == '\\' and i + 1 < n:
+                out.append(text[i + 1])
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+            out.append(c)
+        elif text.startswith('//', i):
+            end = text.find('\n', i)
+            i = n if end == -1 else end
+            continue
+        elif text.startswith('/*', i):
+            end = text.find('*/', i + 2)
+            i = n if end == -1 else end + 2
+            continue
+        else:
+            out.append(c)
+        i += 1
+    return ''.join(out)
+
+def _loads(text: str) -> Tuple[Any, List[str]]:
+    """Parses JSON text, repairing comments, trailing commas and surrounding prose if needed."""
+    text = text.strip()
+    try:
+        return json.loads(text), []
+    except (ValueError, RecursionError):  # RecursionError: nested too deeply for the decoder
+        pass
+    repairs = []
+    if '//' in text or '/*' in text:
+        stripped = _strip_comments(text)
+        if stripped != text:
+            text, repairs = stripped, repairs + ['comments']
+    fixed = _TRAILING_COMMA.sub(r"\1", text)
+    if fixed != text:
+        text, repairs = fixed, repairs + ['trailing_commas']
+    try:
+        return json.loads(text), repairs
+    except (ValueError, RecursionError):
+        pass
+    # Prose inside the fence: decode the first JSON value and ignore the rest.
+    m = _BARE_START.search(text)
+    if m:
+        try:
+            return json.JSONDecoder().raw_decode(text, m.start())[0], repairs + ['trimmed']
+        except (ValueError, RecursionError):
+            pass
+    raise ValueError("no JSON value")
+
+def is_netlist(value: Any) -> bool:
+    """True for a non-empty list of components with id, block_type and connections."""
+    return (isinstance(value, list) and bool(value) and
+            all(isinstance(c, dict) and 'id' in c and 'block_type' in c and isinstance(c.get('connections'), dict) for c in value))
+
+def _as_netlist(value: Any) -> Tuple[Any, Optional[str]]:
+    """Returns (netlist, key) with wrapper objects such as {"netlist": [...]} unwrapped by `key`."""
+    if isinstance(value, dict):
+        for key, inner in value.items():
+            if is_netlist(inner):
+                return inner, key
+    return value, None
+
+# ==============================================================================
+# ### --- EXTRACTION --- ###
+# ==============================================================================
+
+class Extraction:
+    """Outcome of extract_netlist: the netlist (or None), whether it has the netlist shape, and how it was found."""
+    __slots__ = ('netlist', 'valid', 'method')
+    def __init__(self, netlist: Any = None, valid: bool = False, method: str = "none"):
+        self.netlist, self.valid, self.method = netlist, valid, method
+
+    @property
+    def recovered(self) -> bool:
+        """True if anything beyond a clean ```json fence outside <think> was needed."""
+        return self.method != "fence:json"
+
+def _try(text: str, source: str, in_think: bool) -> Optional[Extraction]:
+    try:
+        value, repairs = _loads(text)
+    except ValueError:
+        return None
+    netlist, key = _as_netlist(value)
+    parts = [source] + (["think"] if in_think else []) + ([f"unwrap:{key}"] if key else []) + repairs
+    valid = is_netlist(netlist)
+    return Extraction(netlist, valid, "+".join(parts + ([] if valid else ["unvalidated"])))
+
+def try_block(block: Block) -> Optional[Extraction]:
+    """Parses one fenced block."""
+    source = "fence:" + ("json" if block.label == "json" else block.label or "unlabeled")
+    return _try(block.text, source if block.closed else source + "+unclosed", block.in_think)
+
+def _bare_candidates(text: str, spans: List[Tuple[int, int, bool]], in_think: bool):
+    """Yields (value, repairs) for JSON values starting in the prose spans, skipping past each one decoded."""
+    decoder = json.JSONDecoder()
+    closing: Dict[int, Optional[int]] = {}  # shared by all start positions, so unbalanced prose is scanned once
+    for start, end, span_in_think in spans:
+        if span_in_think != in_think:
+            continue
+        pos = start
+        while True:
+            m = _BARE_START.search(text, pos, end)
+            if m is None:
+                break
+            if m.start() not in closing:
+                closing.update(_matching_brackets(text, m.start()))
+            if closing[m.start()] is None:
+                pos = m.start() + 1  # unbalanced: no JSON value starts here
+                continue
+            try:
+                value, pos = decoder.raw_decode(text, m.start())
+                yield value, []
+                continue
+            except (ValueError, RecursionError):
+                pass
+            pos = closing[m.start()] + 1
+            try:
+                yield _loads(text[m.start():pos])
+            except ValueError:
+                continue
+
+def _matching_brackets(text: str, start: int) -> Dict[int, Optional[int]]:
+    """
+    Index of the bracket closing each one opened from `start` on, skipping strings;
+    None if unbalanced. Stops once the bracket at `start` is closed.
+    """
+    pairs: Dict[int, Optional[int]] = {}
+    stack, in_string, i = [], False, start
+    while i < len(text):
+        c = text[i]
+        if in_string:
+            if c == '\\':
+                i += 1
+            elif c == '"':
+                in_string = False
+        elif c == '"':
+            in_string = True
+        elif c in '[{':
+            stack.append(i)
+        elif c in ']}':
+            pairs[stack.pop()] = i
+            if not stack:
+                return pairs
+        i += 1
+    pairs.update((j, None) for j in stack)
+    return pairs
+
+def extract_netlist(text: str) -> Extraction:
+    """
+    Finds the netlist in an LLM response. Candidates are tried in this order, the
+    first with the netlist shape winning: fences outside <think> (```json first,
+    then unlabeled or other labels, then an unclosed fence), bare JSON in the prose,
+    then the same inside <think>. If no candidate has the shape, the first one that
+    parsed is returned with valid=False so the Umpire can report the format error.
+    """
+    scanner = FenceScanner()
+    blocks = scanner.feed(text, final=True)
+    fallback: Optional[Extraction] = None
+    for in_think in (False, True):
+        ranked = sorted((b for b in blocks if b.in_think == in_think),
+                        key=lambda b: (not b.closed, b.label != "json", b.start))
+        for block in ranked:
+            result = try_block(block)
+            if result is None:
+                continue
+            if result.valid:
+                return result
+            fallback = fallback or result
+        for value, repairs in _bare_candidates(text, scanner.prose, in_think):
+            netlist, key = _as_netlist(value)
+            if is_netlist(netlist):
+                parts = ["bare"] + (["think"] if in_think else []) + ([f"unwrap:{key}"] if key else []) + repairs
+                return Extraction(netlist, True, "+".join(parts))
+    return fallback or Extraction()
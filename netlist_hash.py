@@ -0,0 +1,427 @@
+import sys
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Dict, Any, Optional, Tuple
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+DEFAULT_CACHE_PATH: str = "verdicts.db"
+SUPPLY_NETS: Tuple[str, ...] = ('VDD', 'GND')  # compared upper-case, like the Umpire rules
+MAX_CANON_LEAVES: int = 256  # labelings tried per connected piece before the best so far is kept
+MEMORY_ENTRIES: int = 4096  # verdicts also held in memory, per cache
+# Finding details that name components or nets; they are stored relative to the
+# canonical labeling and translated back to the names of the netlist being checked.
+COMPONENT_KEYS: Tuple[str, ...] = ('cid', 'sid', 'lid', 'component_id', 'stage_id', 'load_id')
+COMPONENT_LIST_KEYS: Tuple[str, ...] = ('found', 'component_ids')
+NET_KEYS: Tuple[str, ...] = ('n', 'net_name')
+LITERAL_KEYS: Tuple[str, ...] = ('terminal', 'bt', 'block_type', 'suggestions', 'missing_role', 'goal')  # never names
+
+# ==============================================================================
+# ### --- CANONICAL FORM --- ###
+# A netlist is a graph of components (labelled by block_type and any extra
+# fields) joined to nets through named terminals. Component ids and signal net
+# names carry no meaning, so two netlists that differ only by renaming them are
+# the same design. VDD/GND keep their names.
+# The components are ordered canonically per connected piece (pieces are joined
+# by signal nets; supplies do not join them): colours are refined from the
+# block labels and the terminal names until they stop splitting, and components
+# left with the same colour are tried first in turn (only one of a set of
+# interchangeable twins), keeping the smallest resulting form. Nets are then
+# numbered in order of first use. The form lists every component's label and
+# connections, so equal hashes always mean the same circuit. Beyond
+# MAX_CANON_LEAVES labelings of one piece the smallest form found so far is
+# kept; for such highly symmetric pieces two renamings may, rarely, hash
+# differently, which costs a cache miss but never a wrong match.
+# ==============================================================================
+
+class CanonicalNetlist:
+    """A netlist's canonical form and hash, with the labeling that maps it back to the original names."""
+    __slots__ = ('form', 'hash', 'component_ids', 'net_names')
+    def __init__(self, form: List, component_ids: List[str], net_names: List[str]):
+        self.form = form
+        self.hash = hashlib.sha256(json.dumps(form, separators=(',', ':')).encode('utf-8')).hexdigest()
+        self.component_ids = component_ids  # canonical index -> original component id
+        self.net_names = net_names  # canonical net index -> original signal net name
+
+    def to_netlist(self) -> List[Dict[str, Any]]:
+        """The design with canonical names: components c0, c1, ... and signal nets n0, n1, ..."""
+        netlist = []
+        for i, (label, connections) in enumerate(self.form):
+            component = {'id': f"c{i}", **json.loads(label), 'connections': {}}
+            for terminal, net in connections:
+                component['connections'][terminal] = f"n{net[1:]}" if net.startswith('#') else net
+            netlist.append(component)
+        return netlist
+
+def is_supply(net: str) -> bool:
+    return net.upper() in SUPPLY_NETS
+
+def _well_formed(netlist: Any) -> bool:
+    """A non-empty list of components with unique string ids and string block types and nets."""
+    if not isinstance(netlist, list) or not netlist:
+        return False
+    ids = set()
+    for c in netlist:
+        if not isinstance(c, dict) or not isinstance(c.get('id'), str) or not isinstance(c.get('block_type'), str):
+            return False
+        connections = c.get('connections')
+        if not isinstance(connections, dict) or not all(isinstance(t, str) and isinstance(n, str) for t, n in connections.items()):
+            return False
+        ids.add(c['id'])
+    return len(ids) == len(netlist)
+
+def _rank(signatures: List) -> List[int]:
+    order = {sig: k for k, sig in enumerate(sorted(set(signatures)))}
+    return [order[sig] for sig in signatures]
+
+class _Canoniser:
+    """
+    Orders the components of one netlist canonically. Signal nets are ints,
+    supplies keep their name; `ports` maps the signal nets already identified
+    canonically (by a unique colour) to a fixed token.
+    """
+    def __init__(self, labels: List[str], conns: List[List[Tuple[str, Any]]], n_nets: int):
+        self.labels, self.conns = labels, conns
+        self.net_terms: List[List[Tuple[str, int]]] = [[] for _ in range(n_nets)]
+        for i, conn in enumerate(conns):
+            for t, net in conn:
+                if isinstance(net, int):
+                    self.net_terms[net].append((t, i))
+
+    def order(self, comps: List[int], ports: Dict[int, str], depth: int = 0) -> List[int]:
+        pieces = self._pieces(comps, ports)
+        if len(pieces) > 1:
+            keyed = [(self.key(o, ports)[0], o) for o in (self.order(piece, ports, depth) for piece in pieces)]
+            keyed.sort(key=lambda item: item[0])
+            return [i for _, o in keyed for i in o]
+        colours, nets, net_colours = self._refine(comps, ports, _rank([self.labels[i] for i in comps]))
+        # Nets with a colour of their own are identified canonically; if cutting them
+        # splits the piece, each part is ordered on its own (replicated cells).
+        counts = Counter(net_colours)
+        unique = {net: f"@{depth}.{colour}" for net, colour in zip(nets, net_colours) if counts[colour] == 1}
+        if unique and len(self._pieces(comps, {**ports, **unique})) > 1:
+            return self.order(comps, {**ports, **unique}, depth + 1)
+        self._leaves = 0
+        return self._search(comps, ports, colours)[1]
+
+    def key(self, order: List[int], ports: Dict[int, str]) -> Tuple[List, List[int]]:
+        """The form of the components in `order`: signal nets are numbered '#k' in order of first use."""
+        net_index: Dict[int, int] = {}
+        form = []
+        for i in order:
+            connections = []
+            for t, net in sorted(self.conns[i]):
+                if isinstance(net, int):
+                    net = ports.get(net) or f"#{net_index.setdefault(net, len(net_index))}"
+                connections.append([t, net])
+            form.append([self.labels[i], connections])
+        return form, sorted(net_index, key=net_index.__getitem__)
+
+    def _pieces(self, comps: List[int], ports: Dict[int, str]) -> List[List[int]]:
+        """Splits `comps` into the parts joined by signal nets other than `ports`."""
+        parent = {i: i for i in comps}
+        def find(i: int) -> int:
+            while parent[i] != i:
+                parent[i] = parent[parent[i]]
+                i = parent[i]
+            return i
+        for i in comps:
+            for _, net in self.conns[i]:
+                if isinstance(net, int) and net not in ports:
+                    parent[find(i)] = find(self.net_terms[net][0][1])
+        pieces: Dict[int, List[int]] = {}
+        for i in comps:
+            pieces.setdefault(find(i), []).append(i)
+        return list(pieces.values())
+
+    def _refine(self, comps: List[int], ports: Dict[int, str], colours: List[int]) -> Tuple[List[int], List[int], List[int]]:
+        """Splits colours by neighbourhood until stable. Returns (component colours, nets, net colours)."""
+        local = {i: k for k, i in enumerate(comps)}
+        nets = sorted({net for i in comps for _, net in self.conns[i] if isinstance(net, int) and net not in ports})
+        net_pos = {net: k for k, net in enumerate(nets)}
+        net_colours = [0] * len(nets)
+        n_colours = len(set(colours))
+        while True:
+            net_colours = _rank([(net_colours[k], tuple(sorted((t, colours[local[i]]) for t, i in self.net_terms[net])))
+                                 for k, net in enumerate(nets)])
+            colours = _rank([(colours[k], tuple(sorted((t, ('N', net_colours[net_pos[net]]) if net in net_pos else
+                                                        ('P', ports[net]) if isinstance(net, int) else ('S', net))
+                                                       for t, net in self.conns[i]))) for k, i in enumerate(comps)])
+            if len(set(colours)) == n_colours:
+                return colours, nets, net_colours
+            n_colours = len(set(colours))
+
+    def _search(self, comps: List[int], ports: Dict[int, str], colours: List[int]) -> Tuple[List, List[int]]:
+        """Individualises tied components in turn; returns the smallest (form, order) found."""
+        cells: Dict[int, List[int]] = {}
+        for k, colour in enumerate(colours):
+            cells.setdefault(colour, []).append(k)
+        tied = [cells[colour] for colour in sorted(cells) if len(cells[colour]) > 1]
+        if not tied:
+            self._leaves += 1
+            order = [comps[k] for k in sorted(range(len(comps)), key=colours.__getitem__)]
+            return self.key(order, ports)[0], order
+        # Twins (same label, same connections) are interchangeable: trying one is enough.
+        twins: Dict[Tuple, int] = {}
+        for k in tied[0]:
+            twins.setdefault((self.labels[comps[k]], tuple(sorted(self.conns[comps[k]], key=str))), k)
+        best = None
+        for v in twins.values():
+            if best is not None and self._leaves >= MAX_CANON_LEAVES:
+                break
+            split = self._refine(comps, ports, [2 * c + (k != v) for k, c in enumerate(colours)])[0]
+            result = self._search(comps, ports, split)
+            if best is None or result[0] < best[0]:
+                best = result
+        return best
+
+def canonicalize(netlist: Any) -> Optional[CanonicalNetlist]:
+    """Returns the canonical form of `netlist`, or None if it is not a well-formed netlist."""
+    if not _well_formed(netlist):
+        return None
+    labels = [json.dumps({k: v for k, v in c.items() if k not in ('id', 'connections')}, sort_keys=True, default=str)
+              for c in netlist]
+    net_ids: Dict[str, int] = {}
+    conns = [[(t, net if is_supply(net) else net_ids.setdefault(net, len(net_ids))) for t, net in c['connections'].items()]
+             for c in netlist]
+    canoniser = _Canoniser(labels, conns, len(net_ids))
+    order = canoniser.order(list(range(len(netlist))), {})
+    form, nets = canoniser.key(order, {})
+    names = {v: k for k, v in net_ids.items()}
+    return CanonicalNetlist(form, [netlist[i]['id'] for i in order], [names[net] for net in nets])
+
+def canonical_hash(netlist: Any) -> Optional[str]:
+    """SHA-256 of the canonical form: equal for netlists that only differ by component ids and signal net names."""
+    canonical = canonicalize(netlist)
+    return canonical.hash if canonical else None
+
+# ==============================================================================
+# ### --- PERSISTENT VERDICT CACHE --- ###
+# Verdicts are stored in SQLite under a key made of the canonical hash, the goals
+# and a fingerprint of the Umpire: its namespace, the source of the module that
+# defines it and its block library. Editing a rule or the library therefore
+# starts a fresh set of keys instead of serving stale verdicts. Component ids and
+# net names in the findings are stored as canonical indexes ({'$c': i} and
+# {'$n': k}) and translated back on a hit, so a renamed copy of a design gets
+# findings that name its own components and nets. Verdicts whose details name a
+# component or net under a key not listed in the configuration are not cached.
+# The netlist text is also recorded under its own key with the verdict as it was
+# reported, so an exact repeat is answered without canonicalising it at all.
+# ==============================================================================
+
+_CACHE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL,
+    created REAL NOT NULL
+);
+"""
+
+class VerdictCache:
+    """Umpire verdicts by canonical design; safe to share between threads and processes."""
+    def __init__(self, db_path: str = DEFAULT_CACHE_PATH):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._memory: "OrderedDict[str, str]" = OrderedDict()
+        self.hits = self.misses = 0
+        self._connection().executescript(_CACHE_SCHEMA)
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, 'db', None)
+        if db is None:
+            db = sqlite3.connect(self.db_path, timeout=30.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+            self._local.db = db
+        return db
+
+    def get(self, key: str) -> Any:
+        """Returns the value stored under `key`, or None."""
+        with self._lock:
+            text = self._memory.get(key)
+            if text is not None:
+                self._memory.move_to_end(key)
+        if text is None:
+            row = self._connection().execute("SELECT value FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is not None:
+                text = row[0]
+                self._remember(key, text)
+        with self._lock:
+            if text is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+        return json.loads(text)
+
+    def put(self, key: str, value: Any) -> None:
+        text = json.dumps(value, separators=(',', ':'), default=str)
+        self._connection().execute("INSERT OR REPLACE INTO verdicts (key, value, created) VALUES (?, ?, ?)",
+                                   (key, text, time.time()))
+        self._remember(key, text)
+
+    def _remember(self, key: str, text: str) -> None:
+        with self._lock:
+            self._memory[key] = text
+            self._memory.move_to_end(key)
+            while len(self._memory) > MEMORY_ENTRIES:
+                self._memory.popitem(last=False)
+
+    def __len__(self) -> int:
+        return self._connection().execute("SELECT COUNT(*) FROM verdicts").fetchone()[0]
+
+    def clear(self) -> None:
+        self._connection().execute("DELETE FROM verdicts")
+        with self._lock:
+            self._memory.clear()
+
+def umpire_fingerprint(umpire: Any, namespace: Optional[str] = None) -> str:
+    """Identifies the rules and library an Umpire checks with."""
+    import inspect  # only needed here, and slow enough to import to keep off the startup path
+    namespace = namespace or f"{type(umpire).__module__}.{type(umpire).__qualname__}"
+    try:
+        source = inspect.getsource(sys.modules[type(umpire).__module__])
+        for module in getattr(umpire, 'rule_modules', ()):
+            source += inspect.getsource(sys.modules[module])
+    except (OSError, TypeError, KeyError):
+        source = ''
+    library = getattr(umpire, 'library', None) or getattr(umpire, 'l', None) or {}
+    # A BlockLibrary is identified by the hash of its file rather than serialised again
+    library = getattr(library, 'content_hash', None) or dict(library)
+    payload = json.dumps([namespace, source, library], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+class CachedUmpire:
+    """
+    Answers check() from a VerdictCache when a design with the same canonical form
+    was already checked with the same goals, and from the wrapped Umpire (Umpire,
+    IncrementalUmpire or DiagnosticUmpire) otherwise. Malformed netlists are always
+    passed through. Umpires with the same `namespace` share verdicts, e.g. an
+    Umpire and an IncrementalUmpire over the same library.
+    """
+    def __init__(self, umpire: Any, cache: Optional[VerdictCache] = None, namespace: Optional[str] = None):
+        self.umpire = umpire
+        self.cache = cache if cache is not None else VerdictCache()
+        self.fingerprint = umpire_fingerprint(umpire, namespace)
+        self.last_lookup: Optional[str] = None  # 'hit', 'miss', or None if the netlist was not cacheable
+        self.last_hash: Optional[str] = None
+        self._last_text: Optional[str] = None
+
+    def __getattr__(self, name: str) -> Any:
+        if name == 'umpire':
+            raise AttributeError(name)
+        return getattr(self.umpire, name)
+
+    def check(self, netlist: Any, goals: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        # An exact repeat is found from the netlist text alone, before canonicalising
+        self._last_text = _exact_text(netlist)
+        exact_key = self._key('exact', self._last_text, goals)
+        stored = self.cache.get(exact_key) if exact_key else None
+        if stored is not None:
+            self.last_lookup, self.last_hash = 'hit', stored['design']
+            return stored['findings']
+        canonical = canonicalize(netlist)
+        self.last_hash = canonical.hash if canonical else None
+        if canonical is None:
+            self.last_lookup = None
+            return self._check(netlist, goals)
+        key = self._key('design', canonical.hash, goals)
+        stored = self.cache.get(key)
+        if stored is not None:
+            self.last_lookup = 'hit'
+            findings = _decode(stored, canonical)
+        else:
+            self.last_lookup = 'miss'
+            findings = self._check(netlist, goals)
+            encoded = _encode(findings, canonical)
+            if encoded is not None:
+                self.cache.put(key, encoded)
+        if exact_key:
+            self.cache.put(exact_key, {'design': canonical.hash, 'findings': findings})
+        return findings
+
+    def known_hash(self, netlist: Any) -> Optional[str]:
+        """The canonical hash of `netlist` if it is the netlist checked last, else None."""
+        text = _exact_text(netlist)
+        return self.last_hash if text is not None and text == self._last_text else None
+
+    def _key(self, kind: str, text: Optional[str], goals: Optional[Dict[str, Any]]) -> Optional[str]:
+        if text is None:
+            return None
+        payload = json.dumps([self.fingerprint, kind, text, goals or {}], sort_keys=True, default=str)
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def _check(self, netlist: Any, goals: Optional[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return self.umpire.check(netlist) if goals is None else self.umpire.check(netlist, goals)
+
+def _exact_text(netlist: Any) -> Optional[str]:
+    try:
+        return json.dumps(netlist, sort_keys=True, separators=(',', ':'))
+    except (TypeError, ValueError):
+        return None
+
+def _encode(findings: List[Dict[str, Any]], canonical: CanonicalNetlist) -> Optional[List[Dict[str, Any]]]:
+    """Findings with names replaced by canonical indexes, or None if a name appears under an unknown key."""
+    components = {cid: i for i, cid in enumerate(canonical.component_ids)}
+    nets = {net: k for k, net in enumerate(canonical.net_names)}
+    encoded = []
+    for finding in findings:
+        details = {}
+        for key, value in (finding.get('details') or {}).items():
+            if key in COMPONENT_KEYS and value in components:
+                value = {'$c': components[value]}
+            elif key in COMPONENT_LIST_KEYS and isinstance(value, list) and all(v in components for v in value):
+                value = [{'$c': components[v]} for v in value]
+            elif key in NET_KEYS and value in nets:
+                value = {'$n': nets[value]}
+            elif key not in LITERAL_KEYS and ((isinstance(value, str) and (value in components or value in nets))
+                                              or not isinstance(value, (str, int, float, bool, type(None)))):
+                return None
+            details[key] = value
+        encoded.append({**finding, 'details': details} if 'details' in finding else dict(finding))
+    return encoded
+
+def _decode(findings: List[Dict[str, Any]], canonical: CanonicalNetlist) -> List[Dict[str, Any]]:
+    def name(value: Any) -> Any:
+        if isinstance(value, dict) and '$c' in value:
+            return canonical.component_ids[value['$c']]
+        if isinstance(value, dict) and '$n' in value:
+            return canonical.net_names[value['$n']]
+        return [name(v) for v in value] if isinstance(value, list) else value
+    return [{**f, 'details': {k: name(v) for k, v in f['details'].items()}} if 'details' in f else f for f in findings]
+
+# ==============================================================================
+# ### --- COMMAND LINE --- ###
+# ==============================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print canonical hashes of netlists, grouping renamed copies of the same design")
+    parser.add_argument('netlists', nargs='+', help='Netlist JSON files')
+    parser.add_argument('--show-form', action='store_true', help='Also print each design with canonical names')
+    args = parser.parse_args()
+
+    groups: Dict[str, List[str]] = {}
+    for path in args.netlists:
+        with open(path, 'r', encoding='utf-8') as f:
+            canonical = canonicalize(json.load(f))
+        if canonical is None:
+            print(f"{'(malformed)':<16} {path}")
+            continue
+        groups.setdefault(canonical.hash, []).append(path)
+        print(f"{canonical.hash[:16]} {path}")
+        if args.show_form:
+            print(json.dumps(canonical.to_netlist(), indent=2))
+    print(f"\n{sum(len(p) for p in groups.values())} netlist(s), {len(groups)} distinct design(s)")
+    for h, paths in groups.items():
+        if len(paths) > 1:
+            print(f"  - {h[:16]}: {', '.join(paths)}")
+
+if __name__ == "__main__":
+    main()
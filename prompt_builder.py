@@ -0,0 +1,129 @@
+import json
+import functools
+from typing import List, Dict, Any, Optional, Tuple
+
+@functools.lru_cache(maxsize=None)
+def _encoding() -> Any:
+    """The cl100k_base encoding, or None if tiktoken is not installed. Created by the first
+    count_tokens() call: loading tiktoken and its BPE ranks costs more than most runs spend counting."""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:  # tiktoken is optional; fall back to a character-based estimate
+        return None
+
+# ==============================================================================
+# ### --- TOKEN-BUDGETED PROMPT BUILDER --- ###
+# Every prompt starts with the same static prefix (instructions, library, example)
+# so that provider-side prefix caching can reuse it across iterations and runs.
+# Only the run-specific sections follow it: the specifications, the previous
+# netlist (extracted JSON only, never the raw response with its reasoning) and
+# the Umpire feedback.
+# ==============================================================================
+
+CHARS_PER_TOKEN: float = 3.5  # used when tiktoken is not installed
+
+STATIC_INSTRUCTIONS = (
+    "You are an expert analog circuit designer AI. You design circuits as JSON netlists built only from the block library below.\n\n"
+    "IMPORTANT: Output a JSON array (list) of components, not an object or a dictionary, enclosed in a single ```json ... ``` code block. "
+    "Each component must be a dict with the fields 'id' (unique string), 'block_type' (a library block name) and 'connections' "
+    "(terminal name -> net name). Connect supplies to the nets VDD and GND.\n\n"
+)
+
+LIBRARY_HEADER = "Block library, one block per line as `block_type [device] roles | terminal:ROLE ...  # description`:\n"
+
+EXAMPLE_OUTPUT = (
+    "Example output:\n```json\n"
+    '[\n{"id":"INPUT_STAGE","block_type":"DifferentialPairN","connections":{"v_in+":"IN+","v_in-":"IN-","i_out1":"n1","i_out2":"n2","i_in_bias":"nbias","pwr_vdd":"VDD","pwr_gnd":"GND"}},\n'
+    '{"id":"ACTIVE_LOAD","block_type":"CurrentMirrorP","connections":{"i_in_ref":"n1","i_out_load":"n2","pwr_vdd":"VDD"}}\n]\n'
+    "```\n"
+)
+
+def count_tokens(text: str) -> int:
+    """Returns the number of tokens in `text` (exact with tiktoken, estimated otherwise)."""
+    encoding = _encoding()
+    if encoding is not None:
+        return len(encoding.encode(text))
+    return int(len(text) / CHARS_PER_TOKEN + 0.5)
+
+def encode_library(library: Dict[str, Any]) -> str:
+    """Compact, deterministic one-line-per-block encoding of a block library."""
+    lines = []
+    for name in sorted(library):
+        info = library[name]
+        terminals = " ".join(f"{t}:{r}" for t, r in info.get('terminals', {}).items())
+        line = f"{name} [{info.get('device_type', '?')}] {','.join(info.get('roles', []))} | {terminals}"
+        if info.get('description'):
+            line += f"  # {info['description']}"
+        lines.append(line)
+    return "\n".join(lines) + "\n"
+
+def encode_netlist(netlist: Any) -> str:
+    """Minified JSON with one component per line."""
+    if isinstance(netlist, list):
+        return "[\n" + ",\n".join(json.dumps(c, separators=(',', ':')) for c in netlist) + "\n]"
+    return json.dumps(netlist, separators=(',', ':'))
+
+class Prompt:
+    """A built prompt: its named sections, their token counts and the final text."""
+    def __init__(self, sections: List[Tuple[str, str]], dropped: List[str]):
+        self.sections = sections
+        self.dropped = dropped
+        self.text = "".join(text for _, text in sections)
+        self.token_counts = {name: count_tokens(text) for name, text in sections}
+        self.total_tokens = count_tokens(self.text)
+
+    def report(self) -> str:
+        parts = ", ".join(f"{name}={n}" for name, n in self.token_counts.items())
+        dropped = f" (dropped to fit budget: {', '.join(self.dropped)})" if self.dropped else ""
+        return f"{self.total_tokens} tokens [{parts}]{dropped}"
+
+class PromptBuilder:
+    """
+    Builds initial and correction prompts under an optional token budget. When a
+    prompt exceeds the budget, sections are dropped or truncated in this order:
+    the example, then the feedback (truncated), then the previous netlist.
+    """
+    def __init__(self, library: Dict[str, Any], token_budget: Optional[int] = None):
+        self.token_budget = token_budget
+        self._library_section = LIBRARY_HEADER + encode_library(library) + "\n"
+
+    def _static_sections(self) -> List[Tuple[str, str]]:
+        return [('instructions', STATIC_INSTRUCTIONS), ('library', self._library_section), ('example', EXAMPLE_OUTPUT)]
+
+    def initial(self, specs: str) -> Prompt:
+        """The first prompt of a run, asking for a netlist that meets `specs`."""
+        return self._fit(self._static_sections() + [
+            ('specs', "\n--- USER SPECIFICATIONS ---\n" + specs + "\n---------------------------\n\n"),
+            ('task', "Generate the JSON netlist for these specifications now."),
+        ])
+
+    def correction(self, previous_netlist: Any, feedback: str) -> Prompt:
+        """A prompt asking to fix `previous_netlist` (parsed JSON) according to the Umpire `feedback`."""
+        return self._fit(self._static_sections() + [
+            ('previous_netlist', "\n--- PREVIOUS NETLIST ---\n```json\n" + encode_netlist(previous_netlist) + "\n```\n"),
+            ('feedback', "\n--- UMPIRE FEEDBACK (FAILED TESTS) ---\n" + feedback + "\n"),
+            ('task', "\nProvide the corrected JSON netlist that addresses all of the Umpire's feedback."),
+        ])
+
+    def _fit(self, sections: List[Tuple[str, str]]) -> Prompt:
+        prompt = Prompt(sections, [])
+        if self.token_budget is None or prompt.total_tokens <= self.token_budget:
+            return prompt
+        sections, dropped = list(sections), []
+        for name in ('example', 'feedback', 'previous_netlist'):
+            index = next((i for i, (n, _) in enumerate(sections) if n == name), None)
+            if index is None:
+                continue
+            if name == 'feedback':
+                excess = Prompt(sections, dropped).total_tokens - self.token_budget
+                text = sections[index][1]
+                keep = max(0, len(text) - int(excess * CHARS_PER_TOKEN) - 40)
+                sections[index] = (name, text[:keep] + "\n[... feedback truncated ...]\n")
+            else:
+                del sections[index]
+            dropped.append(name)
+            prompt = Prompt(sections, dropped)
+            if prompt.total_tokens <= self.token_budget:
+                break
+        return prompt
@@ -1,11 +1,23 @@
 import os
 import json
-import tkinter as tk
-from tkinter import font
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
-from typing import List, Dict, Optional
+from typing import List, Dict, Optional, Tuple
+from collections import Counter
 import subprocess
 import platform
+import threading
+import time
+import argparse
+import contact_two
+from prompt_builder import PromptBuilder, Prompt
+from artifact_store import ArtifactStore
+import telemetry
+from netlist_extractor import FenceScanner, extract_netlist, try_block
+from auto_repair import RepairEngine
+from netlist_hash import VerdictCache, CachedUmpire
+from block_library import LIBRARY, BlockLibrary, suggest_block_types
+import estimator
 
 # ==============================================================================
 # ### --- MASTER CONFIGURATION --- ###
@@ -15,6 +27,46 @@ import platform
 # The maximum number of correction loops to run before stopping.
 MAX_ITERATIONS = 4
 
+# 2. LLM SELECTION
+# If True, every iteration sends the prompt to all entries in contact_two.LLM_CONFIG
+# at once and keeps the first netlist that passes the Umpire. If False, a single
+# LLM is used per iteration and the next one is tried after a failed iteration.
+RACE_ALL_LLMS = False
+
+# 3. STREAMING
+# If True, LLM responses are streamed and the stream is closed as soon as the
+# first ```json block is complete and parses, skipping any trailing prose.
+STREAM_LLM_RESPONSES = True
+
+# 4. PROMPT BUDGET
+# Upper bound on prompt size in tokens, or None for no limit. Over-budget prompts
+# lose the example first, then feedback detail, then the previous netlist.
+PROMPT_TOKEN_BUDGET = None
+
+# 5. ARTIFACT STORE
+# SQLite database that records every run's prompts, responses, netlists, Umpire
+# findings and timings for cross-run queries (see artifact_store.py), or None.
+ARTIFACT_STORE_PATH = "artifacts.db"
+
+# 6. LOCAL AUTO-REPAIR
+# If True, Umpire findings with a single mechanical fix (F0.4 typos, K1 NMOS loads,
+# S1.2 and C1 on unbiased gain stages) are repaired locally before the check (see
+# auto_repair.py), so only the remaining errors cost an LLM iteration.
+AUTO_REPAIR = True
+
+# 7. VERDICT CACHE
+# SQLite database of Umpire verdicts keyed by canonical netlist hash (see
+# netlist_hash.py), or None. A design seen before, in this run or an earlier one
+# and under any component ids and net names, is answered by one lookup. Off by
+# default: on a miss, canonicalising costs more than the loop's incremental check.
+VERDICT_CACHE_PATH = None
+
+# 8. PERFORMANCE ESTIMATE
+# If True, an accepted design gets a first-order estimate of gain, GBW, phase
+# margin and power against the specs (see estimator.py; needs NumPy), printed
+# and saved in run_state.json. It does not change whether the design is accepted.
+ESTIMATE_PERFORMANCE = True
+
 # ==============================================================================
 # ### --- COMPONENT 1: SPECIFICATION EDITOR (GUI) --- ###
 # ==============================================================================
@@ -29,6 +81,9 @@ SPEC_FIELDS = [
 
 class SpecEditorApp:
     def __init__(self, root, output_path):
+        # tkinter is only imported when the editor is actually shown
+        import tkinter as tk
+        from tkinter import font
         self.root = root; self.output_path = output_path; self.entries = {}
         self.root.title("Analog Circuit Specification Editor"); self.root.configure(bg='#f0f0f0')
         main_frame = tk.Frame(root, padx=20, pady=20, bg='#f0f0f0'); main_frame.pack()
@@ -51,129 +106,405 @@ class SpecEditorApp:
 def run_spec_editor(output_path: str):
     """Launches the GUI and waits for the user to save the specs."""
     print("[Orchestrator] Waiting for user to input specifications via GUI...")
+    import tkinter as tk
     root = tk.Tk(); app = SpecEditorApp(root, output_path); root.mainloop()
 
 # ==============================================================================
 # ### --- COMPONENT 2: LLM REQUESTER --- ###
 # ==============================================================================
 
-def run_llm_request_with_contact_two(prompt_filepath: str, output_filepath: str, llm_index: int) -> bool:
-    """Calls contact_two.py as a subprocess to handle the LLM request."""
-    print(f"[Orchestrator] Calling contact_two.py for LLM index {llm_index}...")
+def run_llm_request(prompt_filepath: str, output_filepath: str, llm_index: int, refresh: bool = False) -> Optional[int]:
+    """
+    Sends the prompt file to the LLM through the in-process contact_two client,
+    which retries and fails over to the next configured LLM as needed.
+    `refresh` skips the cached response for this prompt (used when retrying).
+    Returns the index of the LLM that answered, or None if every one failed.
+    """
+    print(f"[Orchestrator] Requesting LLM index {llm_index}...")
     try:
-        result = subprocess.run([
-            "python3", "contact_two.py",
-            "--input", prompt_filepath,
-            "--output", output_filepath,
-            "--llm-index", str(llm_index)
-        ], capture_output=True, text=True)
-        print(result.stdout)
-        if result.returncode == 0:
-            print(f"[Orchestrator] LLM response saved to '{output_filepath}'")
-            return True
-        else:
-            print(f"[Orchestrator] contact_two.py failed with return code {result.returncode}")
-            print(result.stderr)
-            return False
+        with open(prompt_filepath, 'r', encoding='utf-8') as f:
+            prompt = f.read()
+        result = contact_two.call_llm(prompt, llm_index, refresh=refresh, **_stream_options())
+        if result.text:
+            with open(output_filepath, 'w', encoding='utf-8') as f:
+                f.write(result.text)
+            print(f"[Orchestrator] LLM response from LLM index {result.llm_index} saved to '{output_filepath}'")
+            return result.llm_index
+        print(f"[Orchestrator] LLM request failed for every LLM ({result.error.kind if result.error else 'no response'}).")
+        return None
     except Exception as e:
-        print(f"[Orchestrator] Failed to call contact_two.py: {e}")
+        print(f"[Orchestrator] Failed to request the LLM: {e}")
+        return None
+
+def race_llm_requests(prompt_filepath: str, output_filepath: str, refresh: bool = False) -> Optional[Tuple[int, Optional[List[Dict]]]]:
+    """
+    Sends the prompt to every configured LLM at once. Each response is parsed and
+    checked by the Umpire as soon as it arrives; the first passing netlist wins and
+    the requests still in flight are abandoned. If none passes, the parsed netlist
+    with the fewest Umpire errors is kept. The chosen response is copied to
+    `output_filepath` and every raw response is kept next to it as `*_llm<index>.txt`.
+    Returns (llm_index, netlist), with netlist None if no response could be parsed,
+    or None if every LLM request failed.
+    """
+    with open(prompt_filepath, 'r', encoding='utf-8') as f:
+        prompt = f.read()
+    print(f"[Orchestrator] Racing {len(contact_two.LLM_CONFIG)} LLMs...")
+    umpire_instance = cached_umpire(Umpire(COMPREHENSIVE_LIBRARY))
+    base, ext = os.path.splitext(output_filepath)
+    best = None  # (error count, llm_index, netlist, response file)
+    any_response = False
+
+    race_over = threading.Event()
+    executor = ThreadPoolExecutor(max_workers=len(contact_two.LLM_CONFIG))
+    try:
+        futures = {executor.submit(telemetry.bind(contact_two.request_llm), prompt, idx, failover=False, hedge=False, refresh=refresh, cancel_event=race_over, **_stream_options()): idx for idx in range(len(contact_two.LLM_CONFIG))}
+        for future in as_completed(futures):
+            idx = futures[future]
+            response = future.result()
+            if not response:
+                print(f"[Orchestrator] LLM index {idx} returned no response.")
+                continue
+            any_response = True
+            response_file = f"{base}_llm{idx}{ext}"
+            with open(response_file, 'w', encoding='utf-8') as f:
+                f.write(response)
+            netlist = parse_llm_output_to_json(response_file)
+            if netlist is None:
+                continue
+            # Errors that are repaired locally do not count against a response
+            errs = auto_repair_netlist(netlist, umpire_instance)[1] if AUTO_REPAIR else umpire_instance.check(netlist)
+            print(f"[Orchestrator] LLM index {idx} answered with {len(errs)} Umpire error(s).")
+            if best is None or len(errs) < best[0]:
+                best = (len(errs), idx, netlist, response_file)
+            if not errs:
+                print(f"[Orchestrator] LLM index {idx} won the race.")
+                break
+    finally:
+        # Requests that have not started are cancelled and streams in flight are
+        # closed at their next chunk; non-streamed requests finish in the
+        # background and their results are discarded.
+        race_over.set()
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    if best is None:
+        return (0, None) if any_response else None
+    _, idx, netlist, response_file = best
+    with open(response_file, 'r', encoding='utf-8') as f_src, open(output_filepath, 'w', encoding='utf-8') as f_dst:
+        f_dst.write(f_src.read())
+    return idx, netlist
+
+class IncrementalJsonBlockParser:
+    """
+    Streaming counterpart of parse_llm_output_to_json: fed the response text piece
+    by piece, it reports True from `feed` once a fenced block outside <think> has
+    closed and holds a netlist. The netlist is kept in `netlist`.
+    """
+    def __init__(self):
+        self.buffer = ""
+        self.netlist = None
+        self._scanner = FenceScanner()
+
+    def feed(self, text: str) -> bool:
+        if self.netlist is not None:
+            return True
+        self.buffer += text
+        for block in self._scanner.feed(self.buffer):
+            if block.in_think:
+                continue
+            result = try_block(block)
+            if result is not None and result.valid:
+                self.netlist = result.netlist
+                return True
         return False
 
+def _stream_options() -> Dict:
+    """Request options for contact_two: stream and stop at the first complete JSON block."""
+    if not STREAM_LLM_RESPONSES:
+        return {}
+    return {'stream': True, 'stop_when_factory': lambda: IncrementalJsonBlockParser().feed, 'stop_key': 'stack.json_block'}
+
 def parse_llm_output_to_json(llm_output_filepath: str) -> Optional[List[Dict]]:
-    """Parses the LLM's text output, extracting the first JSON code block."""
+    """
+    Parses the LLM's text output and returns the netlist it contains, recovering
+    from the usual formatting slips (see netlist_extractor) instead of retrying.
+    """
     print(f"[Orchestrator] Parsing JSON netlist from '{llm_output_filepath}'...")
-    try:
-        with open(llm_output_filepath, 'r', encoding='utf-8') as f:
-            content = f.read()
-        
-        # Find the start and end of the first JSON code block
-        json_start = content.find("```json")
-        if json_start == -1:
-            print("  > ERROR: No JSON code block (```json) found in the LLM response.")
-            return None
-        
-        json_end = content.find("```", json_start + 7)
-        if json_end == -1:
-            print("  > ERROR: Found start of JSON block but no end (```).")
+    with telemetry.span('json_parse') as span:
+        try:
+            with open(llm_output_filepath, 'r', encoding='utf-8') as f:
+                content = f.read()
+        except FileNotFoundError:
+            print(f"  > ERROR: LLM output file not found.")
+            span['status'] = 'invalid'
             return None
-            
-        json_str = content[json_start + 7 : json_end].strip()
-        return json.loads(json_str)
-
-    except FileNotFoundError:
-        print(f"  > ERROR: LLM output file not found.")
-        return None
-    except json.JSONDecodeError as e:
-        print(f"  > ERROR: Failed to parse JSON. The format is invalid: {e}")
-        return None
-    except Exception as e:
-        print(f"  > ERROR: An unexpected error occurred during parsing: {e}")
-        return None
+        result = extract_netlist(content)
+        span.update(status='ok' if result.netlist is not None else 'invalid', method=result.method)
+        if result.netlist is None:
+            print("  > ERROR: No parseable JSON netlist found in the LLM response.")
+        elif result.recovered:
+            print(f"  > Netlist recovered via '{result.method}'.")
+        return result.netlist
 
 # ==============================================================================
 # ### --- COMPONENT 3: UMPIRE (VALIDATOR) --- ###
 # (A condensed version of the umpire_final_system.py)
 # ==============================================================================
 
-# The Umpire's knowledge base and classes are nested here for a single-file script.
-COMPREHENSIVE_LIBRARY = {'DifferentialPairN': {'description': 'Standard NMOS Differential Pair Gain Stage.', 'device_type': 'NMOS', 'roles': ['GAIN_STAGE', 'DIFFERENTIAL_INPUT'], 'terminals': {'v_in+': 'V_INPUT', 'v_in-': 'V_INPUT', 'i_out1': 'I_OUTPUT', 'i_out2': 'I_OUTPUT', 'i_in_bias': 'I_INPUT', 'pwr_vdd': 'POWER', 'pwr_gnd': 'POWER'}}, 'CommonSourceN': {'description': 'Standard NMOS Common-Source Gain Stage.', 'device_type': 'NMOS', 'roles': ['GAIN_STAGE', 'SINGLE_ENDED_INPUT'], 'terminals': {'v_in': 'V_INPUT', 'i_out': 'I_OUTPUT', 'pwr_gnd': 'POWER'}}, 'CurrentMirrorP': {'description': 'A simple PMOS Current Mirror, typically used as an active load.', 'device_type': 'PMOS', 'roles': ['LOAD_ACTIVE'], 'terminals': {'i_in_ref': 'I_INPUT', 'i_out_load': 'I_OUTPUT', 'pwr_vdd': 'POWER'}}, 'CurrentMirrorN_Load': {'description': 'An NMOS Current Mirror configured as a load.', 'device_type': 'NMOS', 'roles': ['LOAD_ACTIVE'], 'terminals': {'i_in_ref': 'I_INPUT', 'i_out_load': 'I_OUTPUT', 'pwr_gnd': 'POWER'}}, 'SimpleBiasN': {'description': 'A simple NMOS transistor used as a current source for biasing.', 'device_type': 'NMOS', 'roles': ['BIAS_SOURCE'], 'terminals': {'i_out_bias': 'I_OUTPUT', 'pwr_gnd': 'POWER'}}}
+# The Umpire classes are nested here for a single-file script; the blocks are shared with umpire.py.
+COMPREHENSIVE_LIBRARY = LIBRARY  # block_library.json, read on first use (see block_library.py)
+class CompiledBlock:
+    """Per-block_type lookup table: everything the rules need, computed once per library."""
+    __slots__ = ('roles', 'device_type', 'output_terminals', 'is_nmos', 'is_non_pmos_load')
+    def __init__(self, info):
+        self.roles = frozenset(info.get('roles', []))
+        self.device_type = info.get('device_type')
+        self.output_terminals = tuple(t for t, r in info.get('terminals', {}).items() if r == 'I_OUTPUT')
+        self.is_nmos = self.device_type == 'NMOS'
+        self.is_non_pmos_load = 'LOAD_ACTIVE' in self.roles and self.device_type != 'PMOS'
+
+_UNKNOWN_BLOCK = CompiledBlock({})
+
+_COMPILED_LIBRARIES = {}
+
+def compile_library(library):
+    """
+    Compiles a block library into {block_type: CompiledBlock}. A BlockLibrary is
+    compiled once per content hash, so constructing an Umpire stays cheap.
+    """
+    if isinstance(library, BlockLibrary):
+        compiled = _COMPILED_LIBRARIES.get(library.content_hash)
+        if compiled is None:
+            compiled = _COMPILED_LIBRARIES[library.content_hash] = {name: CompiledBlock(info) for name, info in library.items()}
+        return compiled
+    return {name: CompiledBlock(info) for name, info in library.items()}
+
 class UmpireCircuit:
-    def __init__(self, netlist, library):
-        self.netlist = netlist
+    """
+    Indexed circuit built once per check. Net names are interned to integer ids,
+    every net keeps the (component_id, terminal) pairs attached to it, and
+    components are indexed by role, so rules never rescan the whole netlist.
+    """
+    __slots__ = ('library', 'blocks', 'components', 'comp_blocks', 'by_role', 'role_counts',
+                 'net_ids', 'net_names', 'net_terms', 'net_is_supply')
+    def __init__(self, netlist, library, blocks=None):
         self.library = library
+        self.blocks = blocks if blocks is not None else compile_library(library)
         self.components = {c['id']: c for c in netlist}
-        self.net_map = self._build_net_map()
-    def _build_net_map(self):
-        nm = {}
-        [nm.setdefault(net, []).append({'component_id': c['id'], 'terminal': t}) for c in self.netlist for t, net in c.get('connections', {}).items()]
-        return nm
+        self.comp_blocks, self.by_role, self.role_counts = {}, {}, Counter()
+        self.net_ids, self.net_names, self.net_terms, self.net_is_supply = {}, [], [], bytearray()
+        self._build_net_map(netlist)
+    def _build_net_map(self, netlist):
+        net_ids, terms, intern = self.net_ids, self.net_terms, self._intern
+        for c in netlist:
+            cid = c['id']
+            for t, net in c.get('connections', {}).items():
+                nid = net_ids.get(net)
+                if nid is None: nid = intern(net)
+                terms[nid].append((cid, t))
+        blocks, comp_blocks, by_role = self.blocks, self.comp_blocks, self.by_role
+        for cid, c in self.components.items():
+            block = comp_blocks[cid] = blocks.get(c['block_type'], _UNKNOWN_BLOCK)
+            for r in block.roles:
+                by_role.setdefault(r, {})[cid] = None
+        self.role_counts.update({r: len(ids) for r, ids in by_role.items()})
+    def _intern(self, net):
+        nid = self.net_ids.get(net)
+        if nid is None:
+            nid = self.net_ids[net] = len(self.net_names)
+            self.net_names.append(net)
+            self.net_terms.append([])
+            self.net_is_supply.append(isinstance(net, str) and net.upper() in ('VDD', 'GND'))
+        return nid
+    def _index(self, cid, c):
+        block = self.comp_blocks[cid] = self.blocks.get(c['block_type'], _UNKNOWN_BLOCK)
+        for r in block.roles:
+            self.by_role.setdefault(r, {})[cid] = None
+        self.role_counts.update(block.roles)
+    @property
+    def netlist(self):
+        return list(self.components.values())
+    @property
+    def net_map(self):
+        """The net -> [{'component_id', 'terminal'}] view of the circuit."""
+        return {self.net_names[nid]: [{'component_id': cid, 'terminal': t} for cid, t in terms] for nid, terms in enumerate(self.net_terms) if terms}
     def get_info(self, cid):
         return self.library.get(self.components[cid]['block_type'], {})
     def get_comp_by_role(self, role):
-        return [c for c in self.netlist if role in self.get_info(c['id']).get('roles', [])]
+        return [self.components[cid] for cid in self.by_role.get(role, ())]
+    def apply_diff(self, diff):
+        """
+        Applies a component diff (see diff_netlists) in place, updating the net
+        index and role indexes. Returns the ids of the nets whose connections changed.
+        """
+        affected = set()
+        for cid in list(diff.get('removed', [])) + [c['id'] for c in diff.get('changed', [])]:
+            affected.update(self._detach(cid))
+        for c in list(diff.get('changed', [])) + list(diff.get('added', [])):
+            affected.update(self._attach(c))
+        return affected
+    def _detach(self, cid):
+        c = self.components.pop(cid)
+        block = self.comp_blocks.pop(cid)
+        for r in block.roles:
+            del self.by_role[r][cid]
+        self.role_counts.subtract(block.roles)
+        self.role_counts += Counter()  # drop roles that reached zero
+        nids = {self.net_ids[net] for net in c.get('connections', {}).values()}
+        for nid in nids:
+            self.net_terms[nid] = [term for term in self.net_terms[nid] if term[0] != cid]
+        return nids
+    def _attach(self, c):
+        cid = c['id']
+        self.components[cid] = c
+        self._index(cid, c)
+        nids = set()
+        for t, net in c.get('connections', {}).items():
+            nid = self._intern(net)
+            self.net_terms[nid].append((cid, t))
+            nids.add(nid)
+        return nids
+
+def diff_netlists(old_netlist, new_netlist):
+    """Returns the component diff {'added': [...], 'removed': [ids], 'changed': [...]} from old to new."""
+    return _diff_components({c['id']: c for c in old_netlist}, new_netlist)
+
+def _diff_components(old_by_id, new_netlist):
+    new_ids = set()
+    added, changed = [], []
+    for c in new_netlist:
+        new_ids.add(c['id'])
+        old = old_by_id.get(c['id'])
+        if old is None: added.append(c)
+        elif old != c: changed.append(c)
+    return {'added': added, 'removed': [cid for cid in old_by_id if cid not in new_ids], 'changed': changed}
+
 class Umpire:
-    def __init__(self, l): self.l, self.r = l, [self._r_c1, self._r_k1, self._r_s1]
+    def __init__(self, l): self.l, self.blocks, self.r = l, compile_library(l), [self._r_c1, self._r_k1, self._r_s1]
     def check(self, n):
+        f_err = self._format(n)
+        if f_err: return f_err
+        s_err = self._sanity(n)
+        if s_err: return s_err
+        c = UmpireCircuit(n, self.l, self.blocks); errs = []; [errs.extend(rule(c)) for rule in self.r]; return sorted(errs, key=lambda x: x['level'])
+    def _format(self, n):
         # Format check: must be a list of dicts with 'id', 'block_type', 'connections'
         if not isinstance(n, list):
             return [{'level': 'FATAL', 'rule_id': 'FORMAT', 'details': {'msg': 'Netlist must be a list of components (not a dict with a top-level key).'}}]
         for c in n:
             if not isinstance(c, dict) or 'id' not in c or 'block_type' not in c or 'connections' not in c:
                 return [{'level': 'FATAL', 'rule_id': 'FORMAT', 'details': {'msg': 'Each component must be a dict with id, block_type, and connections.'}}]
-        s_err = self._sanity(n)
-        if s_err: return s_err
-        c = UmpireCircuit(n, self.l); errs = []; [errs.extend(rule(c)) for rule in self.r]; return sorted(errs, key=lambda x: x['level'])
+        return []
     def _sanity(self, n):
         if not n or not isinstance(n, list): return [{'level': 'FATAL', 'rule_id': 'F0.1'}]
         for c in n:
             if 'id' not in c or 'block_type' not in c: return [{'level': 'FATAL', 'rule_id': 'F0.3', 'details': {'c': c}}]
-            if c['block_type'] not in self.l: return [{'level': 'FATAL', 'rule_id': 'F0.4', 'details': {'cid': c['id'], 'bt': c['block_type']}}]
+            if c['block_type'] not in self.blocks: return [{'level': 'FATAL', 'rule_id': 'F0.4', 'details': {'cid': c['id'], 'bt': c['block_type'], 'suggestions': suggest_block_types(self.l, c['block_type'])}}]
         return []
     def _r_c1(self, c):
-        return [{'level': 'ERROR', 'rule_id': 'C1', 'details': {'n': n, 'cid': s[0]['component_id']}} for n, s in c.net_map.items() if n.upper() not in ['VDD', 'GND'] and len(s) < 2]
+        return [e for nid in range(len(c.net_terms)) for e in self._c1_net(c, nid)]
+    def _c1_net(self, c, nid):
+        terms = c.net_terms[nid]
+        if len(terms) == 1 and not c.net_is_supply[nid]:
+            return [{'level': 'ERROR', 'rule_id': 'C1', 'details': {'n': c.net_names[nid], 'cid': terms[0][0]}}]
+        return []
     def _r_k1(self, c):
+        return [e for sid in c.by_role.get('GAIN_STAGE', ()) for e in self._k1_stage(c, sid)]
+    def _k1_stage(self, c, sid):
+        block = c.comp_blocks[sid]
+        if not block.is_nmos:
+            return []
         errs = []
-        for s in c.get_comp_by_role('GAIN_STAGE'):
-            if c.get_info(s['id'])['device_type'] == 'NMOS':
-                for net in {s['connections'].get(t) for t, r in c.get_info(s['id'])['terminals'].items() if r == 'I_OUTPUT'}:
-                    if net:
-                        for conn in c.net_map.get(net, []):
-                            if conn['component_id'] != s['id'] and 'LOAD_ACTIVE' in c.get_info(conn['component_id'])['roles'] and c.get_info(conn['component_id'])['device_type'] != 'PMOS':
-                                errs.append({'level': 'ERROR', 'rule_id': 'K1', 'details': {'sid': s['id'], 'lid': conn['component_id']}})
+        connections, comp_blocks, net_ids = c.components[sid]['connections'], c.comp_blocks, c.net_ids
+        for net in {connections.get(t) for t in block.output_terminals}:
+            if net:
+                for cid, _ in c.net_terms[net_ids[net]]:
+                    if cid != sid and comp_blocks[cid].is_non_pmos_load:
+                        errs.append({'level': 'ERROR', 'rule_id': 'K1', 'details': {'sid': sid, 'lid': cid}})
         return errs
     def _r_s1(self, c):
         errs = []
-        roles = {r for co in c.netlist for r in c.get_info(co['id'])['roles']}
-        if 'GAIN_STAGE' in roles:
-            if 'LOAD_ACTIVE' not in roles:
+        roles = c.role_counts
+        if roles['GAIN_STAGE'] > 0:
+            if roles['LOAD_ACTIVE'] <= 0:
                 errs.append({'level': 'ERROR', 'rule_id': 'S1.1'})
-            if 'BIAS_SOURCE' not in roles:
+            if roles['BIAS_SOURCE'] <= 0:
                 errs.append({'level': 'WARNING', 'rule_id': 'S1.2'})
         return errs
+class IncrementalUmpire(Umpire):
+    """
+    An Umpire that remembers the circuit it last checked. A new netlist is diffed
+    against it, the net index is updated in place and only the rule checks whose
+    inputs changed are rerun: C1 on the affected nets, K1 on the gain stages that
+    changed or touch an affected net, and S1 when the set of roles changed.
+    Reports the same errors as Umpire.check; only their order within a level may differ.
+    """
+    def __init__(self, l):
+        super().__init__(l)
+        self.reset()
+    def reset(self):
+        self.circuit, self._c1_errs, self._k1_errs, self._s1_errs = None, {}, {}, []
+    def check(self, n):
+        f_err = self._format(n) or self._sanity(n)
+        if f_err or len({c['id'] for c in n}) != len(n):
+            # Invalid or ambiguous (duplicate ids) netlists are never used as a baseline.
+            self.reset()
+            return f_err or super().check(n)
+        if self.circuit is None:
+            return self._full_check(n)
+        return self.check_diff(_diff_components(self.circuit.components, n))
+    def check_diff(self, diff):
+        """Validates the previously checked circuit with `diff` applied (see diff_netlists)."""
+        if self.circuit is None:
+            raise ValueError("check_diff needs a previously checked circuit; call check() first.")
+        touched = [_snapshot(c) for c in list(diff.get('added', [])) + list(diff.get('changed', []))]
+        f_err = self._format(touched) or (self._sanity(touched) if touched else [])
+        if f_err:
+            self.reset()
+            return f_err
+        c = self.circuit
+        roles_before = set(c.role_counts)
+        n_added = len(diff.get('added', []))
+        affected = c.apply_diff({'added': touched[:n_added], 'changed': touched[n_added:], 'removed': diff.get('removed', [])})
+        if not c.components:
+            self.reset()
+            return self._sanity([])
+        for nid in affected:
+            self._store(self._c1_errs, nid, self._c1_net(c, nid))
+        for cid in list(diff.get('removed', [])) + [t['id'] for t in touched]:
+            self._k1_errs.pop(cid, None)
+        gain_stages = c.by_role.get('GAIN_STAGE', {})
+        stage_ids = {t['id'] for t in touched} | {cid for nid in affected for cid, _ in c.net_terms[nid]}
+        for sid in stage_ids:
+            if sid in gain_stages:
+                self._store(self._k1_errs, sid, self._k1_stage(c, sid))
+        if set(c.role_counts) != roles_before:
+            self._s1_errs = self._r_s1(c)
+        return self._collect()
+    def _full_check(self, n):
+        c = self.circuit = UmpireCircuit([_snapshot(x) for x in n], self.l, self.blocks)
+        self._c1_errs, self._k1_errs = {}, {}
+        for nid in range(len(c.net_terms)):
+            self._store(self._c1_errs, nid, self._c1_net(c, nid))
+        for sid in c.by_role.get('GAIN_STAGE', ()):
+            self._store(self._k1_errs, sid, self._k1_stage(c, sid))
+        self._s1_errs = self._r_s1(c)
+        return self._collect()
+    @staticmethod
+    def _store(results, key, errs):
+        if errs: results[key] = errs
+        else: results.pop(key, None)
+    def _collect(self):
+        errs = [e for es in self._c1_errs.values() for e in es] + [e for es in self._k1_errs.values() for e in es] + list(self._s1_errs)
+        return sorted(errs, key=lambda x: x['level'])
+
+def _snapshot(c):
+    """Copies a component so later edits to the caller's netlist cannot leak into stored state."""
+    return {**c, 'connections': dict(c['connections'])} if isinstance(c, dict) and isinstance(c.get('connections'), dict) else c
 class UmpireFeedback:
     def __init__(self, u): self.u, self.f = u, {'F0.4': self._f0_4, 'C1': self._c1, 'K1': self._k1, 'S1.1': self._s1_1, 'S1.2': self._s1_2, 'FORMAT': self._format}
     def generate(self, n, file, goals={}):
-        errs = self.u.check(n)
+        return self.write(self.u.check(n), file)
+    def write(self, errs, file):
         with open(file, 'w') as f:
             if not errs:
                 f.write("## Umpire Feedback: PASS\n\nNo errors found.\n")
@@ -183,207 +514,412 @@ class UmpireFeedback:
                 formatter = self.f.get(e['rule_id'], lambda d: f"### Uncategorized Error\n- **Details**: `{d}`\n\n---\n")
                 f.write(formatter(e.get('details', {})))
         return True
-    def _f0_4(self, d): return f"### FATAL: Unknown Block (F0.4)\n- **Problem**: Block `{d.get('cid')}` uses unknown type `{d.get('bt')}`.\n- **Fix**: Use a known `block_type`.\n---\n"
+    def _f0_4(self, d): return f"### FATAL: Unknown Block (F0.4)\n- **Problem**: Block `{d.get('cid')}` uses unknown type `{d.get('bt')}`.\n- **Fix**: {'Did you mean ' + ' or '.join(f'`{n}`' for n in d['suggestions']) + '?' if d.get('suggestions') else 'Use a known `block_type`.'}\n---\n"
     def _c1(self, d): return f"### ERROR: Floating Net (C1)\n- **Problem**: Net `{d.get('n')}` on component `{d.get('cid')}` is floating.\n- **Fix**: Connect this net to another component terminal.\n---\n"
     def _k1(self, d): return f"### ERROR: NMOS/PMOS Mismatch (K1)\n- **Problem**: NMOS stage `{d.get('sid')}` is loaded by non-PMOS load `{d.get('lid')}`.\n- **Fix**: Change load `{d.get('lid')}` to a PMOS type (e.g., `CurrentMirrorP`).\n---\n"
     def _s1_1(self, d): return f"### ERROR: Missing Load (S1.1)\n- **Problem**: Gain stage exists but no `LOAD_ACTIVE` component found.\n- **Fix**: Add a load (e.g., `CurrentMirrorP`) to the gain stage output.\n---\n"
     def _s1_2(self, d): return f"### WARNING: Missing Bias (S1.2)\n- **Problem**: No `BIAS_SOURCE` component found.\n- **Fix**: Add a bias source (e.g., `SimpleBiasN`) to the gain stage bias input.\n---\n"
     def _format(self, d): return f"### FATAL: Netlist Format Error\n- **Problem**: {d.get('msg','Format error.')}\n- **Fix**: Output a list of components, each with id, block_type, and connections.\n---\n"
 
-def run_umpire_check(netlist_filepath: str, feedback_filepath: str) -> bool:
-    """Reads a JSON netlist, runs the Umpire, saves feedback, and returns if errors were found."""
+_VERDICT_CACHE: Optional[VerdictCache] = None
+_VERDICT_CACHE_LOCK = threading.Lock()
+
+def cached_umpire(umpire_instance: Umpire):
+    """Puts the shared verdict cache for VERDICT_CACHE_PATH in front of `umpire_instance`, if caching is on."""
+    global _VERDICT_CACHE
+    with _VERDICT_CACHE_LOCK:
+        if VERDICT_CACHE_PATH is None:
+            return umpire_instance
+        if _VERDICT_CACHE is None or _VERDICT_CACHE.db_path != VERDICT_CACHE_PATH:
+            _VERDICT_CACHE = VerdictCache(VERDICT_CACHE_PATH)
+    # Umpire and IncrementalUmpire report the same findings, so they share verdicts
+    return CachedUmpire(umpire_instance, _VERDICT_CACHE, namespace='stack.Umpire')
+
+def cached_hash(umpire_instance: Umpire, netlist: List[Dict]) -> Optional[str]:
+    """The canonical hash the verdict cache computed for `netlist`, if it was the last netlist checked."""
+    return umpire_instance.known_hash(netlist) if isinstance(umpire_instance, CachedUmpire) else None
+
+def auto_repair_netlist(netlist: List[Dict], umpire_instance: Optional[Umpire] = None,
+                        findings: Optional[List[Dict]] = None) -> Tuple[List[Dict], List[Dict], List[Dict]]:
+    """
+    Applies the local Umpire fixes. Returns (netlist, remaining findings, repairs applied).
+    Pass the `findings` of the check just run on `netlist` and the Umpire that ran it;
+    the netlist is only checked again once a repair has been applied.
+    """
+    engine = RepairEngine(COMPREHENSIVE_LIBRARY, umpire_instance or cached_umpire(Umpire(COMPREHENSIVE_LIBRARY)))
+    with telemetry.span('auto_repair', components=len(netlist) if isinstance(netlist, list) else None) as span:
+        repaired, findings, repairs = engine.repair(netlist, findings)
+        span.update(repairs=len(repairs), rules=sorted({r['rule_id'] for r in repairs}), findings=len(findings))
+    return repaired, findings, repairs
+
+def run_umpire_check(netlist_filepath: str, feedback_filepath: str, umpire_instance: Optional[Umpire] = None) -> bool:
+    """
+    Reads a JSON netlist, runs the Umpire, saves feedback, and returns if errors were found.
+    Pass the same IncrementalUmpire across iterations to only revalidate what changed.
+    """
+    return bool(run_umpire_findings(netlist_filepath, feedback_filepath, umpire_instance))
+
+def umpire_findings(netlist: List[Dict], umpire_instance: Umpire) -> List[Dict]:
+    """Runs `umpire_instance` on a parsed netlist and returns its findings (empty when the netlist passes)."""
+    with telemetry.span('umpire_check', components=len(netlist) if isinstance(netlist, list) else None) as span:
+        findings = umpire_instance.check(netlist)
+        span['findings'] = len(findings)
+        if getattr(umpire_instance, 'last_lookup', None):
+            span['verdict_cache'] = umpire_instance.last_lookup
+    if getattr(umpire_instance, 'last_lookup', None) == 'hit':
+        print(f"[Orchestrator] Known design {umpire_instance.last_hash[:12]}: verdict reused from the cache.")
+    return findings
+
+def run_umpire_findings(netlist_filepath: str, feedback_filepath: str, umpire_instance: Optional[Umpire] = None,
+                        findings: Optional[List[Dict]] = None) -> List[Dict]:
+    """
+    Like run_umpire_check, but returns the Umpire's findings (empty when the netlist passes).
+    Pass `findings` if the netlist was just checked; only the feedback is written then.
+    """
     print(f"[Orchestrator] Running Umpire on '{netlist_filepath}'...")
-    umpire_instance = Umpire(COMPREHENSIVE_LIBRARY)
+    umpire_instance = umpire_instance or Umpire(COMPREHENSIVE_LIBRARY)
     feedback_generator = UmpireFeedback(umpire_instance)
     try:
-        with open(netlist_filepath, 'r') as f:
-            netlist = json.load(f)
-        has_errors = feedback_generator.generate(netlist, feedback_filepath)
-        print(f"[Orchestrator] Umpire feedback saved to '{feedback_filepath}'. Errors found: {has_errors}")
-        return has_errors
+        if findings is None:
+            with open(netlist_filepath, 'r') as f:
+                findings = umpire_findings(json.load(f), umpire_instance)
+        with telemetry.span('feedback_write'):
+            feedback_generator.write(findings, feedback_filepath)
+        print(f"[Orchestrator] Umpire feedback saved to '{feedback_filepath}'. Errors found: {bool(findings)}")
+        return findings
     except Exception as e:
         print(f"  > ERROR: Umpire check failed: {e}")
-        return True # Treat any exception as a failure
+        return [{'level': 'FATAL', 'rule_id': 'EXCEPTION', 'details': {'msg': str(e)}}] # Treat any exception as a failure
+
+def estimate_performance(netlist: List[Dict], specs: str) -> Optional[Dict]:
+    """The estimator's ranking record for an accepted netlist against `specs`, or None if it cannot be estimated."""
+    try:
+        with telemetry.span('performance_estimate', components=len(netlist)) as span:
+            record = estimator.rank_candidates([('final', netlist)], estimator.parse_specs(specs), COMPREHENSIVE_LIBRARY)[0]
+            span['passed'] = record['passed']
+    except ImportError as e:
+        print(f"[Orchestrator] No performance estimate: {e}")
+        return None
+    e = record['estimate']
+    if 'error' in e:
+        print(f"[Orchestrator] No performance estimate: {e['error']}")
+        return None
+    print(f"[Orchestrator] Estimated performance (first-order): gain {e['gain_db']:.1f} dB, GBW {e['gbw_hz'] / 1e6:.1f} MHz, "
+          f"phase margin {e['phase_margin_deg']:.0f} deg, power {e['power_w'] * 1e3:.3f} mW")
+    for target in record['misses']:
+        margin = record['margins'].get(target)
+        print(f"  > Misses '{target}'" + (f" by {-margin:.1f} dB" if margin is not None else ""))
+    return record
 
 # ==============================================================================
-# ### --- MAIN ORCHESTRATOR LOGIC --- ###
+# ### --- COMPONENT 4: PROMPT CONSTRUCTION --- ###
 # ==============================================================================
 
-def main():
-    # --- Setup ---
-    run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    run_dir = f"run_{run_timestamp}"
-    os.makedirs(run_dir, exist_ok=True)
-    print("="*70)
-    print(f"Starting Orchestration Run: {run_timestamp}")
-    print(f"All files will be saved in directory: '{run_dir}'")
-    print("="*70)
+_PROMPT_BUILDER: Optional[PromptBuilder] = None
 
-    # --- Step 1: Get user specifications ---
-    spec_filepath = os.path.join(run_dir, "analog_specs_initial.txt")
-    run_spec_editor(spec_filepath)
-    
-    # --- Step 2: Create the initial prompt for the LLM ---
-    initial_prompt_filepath = os.path.join(run_dir, "prompt_v0.md")
+def get_prompt_builder() -> PromptBuilder:
+    """Returns the shared prompt builder; its static prefix is encoded once per process."""
+    global _PROMPT_BUILDER
+    if _PROMPT_BUILDER is None or _PROMPT_BUILDER.token_budget != PROMPT_TOKEN_BUDGET:
+        _PROMPT_BUILDER = PromptBuilder(COMPREHENSIVE_LIBRARY, PROMPT_TOKEN_BUDGET)
+    return _PROMPT_BUILDER
+
+def build_initial_prompt(specs: str) -> str:
+    """Returns the first prompt of a run, asking for a netlist that meets `specs`."""
+    return get_prompt_builder().initial(specs).text
+
+def build_correction_prompt(previous_netlist: List[Dict], feedback: str) -> str:
+    """Returns the prompt asking the LLM to fix `previous_netlist` according to the Umpire `feedback`."""
+    return get_prompt_builder().correction(previous_netlist, feedback).text
+
+_ARTIFACT_STORE: Optional[ArtifactStore] = None
+_ARTIFACT_STORE_LOCK = threading.Lock()
+
+def get_artifact_store() -> Optional[ArtifactStore]:
+    """Returns the shared artifact store for ARTIFACT_STORE_PATH, or None if recording is off."""
+    global _ARTIFACT_STORE
+    with _ARTIFACT_STORE_LOCK:
+        if ARTIFACT_STORE_PATH is None:
+            return None
+        if _ARTIFACT_STORE is None or _ARTIFACT_STORE.db_path != ARTIFACT_STORE_PATH:
+            _ARTIFACT_STORE = ArtifactStore(ARTIFACT_STORE_PATH)
+        return _ARTIFACT_STORE
+
+def write_prompt(prompt: Prompt, prompt_filepath: str) -> None:
+    """Writes a built prompt and reports its token counts per section."""
+    with open(prompt_filepath, 'w') as f_prompt:
+        f_prompt.write(prompt.text)
+    print(f"[Orchestrator] Prompt '{os.path.basename(prompt_filepath)}': {prompt.report()}")
+
+# ==============================================================================
+# ### --- COMPONENT 5: RUN STATE (CHECKPOINTS) --- ###
+# The loop records its progress in run_state.json after every completed step, so
+# an interrupted run can continue where it stopped instead of starting over and
+# paying for LLM calls again. Steps within an iteration, in order:
+#   'prompt_ready'   -> the prompt for `iteration` is written, no usable response yet
+#   'response_saved' -> llm_response_v{n}.txt holds a response that parses
+#   'netlist_saved'  -> netlist_v{n}.json is written
+#   'checked'        -> umpire_feedback_v{n}.md is written (`has_errors` is set)
+# File names are stored relative to the run directory.
+# ==============================================================================
+
+RUN_STATE_FILE = "run_state.json"
+_STEPS = ['prompt_ready', 'response_saved', 'netlist_saved', 'checked']
+
+def load_run_state(run_dir: str) -> Optional[Dict]:
+    """Returns the run-state manifest of `run_dir`, or None if it has none."""
     try:
-        with open(spec_filepath, 'r') as f_spec:
-            specs = f_spec.read()
-        with open(initial_prompt_filepath, 'w') as f_prompt:
-            f_prompt.write("You are an expert analog circuit designer AI. Your task is to generate a valid JSON netlist based on the following user specifications.\n\n")
-            f_prompt.write("IMPORTANT: Output a JSON array (list) of components, not an object or a dictionary. Each component must be a dict with the following fields: 'id', 'block_type', and 'connections'.\n")
-            f_prompt.write("- 'id': a unique string identifier for the component.\n")
-            f_prompt.write("- 'block_type': the type of the component (e.g., 'DifferentialPairN', 'CurrentMirrorP', etc.).\n")
-            f_prompt.write("- 'connections': a dictionary mapping terminal names to net names.\n\n")
-            f_prompt.write("Below is the library of allowed components and their terminal names. Use only these block types and terminal names in your netlist.\n\n")
-            f_prompt.write("```json\n" + json.dumps(COMPREHENSIVE_LIBRARY, indent=2) + "\n```")
-            f_prompt.write("\n\nExample output:\n")
-            f_prompt.write("""```json
-[
-  {
-    "id": "INPUT_STAGE",
-    "block_type": "DifferentialPairN",
-    "connections": {
-      "v_in+": "IN+",
-      "v_in-": "IN-",
-      "i_out1": "n1",
-      "i_out2": "n2",
-      "i_in_bias": "nbias",
-      "pwr_vdd": "VDD",
-      "pwr_gnd": "GND"
-    }
-  },
-  {
-    "id": "ACTIVE_LOAD",
-    "block_type": "CurrentMirrorP",
-    "connections": {
-      "i_in_ref": "n1",
-      "i_out_load": "n2",
-      "pwr_vdd": "VDD"
-    }
-  }
-]
-```
-""")
-            f_prompt.write("\n\n--- USER SPECIFICATIONS ---\n")
-            f_prompt.write(specs)
-            f_prompt.write("\n\n---------------------------\n\n")
-            f_prompt.write("Please generate the JSON netlist now, following the example format exactly.")
-        print(f"[Orchestrator] Initial prompt created at '{initial_prompt_filepath}'")
-    except Exception as e:
-        print(f"FATAL ERROR: Could not create initial prompt. {e}")
-        return
+        with open(os.path.join(run_dir, RUN_STATE_FILE), 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+def save_run_state(run_dir: str, state: Dict) -> None:
+    """Writes the manifest atomically, so a crash never leaves it half written."""
+    state['updated'] = datetime.now().isoformat(timespec='seconds')
+    path = os.path.join(run_dir, RUN_STATE_FILE)
+    with open(path + ".tmp", 'w') as f:
+        json.dump(state, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+def _step_done(state: Dict, step: str) -> bool:
+    return _STEPS.index(state['step']) >= _STEPS.index(step)
+
+# ==============================================================================
+# ### --- MAIN ORCHESTRATOR LOGIC --- ###
+# ==============================================================================
+
+def run_design_loop(specs: str, run_dir: str, resume: bool = False) -> Dict:
+    """
+    Runs the generate -> validate -> correct loop for `specs`, writing every
+    artifact into `run_dir`. Needs no GUI, so many loops can run side by side.
+    With `resume`, a run_state.json left in `run_dir` by an interrupted run is
+    continued from its first unfinished step.
+    Returns a summary: status ('success', 'failed', 'parse_failure', 'llm_failure'
+    or 'prompt_failure'), iterations used, netlist paths and elapsed seconds.
+    """
+    with telemetry.context(run_dir=run_dir), telemetry.span('design_loop') as span:
+        try:
+            result = _run_design_loop(specs, run_dir, resume)
+            span.update(status=result['status'], iterations=result['iterations'])
+            return result
+        finally:
+            telemetry.flush()
+
+def _run_design_loop(specs: str, run_dir: str, resume: bool) -> Dict:
+    start_time = time.perf_counter()
+    state = load_run_state(run_dir) if resume else None
+    store = get_artifact_store()
+    run_id = store.start_run(run_dir, specs) if store else None
+    def path(name: Optional[str]) -> Optional[str]:
+        return os.path.join(run_dir, name) if name else None
+    def finish(status: Optional[str] = None) -> Dict:
+        if status:
+            state['status'] = status
+        save_run_state(run_dir, state)
+        if store:
+            store.finish_run(run_id, state['status'], state['iteration'], time.perf_counter() - start_time)
+        return {'run_dir': run_dir, 'status': state['status'], 'iterations': state['iteration'],
+                'final_netlist': path(state['final_netlist']), 'last_netlist': path(state['last_netlist']),
+                'elapsed_s': time.perf_counter() - start_time}
+
+    # A run stopped by an API failure lost no work, so it can be resumed like an interrupted one.
+    if state is not None and state['status'] not in ('running', 'llm_failure'):
+        print(f"[Orchestrator] Run in '{run_dir}' already finished with status '{state['status']}'.")
+        return finish()
+    if state is not None:
+        state['status'] = 'running'
+        print(f"[Orchestrator] Resuming '{run_dir}' at iteration {state['iteration']} (step '{state['step']}', "
+              f"LLM index {state['llm_index']}, retry {state['retry_count']}).")
+    else:
+        # --- Step 2: Create the initial prompt for the LLM ---
+        state = {'status': 'running', 'iteration': 1, 'step': 'prompt_ready', 'llm_index': 0, 'retry_count': 0,
+                 'current_prompt': "prompt_v0.md", 'has_errors': None, 'final_netlist': None, 'last_netlist': None}
+        initial_prompt_filepath = path(state['current_prompt'])
+        try:
+            with telemetry.span('prompt_build', kind='initial') as span:
+                prompt = get_prompt_builder().initial(specs)
+                write_prompt(prompt, initial_prompt_filepath)
+                span['prompt_size_tokens'] = prompt.total_tokens
+            print(f"[Orchestrator] Initial prompt created at '{initial_prompt_filepath}'")
+            if store:
+                store.record_prompt(run_id, 1, prompt.text, prompt.total_tokens)
+        except Exception as e:
+            print(f"FATAL ERROR: Could not create initial prompt. {e}")
+            state['iteration'] = 0
+            return finish('prompt_failure')
+        save_run_state(run_dir, state)
 
     # --- Step 3: The Main Correction Loop ---
-    current_prompt_file = initial_prompt_filepath
-    final_netlist_path = None
-    last_generated_netlist = None
-    success = False
-    llm_index = 0
     MAX_RETRIES = 3
+    # Successive netlists usually differ by a few components, so only the delta is revalidated.
+    umpire_instance = cached_umpire(IncrementalUmpire(COMPREHENSIVE_LIBRARY))
 
-    for i in range(MAX_ITERATIONS):
-        iteration = i + 1
+    for iteration in range(state['iteration'], MAX_ITERATIONS + 1):
+        telemetry.update_context(iteration=iteration)
         print("\n" + "-"*70)
         print(f"Starting Iteration {iteration}/{MAX_ITERATIONS}")
         print("-"*70)
+        llm_output_file = path(f"llm_response_v{iteration}.txt")
+        current_netlist_file = path(f"netlist_v{iteration}.json")
+        feedback_file = path(f"umpire_feedback_v{iteration}.md")
 
-        # 3a: Call the LLM with the current prompt using contact_two.py
-        llm_output_file = os.path.join(run_dir, f"llm_response_v{iteration}.txt")
-        retry_count = 0
-        parsed_netlist = None
-        while retry_count < MAX_RETRIES:
-            if not run_llm_request_with_contact_two(current_prompt_file, llm_output_file, llm_index):
-                print("Loop stopped due to LLM API failure.")
-                return
-            # 3b: Parse the LLM's response to get a JSON netlist
+        if not _step_done(state, 'response_saved'):
+            # 3a: Call the LLM with the current prompt using the contact_two client
+            current_prompt_file = path(state['current_prompt'])
+            parsed_netlist = None
+            llm_start = time.perf_counter()
+            while state['retry_count'] < MAX_RETRIES:
+                # A retry must not be answered with the same cached, unparseable response
+                refresh = state['retry_count'] > 0
+                if RACE_ALL_LLMS:
+                    # 3a+3b: Race every LLM; parsing and checking happen as responses arrive
+                    race_result = race_llm_requests(current_prompt_file, llm_output_file, refresh=refresh)
+                    if race_result is None:
+                        print("Loop stopped due to LLM API failure.")
+                        return finish('llm_failure')
+                    state['llm_index'], parsed_netlist = race_result
+                else:
+                    answered_by = run_llm_request(current_prompt_file, llm_output_file, state['llm_index'], refresh=refresh)
+                    if answered_by is None:
+                        print("Loop stopped due to LLM API failure.")
+                        return finish('llm_failure')
+                    state['llm_index'] = answered_by
+                    # 3b: Parse the LLM's response to get a JSON netlist
+                    parsed_netlist = parse_llm_output_to_json(llm_output_file)
+                if parsed_netlist is not None:
+                    break
+                else:
+                    state['retry_count'] += 1
+                    save_run_state(run_dir, state)
+                    print(f"[Orchestrator] Invalid JSON from LLM. Retrying ({state['retry_count']}/{MAX_RETRIES})...")
+            if parsed_netlist is None:
+                print("Loop stopped due to repeated failure in parsing LLM output.")
+                return finish('parse_failure')
+            state['step'] = 'response_saved'
+            save_run_state(run_dir, state)
+            if store:
+                with open(llm_output_file, 'r') as f:
+                    store.record_response(run_id, iteration, contact_two.LLM_CONFIG[state['llm_index']]['model_identifier'],
+                                          f.read(), state['retry_count'] + 1, time.perf_counter() - llm_start)
+        elif not _step_done(state, 'netlist_saved'):
+            print(f"[Orchestrator] Reusing saved response '{llm_output_file}'")
             parsed_netlist = parse_llm_output_to_json(llm_output_file)
-            if parsed_netlist is not None:
-                break
-            else:
-                retry_count += 1
-                print(f"[Orchestrator] Invalid JSON from LLM. Retrying ({retry_count}/{MAX_RETRIES})...")
-        if parsed_netlist is None:
-            print("Loop stopped due to repeated failure in parsing LLM output.")
-            break
-        
-        # 3c: Save the valid JSON netlist
-        current_netlist_file = os.path.join(run_dir, f"netlist_v{iteration}.json")
-        with open(current_netlist_file, 'w') as f:
-            json.dump(parsed_netlist, f, indent=2)
-        print(f"[Orchestrator] Valid netlist saved to '{current_netlist_file}'")
-        last_generated_netlist = current_netlist_file
+        else:
+            with open(current_netlist_file, 'r') as f:
+                parsed_netlist = json.load(f)
+
+        # 3c: Repair what can be fixed locally, then save the valid JSON netlist
+        findings, check_seconds = None, 0.0
+        if not _step_done(state, 'netlist_saved'):
+            if AUTO_REPAIR:
+                umpire_start = time.perf_counter()
+                findings = umpire_findings(parsed_netlist, umpire_instance)
+                repaired_netlist, findings, repairs = auto_repair_netlist(parsed_netlist, umpire_instance, findings)
+                check_seconds = time.perf_counter() - umpire_start
+                if repairs:
+                    print(f"[Orchestrator] Auto-repaired {len(repairs)} finding(s) locally:")
+                    for r in repairs:
+                        print(f"  > [{r['rule_id']}] {r['component_id']}: {r['action']}")
+                    # The LLM's own netlist is kept next to the log of what was changed
+                    with open(path(f"repairs_v{iteration}.json"), 'w') as f:
+                        json.dump({'repairs': repairs, 'original_netlist': parsed_netlist}, f, indent=2)
+                    parsed_netlist = repaired_netlist
+            with open(current_netlist_file, 'w') as f:
+                json.dump(parsed_netlist, f, indent=2)
+            print(f"[Orchestrator] Valid netlist saved to '{current_netlist_file}'")
+            state.update(step='netlist_saved', last_netlist=os.path.basename(current_netlist_file))
+            save_run_state(run_dir, state)
 
         # 3d: Run the Umpire check
-        feedback_file = os.path.join(run_dir, f"umpire_feedback_v{iteration}.md")
-        has_errors = run_umpire_check(current_netlist_file, feedback_file)
-        
+        if not _step_done(state, 'checked'):
+            # The findings of the auto-repair step are reused: the saved netlist is the one they describe
+            umpire_start = time.perf_counter()
+            findings = run_umpire_findings(current_netlist_file, feedback_file, umpire_instance, findings)
+            state.update(step='checked', has_errors=bool(findings))
+            save_run_state(run_dir, state)
+            if store:
+                with open(feedback_file, 'r') as f:
+                    store.record_check(run_id, iteration, parsed_netlist, findings, f.read(),
+                                       check_seconds + time.perf_counter() - umpire_start,
+                                       design_hash=cached_hash(umpire_instance, parsed_netlist))
+
         # 3e: Check for success condition
-        if not has_errors:
+        if not state['has_errors']:
             print("\n" + "="*70)
             print("SUCCESS: Umpire validation passed! The design is valid.")
             print("="*70)
-            final_netlist_path = current_netlist_file
-            success = True
+            state['final_netlist'] = os.path.basename(current_netlist_file)
+            if ESTIMATE_PERFORMANCE:
+                state['estimate'] = estimate_performance(parsed_netlist, specs)
+            return finish('success')
+        if iteration == MAX_ITERATIONS:
             break
-        
+
         # 3f: Prepare for the next loop
-        # Alternate the LLM index (mod 2)
-        llm_index = (llm_index + 1) % 2
-
-        # Construct the next prompt: combine previous LLM output and umpire feedback
-        next_prompt_file = os.path.join(run_dir, f"prompt_v{iteration}.md")
-        with open(llm_output_file, 'r') as f_llm, open(feedback_file, 'r') as f_umpire, open(next_prompt_file, 'w') as f_next_prompt:
-            f_next_prompt.write("You are an expert analog circuit designer AI.\n")
-            f_next_prompt.write("IMPORTANT: Output a JSON array (list) of components, not an object or a dictionary. Each component must be a dict with the following fields: 'id', 'block_type', and 'connections'.\n")
-            f_next_prompt.write("- 'id': a unique string identifier for the component.\n")
-            f_next_prompt.write("- 'block_type': the type of the component (e.g., 'DifferentialPairN', 'CurrentMirrorP', etc.).\n")
-            f_next_prompt.write("- 'connections': a dictionary mapping terminal names to net names.\n\n")
-            f_next_prompt.write("Below is the library of allowed components and their terminal names. Use only these block types and terminal names in your netlist.\n\n")
-            f_next_prompt.write("```json\n" + json.dumps(COMPREHENSIVE_LIBRARY, indent=2) + "\n```")
-            f_next_prompt.write("\n\nExample output:\n")
-            f_next_prompt.write("""```json
-[
-  {
-    "id": "INPUT_STAGE",
-    "block_type": "DifferentialPairN",
-    "connections": {
-      "v_in+": "IN+",
-      "v_in-": "IN-",
-      "i_out1": "n1",
-      "i_out2": "n2",
-      "i_in_bias": "nbias",
-      "pwr_vdd": "VDD",
-      "pwr_gnd": "GND"
-    }
-  },
-  {
-    "id": "ACTIVE_LOAD",
-    "block_type": "CurrentMirrorP",
-    "connections": {
-      "i_in_ref": "n1",
-      "i_out_load": "n2",
-      "pwr_vdd": "VDD"
-    }
-  }
-]
-```
-""")
-            f_next_prompt.write("\n\nBelow is the previous design output and the Umpire's feedback.\n")
-            f_next_prompt.write("Your task is to correct the JSON netlist according to the Umpire's feedback.\n\n")
-            f_next_prompt.write("--- PREVIOUS LLM OUTPUT ---\n")
-            f_next_prompt.write(f_llm.read())
-            f_next_prompt.write("\n\n--- UMPIRE FEEDBACK (FAILED TESTS) ---\n")
-            f_next_prompt.write(f_umpire.read())
-            f_next_prompt.write("\n\nPlease provide a corrected JSON netlist, enclosed in a single ```json ... ``` code block, that addresses all the Umpire's feedback and follows the example format exactly.")
-        current_prompt_file = next_prompt_file
-    
+        # Move on to the next configured LLM
+        llm_index = (state['llm_index'] + 1) % len(contact_two.LLM_CONFIG)
+
+        # Construct the next prompt: the previous netlist (not the raw response) and umpire feedback
+        next_prompt_file = path(f"prompt_v{iteration}.md")
+        with telemetry.span('prompt_build', kind='correction') as span:
+            with open(feedback_file, 'r') as f_umpire:
+                prompt = get_prompt_builder().correction(parsed_netlist, f_umpire.read())
+            write_prompt(prompt, next_prompt_file)
+            span['prompt_size_tokens'] = prompt.total_tokens
+        if store:
+            store.record_prompt(run_id, iteration + 1, prompt.text, prompt.total_tokens)
+        state.update(iteration=iteration + 1, step='prompt_ready', llm_index=llm_index, retry_count=0,
+                     current_prompt=os.path.basename(next_prompt_file), has_errors=None)
+        save_run_state(run_dir, state)
+
+    return finish('failed')
+
+def main():
+    parser = argparse.ArgumentParser(description="LLM-driven analog topology generator")
+    parser.add_argument('--resume', type=str, metavar='RUN_DIR', default=None,
+                        help='Continue an interrupted run from its run_state.json instead of starting a new one')
+    args = parser.parse_args()
+
+    # --- Setup ---
+    if args.resume:
+        run_dir = args.resume
+        print("="*70)
+        print(f"Resuming Orchestration Run in directory: '{run_dir}'")
+        print("="*70)
+    else:
+        run_timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+        run_dir = f"run_{run_timestamp}"
+        os.makedirs(run_dir, exist_ok=True)
+        print("="*70)
+        print(f"Starting Orchestration Run: {run_timestamp}")
+        print(f"All files will be saved in directory: '{run_dir}'")
+        print("="*70)
+
+    # --- Step 1: Get user specifications ---
+    spec_filepath = os.path.join(run_dir, "analog_specs_initial.txt")
+    if not args.resume:
+        run_spec_editor(spec_filepath)
+    try:
+        with telemetry.span('spec_loading', run_dir=run_dir), open(spec_filepath, 'r') as f_spec:
+            specs = f_spec.read()
+    except Exception as e:
+        print(f"FATAL ERROR: Could not read the specifications. {e}")
+        return
+
+    # --- Steps 2-3: Initial prompt and the correction loop ---
+    result = run_design_loop(specs, run_dir, resume=bool(args.resume))
+    if result['status'] in ('llm_failure', 'prompt_failure'):
+        return
+    success = result['status'] == 'success'
+
     # --- Step 4: Final Summary ---
     if not success:
         print("\n" + "="*70)
         print(f"PROCESS FAILED: The loop completed {MAX_ITERATIONS} iterations without a valid design.")
         print("="*70)
     
-    file_to_open = final_netlist_path if success else last_generated_netlist
+    file_to_open = result['final_netlist'] if success else result['last_netlist']
     
     if file_to_open:
         if success:
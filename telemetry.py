@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import threading
+from contextlib import contextmanager
+from typing import Dict, Any, Optional, Callable, Iterator, Tuple
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+TELEMETRY_ENABLED: bool = True
+# Every finished span is appended to this file as one JSON line.
+JSONL_PATH: Optional[str] = "telemetry.jsonl"
+# Aggregated metrics in the Prometheus text format (for the node_exporter textfile
+# collector). '{pid}' is replaced by the process id; use it when several processes
+# run from the same directory, since each one rewrites its file on flush().
+PROM_PATH: Optional[str] = "telemetry.prom"
+HISTOGRAM_BUCKETS: Tuple[float, ...] = (0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+# USD per million (prompt, completion) tokens, by model identifier. Models not
+# listed are not costed.
+MODEL_PRICES_USD_PER_MTOK: Dict[str, Tuple[float, float]] = {
+    "tngtech/deepseek-r1t2-chimera:free": (0.0, 0.0),
+    # "qwen/qwen3-32b": (0.10, 0.30),
+}
+
+# ==============================================================================
+# ### --- SPANS --- ###
+# A span times one stage of the loop ('prompt_build', 'llm_call', 'json_parse',
+# ...). Its record carries the attributes of the enclosing context() blocks
+# (e.g. run_dir and iteration), which are kept per thread.
+# ==============================================================================
+
+_local = threading.local()
+_lock = threading.Lock()
+
+def current_context() -> Dict[str, Any]:
+    return getattr(_local, 'context', {})
+
+@contextmanager
+def context(**attrs: Any) -> Iterator[None]:
+    """Adds `attrs` to every span recorded by this thread inside the block."""
+    previous = current_context()
+    _local.context = {**previous, **attrs}
+    try:
+        yield
+    finally:
+        _local.context = previous
+
+def update_context(**attrs: Any) -> None:
+    """Sets `attrs` for the rest of the enclosing context() block (e.g. the current iteration)."""
+    _local.context = {**current_context(), **attrs}
+
+def bind(fn: Callable) -> Callable:
+    """Wraps `fn` so it runs with the caller's context, e.g. when submitted to a thread pool."""
+    captured = current_context()
+    def run(*args, **kwargs):
+        previous = current_context()
+        _local.context = captured
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            _local.context = previous
+    return run
+
+@contextmanager
+def span(stage: str, **attrs: Any) -> Iterator[Dict[str, Any]]:
+    """
+    Times the block as `stage`. The yielded dict holds the span's attributes, so
+    the block can add what it learns (model, token counts, status...).
+    """
+    record = {**current_context(), **attrs}
+    start = time.perf_counter()
+    try:
+        yield record
+    except BaseException as e:
+        record.setdefault('status', 'error')
+        record.setdefault('error', f"{type(e).__name__}: {e}"[:200])
+        raise
+    finally:
+        record.setdefault('status', 'ok')
+        emit(stage, time.perf_counter() - start, record)
+
+def emit(stage: str, duration_s: float, attrs: Dict[str, Any]) -> None:
+    """Records a finished span: appends it to JSONL_PATH and updates the metrics."""
+    if not TELEMETRY_ENABLED:
+        return
+    record = {'ts': time.time(), 'span': stage, 'duration_s': round(duration_s, 6), 'pid': os.getpid(), **attrs}
+    line = json.dumps(record, default=str) + "\n"
+    with _lock:
+        if JSONL_PATH:
+            with open(JSONL_PATH, 'a', encoding='utf-8') as f:
+                f.write(line)
+        _METRICS.observe(stage, duration_s, record)
+
+# ==============================================================================
+# ### --- METRICS AND PROMETHEUS EXPORT --- ###
+# ==============================================================================
+
+class _Metrics:
+    """Per-process aggregates of the recorded spans (callers hold _lock)."""
+    def __init__(self):
+        self.histograms: Dict[Tuple[str, str], list] = {}  # (stage, model) -> [bucket counts..., sum, count]
+        self.spans: Dict[Tuple[str, str, str], int] = {}   # (stage, model, status) -> count
+        self.tokens: Dict[Tuple[str, str], int] = {}       # (model, 'prompt'|'completion') -> tokens
+        self.cost: Dict[str, float] = {}                   # model -> USD
+
+    def observe(self, stage: str, duration_s: float, record: Dict[str, Any]) -> None:
+        model = str(record.get('model', ''))
+        h = self.histograms.setdefault((stage, model), [0] * (len(HISTOGRAM_BUCKETS) + 2))
+        for i, bound in enumerate(HISTOGRAM_BUCKETS):
+            if duration_s <= bound:
+                h[i] += 1
+        h[-2] += duration_s
+        h[-1] += 1
+        key = (stage, model, str(record.get('status', 'ok')))
+        self.spans[key] = self.spans.get(key, 0) + 1
+        prompt_tokens, completion_tokens = record.get('prompt_tokens'), record.get('completion_tokens')
+        if prompt_tokens or completion_tokens:
+            for kind, n in (('prompt', prompt_tokens or 0), ('completion', completion_tokens or 0)):
+                self.tokens[(model, kind)] = self.tokens.get((model, kind), 0) + n
+            if model in MODEL_PRICES_USD_PER_MTOK:
+                price_in, price_out = MODEL_PRICES_USD_PER_MTOK[model]
+                cost = ((prompt_tokens or 0) * price_in + (completion_tokens or 0) * price_out) / 1e6
+                self.cost[model] = self.cost.get(model, 0.0) + cost
+
+    def render(self) -> str:
+        def labels(**kv: str) -> str:
+            return "{" + ",".join(f'{k}="{v}"' for k, v in kv.items() if v != '' or k == 'stage') + "}"
+        lines = ["# HELP stack_stage_seconds Wall time per orchestration stage.", "# TYPE stack_stage_seconds histogram"]
+        for (stage, model), h in sorted(self.histograms.items()):
+            for bound, n in zip(HISTOGRAM_BUCKETS, h):
+                lines.append(f"stack_stage_seconds_bucket{labels(stage=stage, model=model, le=str(bound))} {n}")
+            lines.append(f"stack_stage_seconds_bucket{labels(stage=stage, model=model, le='+Inf')} {h[-1]}")
+            lines.append(f"stack_stage_seconds_sum{labels(stage=stage, model=model)} {h[-2]:.6f}")
+            lines.append(f"stack_stage_seconds_count{labels(stage=stage, model=model)} {h[-1]}")
+        lines += ["# HELP stack_spans_total Finished spans by stage and status.", "# TYPE stack_spans_total counter"]
+        for (stage, model, status), n in sorted(self.spans.items()):
+            lines.append(f"stack_spans_total{labels(stage=stage, model=model, status=status)} {n}")
+        lines += ["# HELP stack_llm_tokens_total Tokens reported in completion usage.", "# TYPE stack_llm_tokens_total counter"]
+        for (model, kind), n in sorted(self.tokens.items()):
+            lines.append(f"stack_llm_tokens_total{labels(model=model, type=kind)} {n}")
+        lines += ["# HELP stack_llm_cost_usd_total Estimated spend from MODEL_PRICES_USD_PER_MTOK.", "# TYPE stack_llm_cost_usd_total counter"]
+        for model, cost in sorted(self.cost.items()):
+            lines.append(f"stack_llm_cost_usd_total{labels(model=model)} {cost:.6f}")
+        return "\n".join(lines) + "\n"
+
+_METRICS = _Metrics()
+
+def flush() -> Optional[str]:
+    """Rewrites the Prometheus file with this process's metrics. Returns its path."""
+    if not (TELEMETRY_ENABLED and PROM_PATH):
+        return None
+    path = PROM_PATH.format(pid=os.getpid())
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    try:
+        with _lock:
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                f.write(_METRICS.render())
+            os.replace(tmp_path, path)
+    except OSError as e:
+        # Telemetry must never fail the loop it observes.
+        print(f"  > Could not write metrics to '{path}': {e}")
+        return None
+    return path
@@ -0,0 +1,37 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from artifact_store import ArtifactStore
+
+def _bias(cid: str, net: str):
+    return [{'id': cid, 'block_type': 'SimpleBiasN', 'connections': {'i_out_bias': net, 'pwr_gnd': 'GND'}}]
+
+def test_export_writes_the_netlist_each_run_produced(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts.db"))
+    first, second = _bias('A', 'n1'), _bias('BIAS_GEN', 'float')
+    for run_dir, netlist in (("run_1", first), ("run_2", second)):
+        run_id = store.start_run(str(tmp_path / run_dir), "specs")
+        store.record_check(run_id, 1, netlist, [], f"Net {netlist[0]['connections']['i_out_bias']}", 0.0)
+    assert len(store.design_counts()) == 1
+
+    dest = store.export_run(str(tmp_path / "run_2"), str(tmp_path / "export"))
+    with open(os.path.join(dest, "netlist_v1.json"), encoding='utf-8') as f:
+        assert json.load(f) == second
+
+def test_renamed_and_reordered_copy_is_rebuilt_exactly(tmp_path):
+    store = ArtifactStore(str(tmp_path / "artifacts.db"))
+    first = [{'id': 'DP', 'block_type': 'DifferentialPairN', 'connections': {'v_in+': 'INP', 'v_in-': 'INN', 'i_out1': 'a', 'i_out2': 'OUT', 'i_in_bias': 'tail', 'pwr_vdd': 'VDD', 'pwr_gnd': 'GND'}},
+             {'id': 'LD', 'block_type': 'CurrentMirrorP', 'connections': {'i_in_ref': 'a', 'i_out_load': 'OUT', 'pwr_vdd': 'VDD'}},
+             {'id': 'B', 'block_type': 'SimpleBiasN', 'connections': {'i_out_bias': 'tail', 'pwr_gnd': 'GND'}}]
+    names = {'INP': 'x', 'INN': 'y', 'a': 'm', 'OUT': 'o', 'tail': 't'}
+    second = [{'id': c['id'].lower(), 'block_type': c['block_type'],
+               'connections': {t: names.get(n, n) for t, n in c['connections'].items()}} for c in reversed(first)]
+    run_id = store.start_run(str(tmp_path / "run"), "specs")
+    store.record_check(run_id, 1, first, [], "", 0.0)
+    store.record_check(run_id, 2, second, [], "", 0.0)
+    iterations = store.get_run(str(tmp_path / "run"))['iterations_data']
+    assert [json.loads(it['netlist']) for it in iterations] == [first, second]
+    assert store.find_design(second)['occurrences'] == 2
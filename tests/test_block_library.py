@@ -0,0 +1,29 @@
+import os
+import sys
+import json
+import pickle
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import block_library
+
+class _Payload:
+    def __init__(self, path):
+        self.path = path
+    def __reduce__(self):
+        return (open, (self.path, 'w'))
+
+def test_stored_index_is_plain_data(tmp_path):
+    library = tmp_path / "lib.json"
+    library.write_text(json.dumps({'Bias': {'roles': ['BIAS_SOURCE'], 'terminals': {'out': 'I_OUTPUT'}}}))
+    index = block_library.load_index(str(library))
+    stored = block_library._index_path(str(library), index.content_hash)
+    assert os.path.exists(stored)
+    again = block_library.load_index(str(library))
+    assert again.blocks == index.blocks and again.suggest('Bas') == ['Bias']
+
+    # A pickle planted where the index is read is never unpickled
+    with open(stored, 'wb') as f:
+        pickle.dump(_Payload(str(tmp_path / "pwned")), f)
+    assert block_library.load_index(str(library)).blocks == index.blocks
+    assert not (tmp_path / "pwned").exists()
@@ -0,0 +1,62 @@
+import os
+import sys
+import threading
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import contact_two
+import telemetry
+import mock_llm_server
+
+@pytest.fixture
+def mock_api(tmp_path, monkeypatch):
+    """A mock server answering every request with the 'think_fences' response (a netlist, then trailing prose)."""
+    behaviour = mock_llm_server.MockBehaviour(script=['think_fences'])
+    server = mock_llm_server.make_server(behaviour, port=0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    monkeypatch.setattr(contact_two, 'OPENROUTER_API_BASE', f"http://127.0.0.1:{server.server_address[1]}/v1")
+    monkeypatch.setattr(contact_two, 'CACHE_DIR', str(tmp_path / "llm_cache"))
+    monkeypatch.setattr(contact_two, 'CACHE_ENABLED', True)
+    monkeypatch.setattr(telemetry, 'TELEMETRY_ENABLED', False)
+    yield behaviour
+    server.shutdown()
+    server.server_close()
+
+def _stop_after_first_fence():
+    seen = []
+    def stop_when(delta: str) -> bool:
+        seen.append(delta)
+        return "Trailing" in "".join(seen)
+    return stop_when
+
+def test_early_stopped_stream_is_not_cached(mock_api):
+    full = mock_llm_server.SCENARIOS['think_fences']
+    cut = contact_two.get_llm_response("key", "mock-model", "prompt", stream=True, stop_when=_stop_after_first_fence())
+    assert len(cut) < len(full)
+
+    answer = contact_two.get_llm_response("key", "mock-model", "prompt")
+    assert answer == full
+    assert mock_api._count == 2  # the second call went to the server
+
+def test_complete_stream_is_cached(mock_api):
+    full = mock_llm_server.SCENARIOS['think_fences']
+    assert contact_two.get_llm_response("key", "mock-model", "prompt", stream=True) == full
+    assert contact_two.get_llm_response("key", "mock-model", "prompt") == full
+    assert mock_api._count == 1
+
+def test_early_stopped_stream_answers_the_same_stop_mode_only(mock_api):
+    full = mock_llm_server.SCENARIOS['think_fences']
+    def ask(**options):
+        return contact_two.get_llm_response("key", "mock-model", "prompt", stream=True,
+                                            stop_when=_stop_after_first_fence(), **options)
+    cut = ask(stop_key='first_fence')
+    assert len(cut) < len(full)
+    assert ask(stop_key='first_fence') == cut
+    assert mock_api._count == 1
+
+    assert ask(stop_key='other') == cut  # another stop mode goes to the server
+    assert contact_two.get_llm_response("key", "mock-model", "prompt") == full
+    assert mock_api._count == 3
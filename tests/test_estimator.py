@@ -0,0 +1,29 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_library import LIBRARY, validate_library
+import estimator
+
+AMPLIFIER = [{'id': 'DP', 'block_type': 'DifferentialPairN', 'connections': {'v_in+': 'INP', 'v_in-': 'INN', 'i_out1': 'a', 'i_out2': 'OUT', 'i_in_bias': 'tail', 'pwr_vdd': 'VDD', 'pwr_gnd': 'GND'}},
+             {'id': 'LD', 'block_type': 'CurrentMirrorP', 'connections': {'i_in_ref': 'a', 'i_out_load': 'OUT', 'pwr_vdd': 'VDD'}},
+             {'id': 'B', 'block_type': 'SimpleBiasN', 'connections': {'i_out_bias': 'tail', 'pwr_gnd': 'GND'}}]
+
+def test_models_come_from_the_library():
+    pytest.importorskip('numpy')
+    library = LIBRARY.to_dict()
+    baseline = estimator.estimate_netlist(AMPLIFIER, library)
+    assert 'error' not in baseline
+    library['SimpleBiasN'] = dict(library['SimpleBiasN'], small_signal=dict(library['SimpleBiasN']['small_signal'], i_supply=200e-6))
+    assert estimator.estimate_netlist(AMPLIFIER, library)['power_w'] == pytest.approx(2 * baseline['power_w'])
+    library['CurrentMirrorP'] = {k: v for k, v in library['CurrentMirrorP'].items() if k != 'small_signal'}
+    assert 'no small-signal model' in estimator.estimate_netlist(AMPLIFIER, library)['error']
+
+def test_malformed_small_signal_model_is_rejected():
+    library = LIBRARY.to_dict()
+    library['SimpleBiasN'] = dict(library['SimpleBiasN'], small_signal={'g': [['i_out_bias', 'v_in', 1e-5]], 'c': {}, 'i_supply': 0.0})
+    with pytest.raises(ValueError, match="SimpleBiasN"):
+        validate_library(library)
@@ -0,0 +1,23 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from llm_cache import ResponseCache, make_cache_key
+
+def test_entry_written_by_another_process_is_served(tmp_path):
+    reader = ResponseCache(str(tmp_path), max_bytes=1024 * 1024)
+    key = make_cache_key("model", "prompt")
+    assert reader.get(key) is None  # the index is built here, before the entry exists
+
+    ResponseCache(str(tmp_path), max_bytes=1024 * 1024).put(key, "response")
+    assert reader.get(key) == "response"
+    assert reader._total_bytes == len("response")
+
+def test_entry_evicted_by_another_process_is_a_miss(tmp_path):
+    key = make_cache_key("model", "prompt")
+    reader = ResponseCache(str(tmp_path), max_bytes=1024 * 1024)
+    reader.put(key, "response")
+    ResponseCache(str(tmp_path), max_bytes=1024 * 1024).clear()
+    assert reader.get(key) is None
+    assert reader._total_bytes == 0
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_llm_server import MockBehaviour
+
+def test_unknown_script_scenario_is_rejected_up_front():
+    with pytest.raises(ValueError, match="Unknown scenario 'vaild'.*valid"):
+        MockBehaviour(script=['valid', 'vaild'])
+
+def test_script_is_followed_in_order():
+    behaviour = MockBehaviour(script=['valid', 'umpire_fail'])
+    contents = [behaviour.next()[1] for _ in range(3)]
+    assert contents[0] == contents[2] != contents[1]
@@ -0,0 +1,19 @@
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_llm_server import SCENARIOS
+from netlist_extractor import extract_netlist
+
+def test_deeply_nested_text_is_not_a_netlist():
+    for text in ('{"a": [' * 500, "```json\n" + '{"a": [' * 600 + "\n```", '[{"a": ' * 2000 + ']}' * 2000):
+        assert extract_netlist(text).netlist is None
+
+def test_unbalanced_prose_is_scanned_once():
+    text = '{"a": [' * 5000 + SCENARIOS['missing_fence']
+    start = time.perf_counter()
+    result = extract_netlist(text)
+    assert result.valid and result.method == "bare"
+    assert time.perf_counter() - start < 1.0
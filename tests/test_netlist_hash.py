@@ -0,0 +1,21 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_library import LIBRARY
+from netlist_hash import CachedUmpire, VerdictCache, canonical_hash
+from stack import Umpire
+
+def _bias(cid: str, net: str):
+    return [{'id': cid, 'block_type': 'SimpleBiasN', 'connections': {'i_out_bias': net, 'pwr_gnd': 'GND'}}]
+
+def test_known_hash_only_answers_for_the_last_netlist(tmp_path):
+    umpire = CachedUmpire(Umpire(LIBRARY), VerdictCache(str(tmp_path / "verdicts.db")))
+    first, second = _bias('A', 'n1'), _bias('B', 'n1') + _bias('C', 'n2')
+    umpire.check(first)
+    assert umpire.known_hash(first) == canonical_hash(first)
+    umpire.check(second)
+    assert umpire.known_hash(first) is None
+    umpire.check(first)  # answered from the exact-text key
+    assert umpire.last_lookup == 'hit' and umpire.known_hash(first) == canonical_hash(first)
@@ -0,0 +1,35 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import stack
+import telemetry
+
+GOOD = [{'id': 'DP', 'block_type': 'DifferentialPairN', 'connections': {'v_in+': 'INP', 'v_in-': 'INN', 'i_out1': 'a', 'i_out2': 'OUT', 'i_in_bias': 'tail', 'pwr_vdd': 'VDD', 'pwr_gnd': 'GND'}},
+        {'id': 'LD', 'block_type': 'CurrentMirrorP', 'connections': {'i_in_ref': 'a', 'i_out_load': 'OUT', 'pwr_vdd': 'VDD'}},
+        {'id': 'B', 'block_type': 'SimpleBiasN', 'connections': {'i_out_bias': 'tail', 'pwr_gnd': 'GND'}}]
+
+class CountingUmpire(stack.IncrementalUmpire):
+    def __init__(self, l):
+        super().__init__(l)
+        self.calls = 0
+    def check(self, n):
+        self.calls += 1
+        return super().check(n)
+
+def test_checked_netlist_is_not_checked_again(monkeypatch):
+    monkeypatch.setattr(telemetry, 'TELEMETRY_ENABLED', False)
+    umpire = CountingUmpire(stack.COMPREHENSIVE_LIBRARY)
+    findings = umpire.check(GOOD)
+    netlist, remaining, repairs = stack.auto_repair_netlist(GOOD, umpire, findings)
+    assert (netlist, remaining, repairs, umpire.calls) == (GOOD, findings, [], 1)
+
+def test_repair_is_rechecked_by_the_same_umpire(monkeypatch):
+    monkeypatch.setattr(telemetry, 'TELEMETRY_ENABLED', False)
+    typo = [dict(c) for c in GOOD]
+    typo[2]['block_type'] = 'SimpleBiasNN'
+    umpire = CountingUmpire(stack.COMPREHENSIVE_LIBRARY)
+    netlist, remaining, repairs = stack.auto_repair_netlist(typo, umpire, umpire.check(typo))
+    assert netlist == GOOD and [r['rule_id'] for r in repairs] == ['F0.4']
+    assert umpire.calls == 2 and remaining == umpire.check(GOOD)
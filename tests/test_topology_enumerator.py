@@ -0,0 +1,20 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from block_library import LIBRARY
+from topology_enumerator import enumerate_topologies
+
+def _input_ports(netlist):
+    roles = {}
+    for c in netlist:
+        for terminal, net in c['connections'].items():
+            roles.setdefault(net, set()).add(LIBRARY[c['block_type']]['terminals'][terminal])
+    return [net for net, r in roles.items() if r == {'V_INPUT'}]
+
+def test_every_design_has_an_input_port():
+    designs = list(enumerate_topologies(max_blocks=4))
+    assert designs
+    for netlist in designs:
+        assert _input_ports(netlist), netlist
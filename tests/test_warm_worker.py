@@ -0,0 +1,28 @@
+import os
+import sys
+import json
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import warm_worker
+from block_library import LIBRARY
+
+def test_edited_library_is_reloaded(tmp_path, monkeypatch):
+    library_file = tmp_path / "lib.json"
+    with open(LIBRARY.path, encoding='utf-8') as f:
+        blocks = json.load(f)
+    library_file.write_text(json.dumps(blocks))
+    monkeypatch.setattr(LIBRARY, 'path', str(library_file))
+    LIBRARY.reload()
+    server = warm_worker.WarmWorker(str(tmp_path / "worker.sock"))
+    try:
+        server.library_stamp = warm_worker._file_stamp(LIBRARY.path)
+        assert 'SimpleBiasP' not in LIBRARY
+        blocks['SimpleBiasP'] = dict(blocks['SimpleBiasN'], device_type='PMOS')
+        library_file.write_text(json.dumps(blocks) + "\n")
+        server.refresh_library()
+        assert 'SimpleBiasP' in LIBRARY
+    finally:
+        server.server_close()
+        monkeypatch.undo()
+        LIBRARY.reload()
@@ -0,0 +1,317 @@
+import os
+import sys
+import json
+import time
+import argparse
+import itertools
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Any, Iterator, Optional, Tuple
+
+from umpire import DiagnosticUmpire, COMPREHENSIVE_LIBRARY
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+DEFAULT_MAX_BLOCKS: int = 3
+MAX_NET_FANOUT: int = 3  # terminals on one signal net
+REQUIRED_ROLES: Tuple[str, ...] = ('GAIN_STAGE',)  # every design contains these roles
+# With several workers, each multiset is split into work units by the nets of its
+# first SPLIT_DEPTH terminals, so one large multiset does not hold up the pool.
+SPLIT_DEPTH: int = 4
+DEFAULT_OUTPUT_FILE: str = "topology_catalog.jsonl"
+
+# ==============================================================================
+# ### --- TOPOLOGY ENUMERATION --- ###
+# Designs are built without an LLM: first a multiset of block types, then an
+# assignment of every signal terminal to a net. POWER terminals go to the rail
+# named in the terminal (pwr_gnd -> GND, otherwise VDD). A signal net must
+#   - join at least 2 terminals (rule C1) and at most MAX_NET_FANOUT,
+#   - hold at most one terminal of each component (no shorted block),
+#   - contain an I_OUTPUT terminal that drives it, unless it is made only of
+#     V_INPUT terminals (a shared input port),
+#   - not connect an NMOS gain stage's I_OUTPUT to a non-PMOS load (rule K1),
+# and at least one net must be such an input port, so every design has an input.
+# Multisets missing a LOAD_ACTIVE or BIAS_SOURCE next to a gain stage (rule S1)
+# are skipped outright; partial assignments are dropped as soon as K1 fails or
+# too few terminals remain to complete their nets (C1), drive them, or form an
+# input port. Nets are numbered in order of first use, so renaming nets never
+# yields a new design, and of the designs that only differ by swapping blocks of
+# the same type, only the one whose assignment is smallest is kept. Every design is finally checked
+# by the DiagnosticUmpire, so the catalog holds only netlists that pass it.
+# ==============================================================================
+
+def _rail(terminal: str) -> str:
+    return 'GND' if 'gnd' in terminal.lower() else 'VDD'
+
+class _BlockInfo:
+    """What the search needs to know about one block type."""
+    __slots__ = ('name', 'roles', 'signal', 'power', 'is_nmos_gain', 'is_non_pmos_load')
+    def __init__(self, name: str, info: Dict[str, Any]):
+        self.name = name
+        self.roles = frozenset(info.get('roles', []))
+        terminals = info.get('terminals', {})
+        self.signal = [(t, r) for t, r in terminals.items() if r != 'POWER']
+        self.power = [t for t, r in terminals.items() if r == 'POWER']
+        self.is_nmos_gain = 'GAIN_STAGE' in self.roles and info.get('device_type') == 'NMOS'
+        self.is_non_pmos_load = 'LOAD_ACTIVE' in self.roles and info.get('device_type') != 'PMOS'
+
+def block_multisets(library: Dict[str, Any], max_blocks: int, min_blocks: int = 1,
+                    required_roles: Tuple[str, ...] = REQUIRED_ROLES, goals: Optional[Dict[str, Any]] = None) -> Iterator[Tuple[str, ...]]:
+    """Yields the sorted block-type multisets that can pass rules S1 (and G1 for `goals`)."""
+    names = sorted(library)
+    for size in range(max(1, min_blocks), max_blocks + 1):
+        for combo in itertools.combinations_with_replacement(names, size):
+            roles = {r for name in combo for r in library[name].get('roles', [])}
+            if any(r not in roles for r in required_roles):
+                continue
+            if 'GAIN_STAGE' in roles and not {'LOAD_ACTIVE', 'BIAS_SOURCE'} <= roles:
+                continue
+            if (goals or {}).get('input_type') == 'differential' and 'DIFFERENTIAL_INPUT' not in roles:
+                continue
+            yield combo
+
+class _Search:
+    """Backtracking over the terminal-to-net assignments of one block multiset."""
+    def __init__(self, combo: Tuple[str, ...], library: Dict[str, Any], max_fanout: int, stats: Counter):
+        self.combo, self.library, self.max_fanout, self.stats = combo, library, max_fanout, stats
+        self.blocks = [_BlockInfo(name, library[name]) for name in combo]
+        self.slots = [(i, t, r) for i, b in enumerate(self.blocks) for t, r in b.signal]
+        # Outputs still unassigned after each slot, for the drive lookahead.
+        self.outputs_after = [sum(r == 'I_OUTPUT' for _, _, r in self.slots[k + 1:]) for k in range(len(self.slots))]
+        self.inputs_after = [sum(r == 'V_INPUT' for _, _, r in self.slots[k + 1:]) for k in range(len(self.slots))]
+        groups = {}
+        for i, name in enumerate(combo):
+            groups.setdefault(name, []).append(i)
+        self.swaps = [g for g in groups.values() if len(g) > 1]
+        self.assignment: List[int] = []
+        self.nets: List[Dict[str, Any]] = []
+
+    def run(self, prefix: Tuple[int, ...] = ()) -> Iterator[Tuple[int, ...]]:
+        """Yields the canonical complete assignments, or only those starting with `prefix` (see prefixes)."""
+        if not self.slots:
+            return
+        for k, net in enumerate(prefix):
+            comp, _, role = self.slots[k]
+            self._join(net, comp, role)
+        yield from self._extend(len(prefix))
+
+    def prefixes(self, depth: int) -> Iterator[Tuple[int, ...]]:
+        """Yields the feasible assignments of the first `depth` terminals (the whole search if it is that short)."""
+        if len(self.slots) <= depth:
+            yield ()
+            return
+        yield from self._extend(0, stop=depth)
+
+    def _extend(self, k: int, stop: Optional[int] = None) -> Iterator[Tuple[int, ...]]:
+        comp, _, role = self.slots[k]
+        for net in range(len(self.nets) + 1):
+            self.stats['nodes'] += 1
+            if net < len(self.nets) and not self._can_join(self.nets[net], comp, role):
+                continue
+            undo = self._join(net, comp, role)
+            if not self._feasible(k):
+                self.stats['pruned_lookahead'] += 1
+            elif k + 1 == stop:
+                yield tuple(self.assignment)
+            elif k + 1 == len(self.slots):
+                self.stats['leaves'] += 1
+                assignment = tuple(self.assignment)
+                if self._is_canonical(assignment):
+                    yield assignment
+                else:
+                    self.stats['symmetric_duplicates'] += 1
+            else:
+                yield from self._extend(k + 1, stop)
+            undo()
+
+    def _can_join(self, net: Dict[str, Any], comp: int, role: str) -> bool:
+        if comp in net['comps'] or net['size'] >= self.max_fanout:
+            return False
+        block = self.blocks[comp]
+        # K1: an NMOS gain stage's output must not share a net with a non-PMOS load.
+        if (block.is_non_pmos_load and net['nmos_gain_out']) or (block.is_nmos_gain and role == 'I_OUTPUT' and net['non_pmos_load']):
+            self.stats['pruned_k1'] += 1
+            return False
+        return True
+
+    def _join(self, net_index: int, comp: int, role: str):
+        block = self.blocks[comp]
+        if net_index == len(self.nets):
+            self.nets.append({'comps': set(), 'size': 0, 'outputs': 0, 'non_vin': 0, 'nmos_gain_out': 0, 'non_pmos_load': 0})
+        net = self.nets[net_index]
+        changes = {'size': 1, 'outputs': role == 'I_OUTPUT', 'non_vin': role != 'V_INPUT',
+                   'nmos_gain_out': block.is_nmos_gain and role == 'I_OUTPUT', 'non_pmos_load': block.is_non_pmos_load}
+        for key, delta in changes.items():
+            net[key] += int(delta)
+        net['comps'].add(comp)
+        self.assignment.append(net_index)
+        def undo():
+            self.assignment.pop()
+            net['comps'].discard(comp)
+            for key, delta in changes.items():
+                net[key] -= int(delta)
+            if net['size'] == 0:
+                self.nets.pop()
+        return undo
+
+    def _feasible(self, k: int) -> bool:
+        """
+        False once the remaining terminals cannot complete every net (C1), drive every
+        driven net, and leave an input port (a net of V_INPUT terminals only).
+        """
+        remaining = len(self.slots) - k - 1
+        short = sum(1 for n in self.nets if n['size'] < 2)
+        undriven = sum(1 for n in self.nets if n['non_vin'] and not n['outputs'])
+        has_port = any(not n['non_vin'] for n in self.nets)
+        return short <= remaining and undriven <= self.outputs_after[k] and (has_port or self.inputs_after[k] >= 2)
+
+    def _is_canonical(self, assignment: Tuple[int, ...]) -> bool:
+        """True if no reordering of same-type blocks gives a smaller net numbering."""
+        if not self.swaps:
+            return True
+        spans, start = [], 0
+        for b in self.blocks:
+            spans.append((start, start + len(b.signal)))
+            start += len(b.signal)
+        order = list(range(len(self.blocks)))
+        for perms in itertools.product(*(itertools.permutations(g) for g in self.swaps)):
+            for group, perm in zip(self.swaps, perms):
+                for position, comp in zip(group, perm):
+                    order[position] = comp
+            relabel: Dict[int, int] = {}
+            candidate = tuple(relabel.setdefault(assignment[s], len(relabel)) for comp in order for s in range(*spans[comp]))
+            if candidate < assignment:
+                return False
+        return True
+
+    def to_netlist(self, assignment: Tuple[int, ...]) -> List[Dict[str, Any]]:
+        ports = {net for net in set(assignment) if not any(a == net and r != 'V_INPUT' for a, (_, _, r) in zip(assignment, self.slots))}
+        names, port_count, net_count = {}, 0, 0
+        for net in assignment:
+            if net not in names:
+                if net in ports:
+                    port_count += 1
+                    names[net] = f"in{port_count}"
+                else:
+                    net_count += 1
+                    names[net] = f"n{net_count}"
+        netlist, seen = [], Counter()
+        for i, block in enumerate(self.blocks):
+            seen[block.name] += 1
+            netlist.append({'id': f"{block.name}_{seen[block.name]}", 'block_type': block.name, 'connections': {}})
+        for (comp, terminal, _), net in zip(self.slots, assignment):
+            netlist[comp]['connections'][terminal] = names[net]
+        for i, block in enumerate(self.blocks):
+            for terminal in block.power:
+                netlist[i]['connections'][terminal] = _rail(terminal)
+            # Keep the library's terminal order.
+            order = list(self.library[block.name].get('terminals', {}))
+            netlist[i]['connections'] = {t: netlist[i]['connections'][t] for t in order if t in netlist[i]['connections']}
+        return netlist
+
+def enumerate_multiset(combo: Tuple[str, ...], library: Dict[str, Any] = COMPREHENSIVE_LIBRARY, goals: Optional[Dict[str, Any]] = None,
+                       max_fanout: int = MAX_NET_FANOUT, stats: Optional[Counter] = None,
+                       prefix: Tuple[int, ...] = ()) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields every distinct netlist built from exactly the blocks in `combo` that
+    passes the DiagnosticUmpire (only those extending `prefix`, for a work unit).
+    """
+    stats = stats if stats is not None else Counter()
+    umpire_instance = DiagnosticUmpire(library)
+    search = _Search(combo, library, max_fanout, stats)
+    for assignment in search.run(prefix):
+        netlist = search.to_netlist(assignment)
+        if umpire_instance.check(netlist, goals or {}):
+            stats['rejected_by_umpire'] += 1
+            continue
+        stats['designs'] += 1
+        yield netlist
+
+def work_units(combos: Iterator[Tuple[str, ...]], library: Dict[str, Any], max_fanout: int,
+               depth: int = SPLIT_DEPTH) -> Iterator[Tuple[Tuple[str, ...], Tuple[int, ...]]]:
+    """Yields (multiset, prefix) pairs that together cover the whole search."""
+    for combo in combos:
+        for prefix in _Search(combo, library, max_fanout, Counter()).prefixes(depth):
+            yield combo, prefix
+
+def _collect_unit(args: Tuple) -> Tuple[List[List[Dict[str, Any]]], Counter]:
+    combo, prefix, library, goals, max_fanout = args
+    stats = Counter()
+    return list(enumerate_multiset(combo, library, goals, max_fanout, stats, prefix)), stats
+
+def enumerate_topologies(max_blocks: int = DEFAULT_MAX_BLOCKS, min_blocks: int = 1, library: Dict[str, Any] = COMPREHENSIVE_LIBRARY,
+                         goals: Optional[Dict[str, Any]] = None, workers: int = 1, max_fanout: int = MAX_NET_FANOUT,
+                         required_roles: Tuple[str, ...] = REQUIRED_ROLES, stats: Optional[Counter] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Yields valid netlists of `min_blocks` to `max_blocks` blocks. With `workers` > 1
+    the search is split into work units (see SPLIT_DEPTH) run in a process pool,
+    and each unit's designs are yielded as soon as it is done (so the order varies
+    between runs). Search counters (nodes, prunings, duplicates, designs) are added
+    to `stats`.
+    """
+    stats = stats if stats is not None else Counter()
+    combos = list(block_multisets(library, max_blocks, min_blocks, required_roles, goals))
+    stats['multisets'] += len(combos)
+    if workers <= 1:
+        for combo in combos:
+            yield from enumerate_multiset(combo, library, goals, max_fanout, stats)
+        return
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = set()
+        def drain(done):
+            for future in done:
+                netlists, unit_stats = future.result()
+                stats.update(unit_stats)
+                stats['work_units'] += 1
+                yield from netlists
+        # A bounded number of units in flight, so designs stream out while the rest are searched.
+        for combo, prefix in work_units(combos, library, max_fanout):
+            if len(pending) >= workers * 4:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                yield from drain(done)
+            pending.add(executor.submit(_collect_unit, (combo, prefix, library, goals, max_fanout)))
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            yield from drain(done)
+    finally:
+        # Also reached when the caller stops early: queued units are dropped.
+        executor.shutdown(wait=True, cancel_futures=True)
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Enumerate valid topologies over the block library without an LLM")
+    parser.add_argument('--max-blocks', type=int, default=DEFAULT_MAX_BLOCKS, help='Largest number of blocks per design')
+    parser.add_argument('--min-blocks', type=int, default=1, help='Smallest number of blocks per design')
+    parser.add_argument('--max-fanout', type=int, default=MAX_NET_FANOUT, help='Most terminals on one signal net')
+    parser.add_argument('--differential', action='store_true', help="Only designs meeting the 'differential input' goal (rule G1)")
+    parser.add_argument('--workers', type=int, default=None, help='Worker processes (default: all cores)')
+    parser.add_argument('--limit', type=int, default=None, help='Stop after this many designs')
+    parser.add_argument('--output', type=str, default=DEFAULT_OUTPUT_FILE, help='Catalog file (JSONL, readable by bulk_validate.py)')
+    args = parser.parse_args()
+
+    goals = {'input_type': 'differential'} if args.differential else {}
+    workers = args.workers or os.cpu_count() or 1
+    print("=" * 70)
+    print(f"Enumerating topologies of {args.min_blocks}-{args.max_blocks} block(s) with {workers} worker(s)")
+    print("=" * 70)
+    stats, count, start = Counter(), 0, time.perf_counter()
+    with open(args.output, 'w', encoding='utf-8') as out:
+        for netlist in enumerate_topologies(args.max_blocks, args.min_blocks, goals=goals, workers=workers,
+                                            max_fanout=args.max_fanout, stats=stats):
+            count += 1
+            blocks = sorted(c['block_type'] for c in netlist)
+            out.write(json.dumps({'id': f"topology_{count:06d}", 'blocks': blocks, 'netlist': netlist, 'goals': goals}) + "\n")
+            if args.limit and count >= args.limit:
+                break
+    elapsed = time.perf_counter() - start
+    print(f"{count} design(s) from {stats['multisets']} block multiset(s) in {elapsed:.2f}s "
+          f"({stats['nodes']} search nodes, {stats['pruned_k1']} K1 and {stats['pruned_lookahead']} C1/drive/input prunings, "
+          f"{stats['symmetric_duplicates']} symmetric duplicates dropped).")
+    print(f"Catalog written to '{args.output}'")
+    if count == 0:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
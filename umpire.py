@@ -2,26 +2,29 @@ from typing import List, Dict, Any
 import os
 import json
 
+from block_library import LIBRARY, suggest_block_types
+from connectivity import ConnectivityGraph, MAX_LISTED_COMPONENTS
+
 # ==============================================================================
 # 1. The Comprehensive Subcircuit Library
 # ==============================================================================
-COMPREHENSIVE_LIBRARY = {
-    'DifferentialPairN': {'description': 'Standard NMOS Differential Pair Gain Stage.', 'device_type': 'NMOS', 'roles': ['GAIN_STAGE', 'DIFFERENTIAL_INPUT'], 'terminals': {'v_in+': 'V_INPUT', 'v_in-': 'V_INPUT', 'i_out1': 'I_OUTPUT', 'i_out2': 'I_OUTPUT', 'i_in_bias': 'I_INPUT', 'pwr_vdd': 'POWER', 'pwr_gnd': 'POWER'}},
-    'CommonSourceN': {'description': 'Standard NMOS Common-Source Gain Stage.', 'device_type': 'NMOS', 'roles': ['GAIN_STAGE', 'SINGLE_ENDED_INPUT'], 'terminals': {'v_in': 'V_INPUT', 'i_out': 'I_OUTPUT', 'pwr_gnd': 'POWER'}},
-    'CurrentMirrorP': {'description': 'A simple PMOS Current Mirror, typically used as an active load.', 'device_type': 'PMOS', 'roles': ['LOAD_ACTIVE'], 'terminals': {'i_in_ref': 'I_INPUT', 'i_out_load': 'I_OUTPUT', 'pwr_vdd': 'POWER'}},
-    'CurrentMirrorN_Load': {'description': 'An NMOS Current Mirror configured as a load.', 'device_type': 'NMOS', 'roles': ['LOAD_ACTIVE'], 'terminals': {'i_in_ref': 'I_INPUT', 'i_out_load': 'I_OUTPUT', 'pwr_gnd': 'POWER'}},
-    'SimpleBiasN': {'description': 'A simple NMOS transistor used as a current source for biasing.', 'device_type': 'NMOS', 'roles': ['BIAS_SOURCE'], 'terminals': {'i_out_bias': 'I_OUTPUT', 'pwr_gnd': 'POWER'}},
-}
+# Defined in block_library.json and read on first use (see block_library.py).
+COMPREHENSIVE_LIBRARY = LIBRARY
 
 
 # ==============================================================================
 # 2. The Circuit Representation
 # ==============================================================================
 class Circuit:
-    def __init__(self, n, l): self.n, self.l, self.c, self.m = n, l, {c['id']: c for c in n}, self._bm()
+    def __init__(self, n, l): self.n, self.l, self.c = n, l, {c['id']: c for c in n}; self.net_map = self.m = self._bm(); self.role_index = self._bri(); self._graph = None
     def _bm(self): nm = {}; [nm.setdefault(net, []).append({'component_id': c['id'], 'terminal': t}) for c in self.n for t, net in c.get('connections', {}).items()]; return nm
+    def _bri(self): ri = {}; [ri.setdefault(r, []).append(c) for c in self.n for r in self.get_info(c['id']).get('roles', [])]; return ri
     def get_info(self, cid): return self.l.get(self.c[cid]['block_type'], {})
-    def get_components_by_role(self, r): return [c for c in self.n if r in self.get_info(c['id']).get('roles', [])]
+    def get_components_by_role(self, r): return list(self.role_index.get(r, []))
+    def get_graph(self):
+        """The component-net incidence graph (see connectivity.py), built on first use and shared by the C2-C4 rules."""
+        if self._graph is None: self._graph = ConnectivityGraph(self.n, self.l)
+        return self._graph
 
 
 # ==============================================================================
@@ -29,9 +32,10 @@ class Circuit:
 # ==============================================================================
 class DiagnosticUmpire:
     """The enhanced validation engine that categorizes errors."""
+    rule_modules = ('connectivity',)  # modules besides this one whose code decides the verdicts (see netlist_hash.umpire_fingerprint)
     def __init__(self, library: Dict[str, Any]):
         self.library = library
-        self.rules = [self._rule_c1_floating_nets, self._rule_k1_nmos_gain_pmos_load, self._rule_s1_missing_essential_blocks, self._rule_g1_goal_mismatch_input_type]
+        self.rules = [self._rule_c1_floating_nets, self._rule_c2_disconnected_subcircuits, self._rule_c3_input_without_output_path, self._rule_c4_supply_short, self._rule_k1_nmos_gain_pmos_load, self._rule_s1_missing_essential_blocks, self._rule_g1_goal_mismatch_input_type]
     def check(self, netlist: List[Dict[str, Any]], goals: Dict[str, Any] = {}) -> List[Dict[str, Any]]:
         sanity_errors = self._run_sanity_checks(netlist)
         if sanity_errors: return sanity_errors
@@ -42,9 +46,14 @@ class DiagnosticUmpire:
         if not isinstance(netlist, list) or not netlist: return [{'level': 'FATAL', 'category': 'Component Error', 'rule_id': 'F0.1', 'details': {}}]
         for comp in netlist:
             if 'id' not in comp or 'block_type' not in comp: return [{'level': 'FATAL', 'category': 'Component Error', 'rule_id': 'F0.3', 'details': {'component': comp}}]
-            if comp['block_type'] not in self.library: return [{'level': 'FATAL', 'category': 'Component Error', 'rule_id': 'F0.4', 'details': {'component_id': comp['id'], 'block_type': comp['block_type']}}]
+            if comp['block_type'] not in self.library: return [{'level': 'FATAL', 'category': 'Component Error', 'rule_id': 'F0.4', 'details': {'component_id': comp['id'], 'block_type': comp['block_type'], 'suggestions': suggest_block_types(self.library, comp['block_type'])}}]
         return []
     def _rule_c1_floating_nets(self, c: Circuit, g: Dict) -> List[Dict]: return [{'level': 'ERROR', 'category': 'Connection Error', 'rule_id': 'C1', 'details': {'net_name': n, 'component_id': s[0]['component_id'], 'terminal': s[0]['terminal']}} for n,s in c.net_map.items() if n.upper() not in ['VDD','GND'] and len(s)<2]
+    def _rule_c2_disconnected_subcircuits(self, c: Circuit, g: Dict) -> List[Dict]:
+        graph = c.get_graph()
+        return [{'level': 'ERROR', 'category': 'Connection Error', 'rule_id': 'C2', 'details': {'component_ids': [graph.component_ids[i] for i in m[:MAX_LISTED_COMPONENTS]], 'size': len(m)}} for m in graph.pieces()]
+    def _rule_c3_input_without_output_path(self, c: Circuit, g: Dict) -> List[Dict]: return [{'level': 'ERROR', 'category': 'Connection Error', 'rule_id': 'C3', 'details': {'net_name': n, 'component_id': cid, 'terminal': t}} for n, cid, t in c.get_graph().unreachable_inputs()]
+    def _rule_c4_supply_short(self, c: Circuit, g: Dict) -> List[Dict]: return [{'level': 'ERROR', 'category': 'Connection Error', 'rule_id': 'C4', 'details': {'net_name': n, 'component_id': cid, 'terminal': t}} for cid, t, n in c.get_graph().shorts]
     def _rule_k1_nmos_gain_pmos_load(self, c: Circuit, g: Dict) -> List[Dict]:
         errors = []
         for stage in c.get_components_by_role('GAIN_STAGE'):
@@ -56,7 +65,7 @@ class DiagnosticUmpire:
                             errors.append({'level': 'ERROR', 'category': 'Component Error', 'rule_id': 'K1', 'details': {'stage_id': stage['id'], 'load_id': conn['component_id'], 'net_name': net}})
         return errors
     def _rule_s1_missing_essential_blocks(self, c: Circuit, g: Dict) -> List[Dict]:
-        errors = []; roles = {r for co in c.n for r in c.get_info(co['id'])['roles']}
+        errors = []; roles = set(c.role_index)
         if 'GAIN_STAGE' in roles:
             if 'LOAD_ACTIVE' not in roles: errors.append({'level': 'ERROR', 'category': 'Component Error', 'rule_id': 'S1.1', 'details': {'missing_role': 'LOAD_ACTIVE'}})
             if 'BIAS_SOURCE' not in roles: errors.append({'level': 'WARNING', 'category': 'Component Error', 'rule_id': 'S1.2', 'details': {'missing_role': 'BIAS_SOURCE'}})
@@ -74,7 +83,7 @@ class DiagnosticFeedbackGenerator:
     """Writes a grouped and highly detailed feedback file without the original code."""
     def __init__(self, umpire: DiagnosticUmpire):
         self.umpire = umpire
-        self._formatters = {'F0.4': self._f0_4, 'C1': self._c1, 'K1': self._k1, 'S1.1': self._s1_1, 'S1.2': self._s1_2, 'G1': self._g1}
+        self._formatters = {'F0.4': self._f0_4, 'C1': self._c1, 'C2': self._c2, 'C3': self._c3, 'C4': self._c4, 'K1': self._k1, 'S1.1': self._s1_1, 'S1.2': self._s1_2, 'G1': self._g1}
 
     def generate_feedback_file(self, netlist: List[Dict], filename: str, goals: Dict = {}):
         """
@@ -110,8 +119,11 @@ class DiagnosticFeedbackGenerator:
 
     # --- Formatter functions (no changes needed, they are already detailed) ---
     def _default_fmt(self, d: Dict) -> str: return f"- **Uncategorized Error**: `{d}`\n---\n"
-    def _f0_4(self, d: Dict) -> str: return f"- **Rule F0.4: Unknown Block Type**\n  - **Location**: Component `{d.get('component_id')}`.\n  - **Problem**: It uses `block_type` '{d.get('block_type')}', which is not in the library.\n  - **Fix**: Correct the typo or add the block to the library.\n---\n"
+    def _f0_4(self, d: Dict) -> str: return f"- **Rule F0.4: Unknown Block Type**\n  - **Location**: Component `{d.get('component_id')}`.\n  - **Problem**: It uses `block_type` '{d.get('block_type')}', which is not in the library.\n  - **Fix**: {'Did you mean ' + ' or '.join(f'`{n}`' for n in d['suggestions']) + '?' if d.get('suggestions') else 'Correct the typo or add the block to the library.'}\n---\n"
     def _c1(self, d: Dict) -> str: return f"- **Rule C1: Floating Net**\n  - **Location**: Net `{d.get('net_name')}`.\n  - **Problem**: This net is only connected to terminal `{d.get('terminal')}` on component `{d.get('component_id')}`.\n  - **Fix**: Connect this net to a second terminal.\n---\n"
+    def _c2(self, d: Dict) -> str: return f"- **Rule C2: Disconnected Subcircuit**\n  - **Location**: Component(s) {', '.join(f'`{cid}`' for cid in d.get('component_ids', []))}{' and more' if d.get('size', 0) > len(d.get('component_ids', [])) else ''} ({d.get('size')} in total).\n  - **Problem**: These components share no signal net with the rest of the circuit; they are only tied to it through VDD/GND.\n  - **Fix**: Wire them into the signal path, or remove them.\n---\n"
+    def _c3(self, d: Dict) -> str: return f"- **Rule C3: Input Without Output Path**\n  - **Location**: Input net `{d.get('net_name')}` (terminal `{d.get('terminal')}` on component `{d.get('component_id')}`).\n  - **Problem**: No chain of blocks carries the signal on this net to an output node (a net driven by an `I_OUTPUT` terminal and not feeding a current input).\n  - **Fix**: Connect the stage it drives to a load or a following stage so the signal reaches the output.\n---\n"
+    def _c4(self, d: Dict) -> str: return f"- **Rule C4: Supply Short**\n  - **Location**: Terminal `{d.get('terminal')}` on component `{d.get('component_id')}`.\n  - **Problem**: This power terminal is connected to net `{d.get('net_name')}`, which shorts a supply to {'the other supply' if str(d.get('net_name')).upper() in ('VDD', 'GND') else 'a signal net'}.\n  - **Fix**: Connect it to {'GND' if 'gnd' in str(d.get('terminal')).lower() else 'VDD'}.\n---\n"
     def _k1(self, d: Dict) -> str: return f"- **Rule K1: NMOS/PMOS Mismatch**\n  - **Location**: The load component `{d.get('load_id')}`.\n  - **Problem**: This component is an incorrect load type for the NMOS gain stage `{d.get('stage_id')}`. They are connected via net `{d.get('net_name')}`.\n  - **Fix**: Change the `block_type` of `{d.get('load_id')}` to a PMOS equivalent (e.g., `CurrentMirrorP`).\n---\n"
     def _s1_1(self, d: Dict) -> str: return f"- **Rule S1.1: Missing Essential Component**\n  - **Location**: Circuit-wide.\n  - **Problem**: The design is missing a component with the `{d.get('missing_role')}` role.\n  - **Fix**: Add a component that fulfills this role (e.g., a `CurrentMirrorP` for a load).\n---\n"
     def _s1_2(self, d: Dict) -> str: return f"- **Rule S1.2: Missing Essential Component (Warning)**\n  - **Location**: Circuit-wide.\n  - **Problem**: The design is likely missing a `{d.get('missing_role')}` component.\n  - **Fix**: Add a component with this role (e.g., `SimpleBiasN` for biasing).\n---\n"
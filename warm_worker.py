@@ -0,0 +1,341 @@
+import io
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import tempfile
+import threading
+import importlib
+import subprocess
+import socketserver
+from contextlib import redirect_stdout, redirect_stderr
+from typing import List, Dict, Any, Optional, IO
+
+# ==============================================================================
+# ### --- CONFIGURATION --- ###
+# ==============================================================================
+
+# Unix socket the worker listens on; STACK_WORKER_SOCKET in the environment overrides it.
+DEFAULT_SOCKET_PATH: str = os.environ.get('STACK_WORKER_SOCKET') or os.path.join(
+    tempfile.gettempdir(), f"stack-worker-{getattr(os, 'getuid', lambda: 0)()}.sock")
+# Command line entry points the worker runs: `run <module> [args...]` calls <module>.main().
+ENTRY_POINTS: List[str] = ['contact_two', 'auto_repair', 'netlist_hash', 'block_library', 'artifact_store', 'topology_enumerator', 'estimator']
+CONNECT_TIMEOUT_S: float = 0.5
+# How long `serve --detach` waits for the new worker to answer.
+START_TIMEOUT_S: float = 30.0
+
+# ==============================================================================
+# ### --- RESIDENT WORKER --- ###
+# A short CLI call spends most of its time before main() even starts: importing
+# the tool, the OpenAI SDK when a request is made, loading the block library and
+# opening the caches. `serve` does all of that once and then answers commands on
+# a Unix socket, one JSON line per request:
+#   {"command": "run", "module": "contact_two", "argv": [...], "cwd": "..."}
+#   {"command": "check", "argv": ["netlist.json"], "cwd": "..."}
+#   {"command": "ping"} / {"command": "stop"}
+# The reply is a stream of {"stream": "stdout"|"stderr", "data": "..."} lines
+# ending with {"exit": code}. Commands run one at a time in the worker process
+# (under the caller's working directory), with the same warm clients, caches and
+# Umpire each time. If the source of a loaded module changes on disk the worker
+# answers {"stale": true} and the client runs the command itself, as it does
+# when no worker is listening, so a command never depends on the worker. An
+# edited block library does not make the worker stale: it is reloaded before the
+# next command, and the Umpire built over it is rebuilt.
+# Settings a command changes in module globals (e.g. contact_two --rpm) stay in
+# effect for later commands, as they would within one process.
+# ==============================================================================
+
+_EXEC_LOCK = threading.Lock()
+_CHECK_UMPIRE: Optional[Any] = None
+
+def _exit_code(e: SystemExit) -> int:
+    if e.code is None or isinstance(e.code, int):
+        return e.code or 0
+    print(e.code, file=sys.stderr)
+    return 1
+
+def _check_main(argv: List[str]) -> int:
+    """`check NETLIST [--feedback FILE]`: the Umpire check of stack.py, with a warm verdict cache."""
+    global _CHECK_UMPIRE
+    import stack
+    parser = argparse.ArgumentParser(prog='warm_worker.py check', description="Check a netlist with the Umpire of stack.py")
+    parser.add_argument('netlist', help='Netlist JSON file')
+    parser.add_argument('--feedback', type=str, default=os.devnull, help='Where to write the Umpire feedback (default: discard it)')
+    args = parser.parse_args(argv)
+    if _CHECK_UMPIRE is None:
+        _CHECK_UMPIRE = stack.cached_umpire(stack.Umpire(stack.COMPREHENSIVE_LIBRARY))
+    findings = stack.run_umpire_findings(args.netlist, args.feedback, _CHECK_UMPIRE)
+    for f in findings:
+        print(f"  > {f.get('level')} [{f.get('rule_id')}] {json.dumps(f.get('details', {}), sort_keys=True)}")
+    return 1 if findings else 0
+
+def execute(command: str, argv: List[str], module: Optional[str] = None) -> int:
+    """Runs one command in this process and returns its exit code."""
+    try:
+        if command == 'check':
+            return _check_main(argv)
+        if module not in ENTRY_POINTS:
+            print(f"Error: '{module}' is not one of the entry points: {', '.join(ENTRY_POINTS)}", file=sys.stderr)
+            return 2
+        saved_argv = sys.argv
+        sys.argv = [f"{module}.py", *argv]
+        try:
+            importlib.import_module(module).main()
+        finally:
+            sys.argv = saved_argv
+        return 0
+    except SystemExit as e:
+        return _exit_code(e)
+    except KeyboardInterrupt:
+        return 130
+
+class _StreamWriter(io.TextIOBase):
+    """A text stream that forwards every write to the client as a JSON line."""
+    def __init__(self, wfile: IO[bytes], stream: str, lock: threading.Lock):
+        self._wfile, self._stream, self._lock = wfile, stream, lock
+        self._connected = True
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data: str) -> int:
+        if data and self._connected:
+            self._connected = _send(self._wfile, {'stream': self._stream, 'data': data}, self._lock)
+        return len(data)
+
+def _send(wfile: IO[bytes], message: Dict[str, Any], lock: threading.Lock) -> bool:
+    with lock:
+        try:
+            wfile.write(json.dumps(message).encode('utf-8') + b'\n')
+            wfile.flush()
+            return True
+        except OSError:
+            return False  # the client went away; the command still runs to completion
+
+class _Handler(socketserver.StreamRequestHandler):
+    def handle(self) -> None:
+        lock = threading.Lock()
+        try:
+            request = json.loads(self.rfile.readline())
+        except ValueError:
+            return
+        server: WarmWorker = self.server  # type: ignore[assignment]
+        command = request.get('command')
+        if command == 'ping':
+            _send(self.wfile, {'pid': os.getpid(), 'uptime_s': round(time.monotonic() - server.started, 1),
+                               'served': server.served, 'modules': sorted(server.sources)}, lock)
+        elif command == 'stop':
+            _send(self.wfile, {'exit': 0}, lock)
+            threading.Thread(target=server.shutdown, daemon=True).start()
+        elif command in ('run', 'check'):
+            if server.stale():
+                _send(self.wfile, {'stale': True}, lock)
+                return
+            with _EXEC_LOCK:
+                server.refresh_library()
+                saved_cwd = os.getcwd()
+                stdout, stderr = _StreamWriter(self.wfile, 'stdout', lock), _StreamWriter(self.wfile, 'stderr', lock)
+                try:
+                    os.chdir(request.get('cwd') or saved_cwd)
+                    with redirect_stdout(stdout), redirect_stderr(stderr):
+                        try:
+                            code = execute(command, list(request.get('argv', [])), request.get('module'))
+                        except Exception:
+                            import traceback
+                            traceback.print_exc()
+                            code = 1
+                finally:
+                    os.chdir(saved_cwd)
+                server.served += 1
+            _send(self.wfile, {'exit': code}, lock)
+        else:
+            _send(self.wfile, {'stream': 'stderr', 'data': f"Unknown command '{command}'\n"}, lock)
+            _send(self.wfile, {'exit': 2}, lock)
+
+def _file_stamp(path: str) -> Optional[tuple]:
+    """(mtime_ns, size) of `path`, or None if it cannot be read."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime_ns, st.st_size)
+
+class WarmWorker(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str):
+        self.started = time.monotonic()
+        self.served = 0
+        self.sources: Dict[str, float] = {}
+        self.library_stamp: Optional[tuple] = None
+        previous_umask = os.umask(0o177)  # the socket is created owner-only (0600)
+        try:
+            super().__init__(socket_path, _Handler)
+        finally:
+            os.umask(previous_umask)
+
+    def preload(self) -> None:
+        """Imports the entry points and builds the clients, caches and Umpire they use."""
+        import stack
+        import contact_two
+        for module in ENTRY_POINTS:
+            importlib.import_module(module)
+        for config in contact_two.LLM_CONFIG:
+            contact_two.get_client(config['api_key'])  # imports openai and opens the HTTP pools
+        contact_two.get_cache()
+        stack.COMPREHENSIVE_LIBRARY.index  # loads the block library index
+        self.library_stamp = _file_stamp(stack.COMPREHENSIVE_LIBRARY.path)
+        global _CHECK_UMPIRE
+        _CHECK_UMPIRE = stack.cached_umpire(stack.Umpire(stack.COMPREHENSIVE_LIBRARY))
+        here = os.path.dirname(os.path.abspath(__file__))
+        for module in list(sys.modules.values()):
+            path = getattr(module, '__file__', None)
+            if path and os.path.dirname(os.path.abspath(path)) == here:
+                self.sources[path] = os.path.getmtime(path)
+
+    def refresh_library(self) -> None:
+        """Reloads the block library if its file changed since it was loaded; the check Umpire is rebuilt on next use."""
+        global _CHECK_UMPIRE
+        from block_library import LIBRARY
+        stamp = _file_stamp(LIBRARY.path)
+        if stamp == self.library_stamp:
+            return
+        # Read again on first use, so a broken file is reported by the command that needs it
+        LIBRARY.reload()
+        self.library_stamp = stamp
+        _CHECK_UMPIRE = None
+        print(f"[Worker] Block library '{LIBRARY.path}' changed; reloading it.", flush=True)
+
+    def stale(self) -> bool:
+        """True if a module the worker loaded from this directory was edited since."""
+        try:
+            return any(os.path.getmtime(path) != mtime for path, mtime in self.sources.items())
+        except OSError:
+            return True
+
+# ==============================================================================
+# ### --- CLIENT --- ###
+# ==============================================================================
+
+def _connect(socket_path: str) -> Optional[socket.socket]:
+    if not hasattr(socket, 'AF_UNIX'):
+        return None
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.settimeout(CONNECT_TIMEOUT_S)
+    try:
+        sock.connect(socket_path)
+    except OSError:
+        sock.close()
+        return None
+    sock.settimeout(None)
+    return sock
+
+def request(message: Dict[str, Any], socket_path: str = DEFAULT_SOCKET_PATH) -> Optional[Dict[str, Any]]:
+    """
+    Sends `message` to the worker, copying its output to stdout/stderr as it
+    arrives. Returns the final reply ({'exit': code}, {'stale': True} or the
+    ping reply), or None if no worker is listening.
+    """
+    sock = _connect(socket_path)
+    if sock is None:
+        return None
+    with sock, sock.makefile('rb') as replies:
+        sock.sendall(json.dumps(message).encode('utf-8') + b'\n')
+        for line in replies:
+            reply = json.loads(line)
+            if 'stream' in reply:
+                stream = sys.stdout if reply['stream'] == 'stdout' else sys.stderr
+                stream.write(reply['data'])
+                stream.flush()
+            else:
+                return reply
+    return None  # the worker died mid-command
+
+def run(command: str, argv: List[str], module: Optional[str] = None, socket_path: str = DEFAULT_SOCKET_PATH) -> int:
+    """Runs a command in the worker, or in this process if there is no (up to date) worker."""
+    reply = request({'command': command, 'module': module, 'argv': argv, 'cwd': os.getcwd()}, socket_path)
+    if reply is not None and 'exit' in reply:
+        return reply['exit']
+    if reply is not None and reply.get('stale'):
+        print("[Worker] The code changed since the worker started; running in this process (restart the worker).", file=sys.stderr)
+    return execute(command, argv, module)
+
+def serve(socket_path: str = DEFAULT_SOCKET_PATH) -> None:
+    """Runs the worker in the foreground until `stop` or Ctrl+C."""
+    if request({'command': 'ping'}, socket_path) is not None:
+        print(f"Error: a worker is already listening on '{socket_path}'.")
+        sys.exit(1)
+    if os.path.exists(socket_path):
+        os.remove(socket_path)  # left behind by a worker that was killed
+    start = time.perf_counter()
+    server = WarmWorker(socket_path)
+    try:
+        server.preload()
+        print(f"[Worker] pid {os.getpid()} preloaded in {time.perf_counter() - start:.2f}s, listening on '{socket_path}'", flush=True)
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        print("[Worker] Stopped.", flush=True)
+
+def start_detached(socket_path: str = DEFAULT_SOCKET_PATH) -> bool:
+    """Starts `serve` in a new session and waits until it answers."""
+    subprocess.Popen([sys.executable, os.path.abspath(__file__), 'serve', '--socket', socket_path],
+                     stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL, start_new_session=True)
+    deadline = time.monotonic() + START_TIMEOUT_S
+    while time.monotonic() < deadline:
+        if request({'command': 'ping'}, socket_path) is not None:
+            return True
+        time.sleep(0.1)
+    return False
+
+# ==============================================================================
+# ### --- COMMAND LINE --- ###
+# ==============================================================================
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Resident worker that keeps contact_two and the Umpire warm for repeated CLI calls")
+    parser.add_argument('--socket', type=str, default=DEFAULT_SOCKET_PATH, help='Unix socket of the worker')
+    commands = parser.add_subparsers(dest='command', required=True)
+    serve_parser = commands.add_parser('serve', help='Start the worker')
+    serve_parser.add_argument('--socket', type=str, default=argparse.SUPPRESS, help='Unix socket of the worker')
+    serve_parser.add_argument('--detach', action='store_true', help='Run it in the background and return once it answers')
+    commands.add_parser('stop', help='Stop the worker')
+    commands.add_parser('ping', help='Show whether a worker is running')
+    run_parser = commands.add_parser('run', help='Run an entry point: run <module> [args...]')
+    run_parser.add_argument('module', choices=ENTRY_POINTS)
+    run_parser.add_argument('args', nargs=argparse.REMAINDER)
+    check_parser = commands.add_parser('check', help='Check a netlist: check NETLIST [--feedback FILE]')
+    check_parser.add_argument('args', nargs=argparse.REMAINDER)
+    args = parser.parse_args()
+
+    if args.command == 'serve':
+        if not hasattr(socket, 'AF_UNIX'):
+            print("Error: the worker needs Unix sockets, which this platform does not have.")
+            sys.exit(1)
+        if args.detach:
+            if not start_detached(args.socket):
+                print(f"Error: the worker did not start listening on '{args.socket}'.")
+                sys.exit(1)
+            print(f"[Worker] Listening on '{args.socket}'.")
+        else:
+            serve(args.socket)
+    elif args.command in ('stop', 'ping'):
+        reply = request({'command': args.command}, args.socket)
+        if reply is None:
+            print(f"No worker is listening on '{args.socket}'.")
+            sys.exit(1)
+        if args.command == 'ping':
+            print(f"[Worker] pid {reply['pid']}, up {reply['uptime_s']}s, {reply['served']} command(s) served, {len(reply['modules'])} module(s) loaded")
+        else:
+            print("[Worker] Stopping.")
+    else:
+        sys.exit(run(args.command, args.args, getattr(args, 'module', None), args.socket))
+
+if __name__ == "__main__":
+    main()